@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 FreeIPA Contributors see COPYING for license
+#
+"""Benchmark the startup of the server API
+
+Every mod_wsgi process of the IPA server bootstraps and finalizes its own
+API instance. This script measures how long that takes with plugins
+finalized up front and on demand. Each run uses a fresh interpreter, so the
+import of the plugin modules is included:
+
+    $ make api-startup
+
+    $ make api-startup API_STARTUP_ARGS='--runs 10 --confdir ~/.ipa'
+
+The configuration directory needs a default.conf of an IPA server (realm,
+domain, basedn, ...), no connection to the server is made.
+"""
+from __future__ import print_function
+
+import json
+import optparse  # pylint: disable=deprecated-module
+import os
+import subprocess
+import sys
+import time
+
+from ipaplatform.paths import paths
+
+COMMAND = 'user_show'
+
+
+def run_once(confdir, on_demand):
+    """Initialize the API and report the timing as JSON on stdout
+    """
+    start = time.time()
+    import ipalib
+
+    api = ipalib.create_api(mode=None)
+    api.bootstrap(context='server', confdir=confdir, in_server=True,
+                  plugins_on_demand=on_demand, log=None)
+    api.load_plugins()
+    loaded = time.time()
+    api.finalize()
+    finalized = time.time()
+    # what the first request of a worker has to build in addition
+    api.Backend.wsgi_dispatch.ensure_finalized()
+    api.Command[COMMAND].ensure_finalized()
+    ready = time.time()
+
+    print(json.dumps(dict(
+        load_plugins=loaded - start,
+        finalize=finalized - loaded,
+        first_request=ready - finalized,
+    )))
+
+
+def run(confdir, on_demand):
+    args = [sys.executable, os.path.abspath(__file__), '--confdir', confdir,
+            '--run-once']
+    if on_demand:
+        args.append('--on-demand')
+    output = subprocess.check_output(args)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '--runs',
+        help='Number of runs per mode (default 5)',
+        default=5,
+        type='int',
+    )
+    parser.add_option(
+        '--confdir',
+        help='IPA configuration directory (default {})'.format(paths.ETC_IPA),
+        default=paths.ETC_IPA,
+    )
+    parser.add_option('--run-once', action='store_true',
+                      help=optparse.SUPPRESS_HELP)
+    parser.add_option('--on-demand', action='store_true',
+                      help=optparse.SUPPRESS_HELP)
+    options, _args = parser.parse_args()
+
+    if options.run_once:
+        run_once(options.confdir, options.on_demand)
+        return
+
+    columns = ('load_plugins', 'finalize', 'first_request')
+    print('{:<12} {:>14} {:>10} {:>15} {:>8}'.format(
+        'mode', *(columns + ('total',))))
+    for mode, on_demand in (('up front', False), ('on demand', True)):
+        results = [run(options.confdir, on_demand)
+                   for _i in range(options.runs)]
+        # report the median of every column
+        medians = [
+            sorted(r[column] for r in results)[len(results) // 2]
+            for column in columns
+        ]
+        print('{:<12} {:>14.3f} {:>10.3f} {:>15.3f} {:>8.3f}'.format(
+            mode, *(medians + [sum(medians)])))
+
+
+if __name__ == '__main__':
+    main()
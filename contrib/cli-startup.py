@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 FreeIPA Contributors see COPYING for license
+#
+"""Benchmark the startup of the ipa command
+
+Runs an ipa command several times with an empty schema cache (cold) and
+with the schema cached (warm) and reports the median wall clock time:
+
+    $ kinit admin
+    $ python3 contrib/cli-startup.py --runs 10 user-show admin
+
+The schema cache of the current user is removed for the cold runs.
+"""
+from __future__ import print_function
+
+import optparse  # pylint: disable=deprecated-module
+import os
+import shutil
+import subprocess
+import time
+
+from ipalib.constants import USER_CACHE_PATH
+
+CACHE_DIR = os.path.join(USER_CACHE_PATH, 'ipa')
+
+
+def run(command):
+    start = time.time()
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(command, stdout=devnull)
+    return time.time() - start
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] COMMAND [ARGS]')
+    parser.add_option(
+        '--runs',
+        help='Number of runs per mode (default 5)',
+        default=5,
+        type='int',
+    )
+    parser.add_option(
+        '--ipa',
+        help='ipa executable (default ipa)',
+        default='ipa',
+    )
+    parser.disable_interspersed_args()
+    options, args = parser.parse_args()
+    if not args:
+        args = ['user-show', 'admin']
+    command = [options.ipa] + args
+
+    cold = []
+    for _i in range(options.runs):
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        cold.append(run(command))
+    warm = [run(command) for _i in range(options.runs)]
+
+    for mode, times in (('cold', cold), ('warm', warm)):
+        times.sort()
+        print('{:<5} median {:.3f} sec, min {:.3f} sec'.format(
+            mode, times[len(times) // 2], times[0]))
+
+
+if __name__ == '__main__':
+    main()
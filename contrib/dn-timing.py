@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 FreeIPA Contributors see COPYING for license
+#
+"""Time common operations of ipapython.dn.DN
+
+LDAP entries, ACIs and plugins create, hash and compare DNs all the time.
+This script times the operations which matter most, run it on two checkouts
+to compare them:
+
+    $ PYTHONPATH=. python3 contrib/dn-timing.py
+
+    $ PYTHONPATH=. python3 contrib/dn-timing.py --number 20000 --repeat 5
+
+Every column is the best of --repeat runs in microseconds per operation.
+"""
+from __future__ import print_function
+
+import optparse  # pylint: disable=deprecated-module
+import timeit
+
+from ipapython.dn import DN
+
+BASE_DN = 'dc=ipa,dc=example,dc=test'
+
+SETUP = '''
+from ipapython.dn import DN
+base_dn = DN({base!r})
+container_dn = DN(('cn', 'users'), ('cn', 'accounts'), base_dn)
+dn = DN(('uid', 'admin'), container_dn)
+other_dn = DN('UID=Admin,CN=Users,CN=Accounts,' + {base!r}.upper())
+dn_str = str(dn)
+dns = [DN(('uid', 'user%d' % i), container_dn) for i in range(100)]
+dn_set = set(dns)
+counter = iter(range(10 ** 9))
+'''.format(base=BASE_DN)
+
+TESTS = (
+    ('parse same string', "DN(dn_str)"),
+    ('parse new string',
+     "DN('uid=user%d,cn=users,cn=accounts,{}' % next(counter))".format(
+         BASE_DN)),
+    ('copy', "DN(dn)"),
+    ('concatenate', "DN(('uid', 'admin'), container_dn)"),
+    ('str', "str(dn)"),
+    ('hash', "hash(dn)"),
+    ('equal', "dn == other_dn"),
+    ('set lookup', "other_dn in dn_set"),
+    ('endswith', "dn.endswith(base_dn)"),
+    ('sort 100', "sorted(dns)"),
+)
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option(
+        '--number',
+        help='Number of operations per run (default 10000)',
+        default=10000,
+        type='int',
+    )
+    parser.add_option(
+        '--repeat',
+        help='Number of runs (default 3)',
+        default=3,
+        type='int',
+    )
+    options, _args = parser.parse_args()
+
+    # make sure the test code works before timing it
+    assert DN(BASE_DN) == DN(BASE_DN.upper())
+
+    print('{:<20} {:>10}'.format('operation', 'usec'))
+    for name, stmt in TESTS:
+        timer = timeit.Timer(stmt, setup=SETUP)
+        best = min(timer.repeat(repeat=options.repeat,
+                                number=options.number))
+        print('{:<20} {:>10.2f}'.format(
+            name, best * 1e6 / options.number))
+
+
+if __name__ == '__main__':
+    main()
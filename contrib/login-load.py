@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+#
+# Copyright (C) 2018 FreeIPA Contributors see COPYING for license
+#
+"""Load test of password logins
+
+Logs in to an IPA server with a password from several threads for a while
+and reports the number of successful logins per second:
+
+    $ python3 contrib/login-load.py --server ipa.example.test \\
+        --user admin --clients 20 --duration 30
+
+The password is read from the IPA_PASSWORD environment variable or asked
+for. Use a test server; every login creates a ccache on the server and
+failed logins may lock the account.
+"""
+from __future__ import print_function
+
+import getpass
+import optparse  # pylint: disable=deprecated-module
+import os
+import threading
+import time
+
+import requests
+
+from ipaplatform.paths import paths
+
+
+def worker(url, user, password, cacert, deadline, results):
+    session = requests.Session()
+    session.verify = cacert
+    headers = {
+        'Referer': url.rsplit('/', 2)[0],
+        'Accept': 'text/plain',
+    }
+    data = {'user': user, 'password': password}
+    ok = failed = 0
+    while time.time() < deadline:
+        session.cookies.clear()
+        try:
+            r = session.post(url, data=data, headers=headers)
+        except requests.RequestException:
+            failed += 1
+            continue
+        if r.status_code == 200 and 'ipa_session' in r.cookies:
+            ok += 1
+        else:
+            failed += 1
+    results.append((ok, failed))
+
+
+def main():
+    parser = optparse.OptionParser()
+    parser.add_option('--server', help='IPA server host name')
+    parser.add_option('--user', default='admin',
+                      help='User to log in as (default admin)')
+    parser.add_option('--clients', default=10, type='int',
+                      help='Number of concurrent clients (default 10)')
+    parser.add_option('--duration', default=30, type='int',
+                      help='Duration of the test in seconds (default 30)')
+    parser.add_option('--cacert', default=paths.IPA_CA_CRT,
+                      help='CA certificate (default {})'.format(
+                          paths.IPA_CA_CRT))
+    options, _args = parser.parse_args()
+    if not options.server:
+        parser.error('--server is required')
+
+    password = os.environ.get('IPA_PASSWORD')
+    if password is None:
+        password = getpass.getpass('Password for {}: '.format(options.user))
+
+    url = 'https://{}/ipa/session/login_password'.format(options.server)
+    deadline = time.time() + options.duration
+    results = []
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url, options.user, password, options.cacert, deadline,
+                  results))
+        for _i in range(options.clients)
+    ]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - start
+
+    ok = sum(r[0] for r in results)
+    failed = sum(r[1] for r in results)
+    print('{} logins in {:.1f} sec: {:.1f} logins/sec, {} failed'.format(
+        ok, elapsed, ok / elapsed, failed))
+
+
+if __name__ == '__main__':
+    main()
@@ -28,6 +28,7 @@ from __future__ import absolute_import
 import logging
 import os
 import sys
+import time
 
 # Some dependencies like Dogtag's pki.client library and custodia use
 # python-requsts to make HTTPS connection. python-requests prefers
@@ -45,6 +46,7 @@ from ipalib import api
 
 logger = logging.getLogger(os.path.basename(__file__))
 
+start_time = time.time()
 api.bootstrap(context='server', confdir=paths.ETC_IPA, log=None)
 try:
     api.finalize()
@@ -52,6 +54,7 @@ except Exception as e:
     logger.error('Failed to start IPA: %s', e)
 else:
     logger.info('*** PROCESS START ***')
+    logger.debug('API initialized in %.03f sec', time.time() - start_time)
 
     # This is the WSGI callable:
     def application(environ, start_response):
@@ -2,18 +2,22 @@
 # Copyright (C) 2016  FreeIPA Contributors see COPYING for license
 #
 
+import collections
 import errno
 import json
 import logging
+import mmap
 import os
+import struct
 import sys
 import tempfile
 import types
-import zipfile
+import zlib
 
 from cryptography import x509 as crypto_x509
 
 import six
+from six import BytesIO
 
 from ipaclient.frontend import ClientCommand, ClientMethod
 from ipalib import errors, parameters, plugable
@@ -36,7 +40,19 @@ else:
 
 logger = logging.getLogger(__name__)
 
-FORMAT = '1'
+FORMAT = '2'
+
+# The schema cache file starts with the magic and the length of the index,
+# followed by the index and the records. The index is a JSON object mapping
+# namespaces to objects mapping member names to the offset and length of
+# their record, plus the offset and length of the help record. Offsets are
+# relative to the end of the index. Each record is a zlib compressed JSON
+# document, so a single member can be read from the memory mapped file.
+_CACHE_MAGIC = b'IPASCHEM'
+_CACHE_HEADER = struct.Struct('!8sI')
+
+# position of a record in the memory mapped schema cache file
+_Record = collections.namedtuple('_Record', ['offset', 'length'])
 
 if six.PY3:
     unicode = str
@@ -376,9 +392,11 @@ class Schema:
     _DIR = os.path.join(USER_CACHE_PATH, 'ipa', 'schema', FORMAT)
 
     def __init__(self, client, fingerprint=None):
+        self._client = client
         self._dict = {}
         self._namespaces = {}
         self._help = None
+        self._records = None
 
         for ns in self.namespaces:
             self._dict[ns] = {}
@@ -444,16 +462,34 @@ class Schema:
         return (fp, ttl,)
 
     def _read_schema(self, fingerprint):
-        # It's more efficient to read zip file members at once than to open
-        # the zip file a couple of times, see #6690.
+        # Only the index is parsed, members are decompressed and parsed
+        # when they are read.
         filename = os.path.join(self._DIR, fingerprint)
-        with zipfile.ZipFile(filename, 'r') as schema:
-            for name in schema.namelist():
-                ns, _slash, key = name.partition('/')
-                if ns in self.namespaces:
-                    self._dict[ns][key] = schema.read(name)
-                elif name == '_help':
-                    self._help = schema.read(name)
+        with open(filename, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, index_len = _CACHE_HEADER.unpack_from(data)
+        if magic != _CACHE_MAGIC:
+            raise ValueError("invalid schema cache {}".format(filename))
+        start = _CACHE_HEADER.size
+        index = json.loads(data[start:start + index_len].decode('utf-8'))
+        base = start + index_len
+
+        def make_record(position):
+            offset, length = position
+            if (offset < 0 or length <= 0 or
+                    base + offset + length > len(data)):
+                raise ValueError(
+                    "truncated schema cache {}".format(filename))
+            return _Record(base + offset, length)
+
+        dicts = {
+            ns: {key: make_record(value) for key, value in index[ns].items()}
+            for ns in self.namespaces
+        }
+        self._help = make_record(index['_help'])
+        self._dict.update(dicts)
+        self._records = data
 
     def __getitem__(self, key):
         try:
@@ -502,27 +538,58 @@ class Schema:
                 os.rename(f.name, os.path.join(self._DIR, fingerprint))
 
     def _write_schema_data(self, fileobj):
-        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED) as schema:
-            for key, value in self._dict.items():
-                if key in self.namespaces:
-                    ns = value
-                    for member in ns:
-                        path = '{}/{}'.format(key, member)
-                        s = json.dumps(ns[member], default=json_default)
-                        schema.writestr(path, s.encode('utf-8'))
-                else:
-                    schema.writestr(key, json.dumps(value).encode('utf-8'))
-
-            schema.writestr(
-                '_help',
-                json.dumps(self._help, default=json_default).encode('utf-8')
-            )
+        records = BytesIO()
+
+        def add_record(value):
+            s = json.dumps(value, default=json_default)
+            record = zlib.compress(s.encode('utf-8'))
+            offset = records.tell()
+            records.write(record)
+            return (offset, len(record))
+
+        index = {
+            ns: {
+                member: add_record(value)
+                for member, value in self._dict[ns].items()
+            }
+            for ns in self.namespaces
+        }
+        index['_help'] = add_record(self._help)
+
+        index_data = json.dumps(index, separators=(',', ':')).encode('utf-8')
+        fileobj.write(_CACHE_HEADER.pack(_CACHE_MAGIC, len(index_data)))
+        fileobj.write(index_data)
+        fileobj.write(records.getvalue())
+
+    def _read_record(self, record):
+        data = self._records[record.offset:record.offset + record.length]
+        return json.loads(zlib.decompress(data).decode('utf-8'))
+
+    def _refetch(self, error):
+        """
+        Replace the cached schema which failed to read by the schema of the
+        server.
+        """
+        logger.warning("Failed to read schema: %s", error)
+        self._records = None
+        fingerprint, ttl = self._fetch(self._client, ignore_cache=True)
+        self._help = self._generate_help(self._dict)
+        try:
+            self._write_schema(fingerprint)
+        except Exception as e:
+            logger.warning("Failed to write schema: %s", e)
+        self.fingerprint = fingerprint
+        self.ttl = ttl
 
     def read_namespace_member(self, namespace, member):
         value = self._dict[namespace][member]
 
-        if isinstance(value, bytes):
-            value = json.loads(value.decode('utf-8'))
+        if isinstance(value, _Record):
+            try:
+                value = self._read_record(value)
+            except (zlib.error, ValueError) as e:
+                self._refetch(e)
+                return self._dict[namespace][member]
             self._dict[namespace][member] = value
 
         return value
@@ -531,10 +598,11 @@ class Schema:
         return iter(self._dict[namespace])
 
     def get_help(self, namespace, member):
-        if isinstance(self._help, bytes):
-            self._help = json.loads(
-                self._help.decode('utf-8')  # pylint: disable=no-member
-            )
+        if isinstance(self._help, _Record):
+            try:
+                self._help = self._read_record(self._help)
+            except (zlib.error, ValueError) as e:
+                self._refetch(e)
 
         return self._help[namespace][member]
 
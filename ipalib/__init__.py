@@ -958,6 +958,12 @@ class API(plugable.API):
 
         return result
 
+    def _get_plugin_cache_dir(self):
+        if self.env.context == 'server':
+            from ipaplatform.paths import paths
+            return paths.IPA_SERVER_CACHE_DIR
+        return None
+
 
 def create_api(mode='dummy'):
     """
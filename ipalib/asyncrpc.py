@@ -0,0 +1,306 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+asyncio client of the IPA JSON-RPC interface.
+
+`ipalib.rpc.jsonclient` keeps its connection in the per thread `context` and
+executes one command at a time. `AsyncClient` executes commands concurrently
+from a pool of worker threads. Every worker keeps its own keep-alive HTTPS
+connection, authenticates with the same `KerbTransport` as the command line
+client and encodes requests with `json_encode_binary`. The session cookie
+received by any of the workers is shared with the others, so the Kerberos
+negotiation is done only once:
+
+    >>> api.bootstrap(context='cli')
+    >>> api.finalize()
+    >>> async def main():
+    ...     async with AsyncClient(api, max_connections=8) as client:
+    ...         return await asyncio.gather(*(
+    ...             client.Command.user_show(uid) for uid in uids))
+
+Commands known to the API are converted on the client the same way as by
+``api.Command``, client-side extensions of ``forward()`` (for example file
+uploads or vault encryption) are not executed.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import socket
+import threading
+from ssl import SSLError
+
+from six.moves import http_client
+from six.moves import urllib
+
+from ipalib import errors
+from ipalib.request import context
+from ipalib.rpc import (KerbTransport, JSONServerProxy, ProtocolError,
+                        jsonclient, delete_persistent_client_session_data)
+from ipalib.krb_utils import get_principal
+from ipalib.text import _
+
+logger = logging.getLogger(__name__)
+
+# errors of the connection to the server, the request is retried
+NETWORK_ERRORS = (ProtocolError, SSLError, socket.error,
+                  http_client.HTTPException)
+
+# HTTP status of authentication errors, repeating the request does not help
+HTTP_AUTH_ERRORS = (401, 403)
+
+
+class _PooledKerbTransport(KerbTransport):
+    """
+    KerbTransport reporting the received session cookie to its client.
+    """
+    client = None
+
+    def store_session_cookie(self, cookie_header):
+        cookie = KerbTransport.store_session_cookie(self, cookie_header)
+        if cookie is not None and self.client is not None:
+            self.client.set_session_cookie(cookie)
+        return cookie
+
+
+class _CommandNameSpace(object):
+    """
+    ``api.Command`` like access to the commands of `AsyncClient`.
+    """
+    def __init__(self, client):
+        self.__client = client
+
+    def __getitem__(self, name):
+        return functools.partial(self.__client.call, name)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+class AsyncClient(object):
+    """
+    Execute IPA commands concurrently from asyncio.
+
+    :param api: bootstrapped and finalized `API` in the client context
+    :param max_connections: number of connections to the server and of the
+        commands executed at the same time
+    :param retries: number of times a command is repeated after an error of
+        the connection to the server
+    :param retry_delay: seconds to wait before the first retry, the delay
+        doubles with every retry
+    :param ccache: Kerberos credential cache, the default ccache if None
+    """
+
+    def __init__(self, api, max_connections=10, retries=2, retry_delay=0.5,
+                 ccache=None, loop=None):
+        if max_connections < 1:
+            raise ValueError('max_connections must be at least 1')
+        self.api = api
+        self.max_connections = max_connections
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.ccache = ccache
+        self.loop = loop
+        self.Command = _CommandNameSpace(self)
+
+        self._executor = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+        self._transports = []
+        self._principal = None
+        self._session_cookie = None
+        self._prepared = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_loop(self):
+        if self.loop is None:
+            self.loop = asyncio.get_event_loop()
+        return self.loop
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_connections)
+        return self._executor
+
+    def close(self):
+        """
+        Stop the worker threads and close the connections to the server.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            transports, self._transports = self._transports, []
+        for transport in transports:
+            transport.close()
+        self._local = threading.local()
+
+    def set_session_cookie(self, cookie):
+        with self._lock:
+            self._session_cookie = cookie
+
+    def _prepare(self):
+        """
+        Look up the principal and its stored session cookie before the first
+        request.
+        """
+        with self._prepare_lock:
+            if not self._prepared:
+                self._load_session_cookie()
+                self._prepared = True
+
+    def _load_session_cookie(self):
+        try:
+            self._principal = get_principal(ccache_name=self.ccache)
+        except (errors.CCacheError, ValueError):
+            return
+
+        rpcclient = self.api.Backend.rpcclient
+        cookie = rpcclient.get_session_cookie_from_persistent_storage(
+            self._principal)
+        if cookie is None:
+            return
+        try:
+            cookie.http_return_ok(self._get_url(jsonclient.session_path))
+        except Exception as e:
+            logger.debug("not using stored session cookie: %s", e)
+            return
+        self.set_session_cookie(cookie.http_cookie())
+
+    def _close_transport(self, transport):
+        with self._lock:
+            self._transports.remove(transport)
+        transport.close()
+
+    def _get_url(self, path=None):
+        url = self.api.env.jsonrpc_uri
+        if path is not None:
+            scheme, netloc, _path, params, query, fragment = (
+                urllib.parse.urlparse(url))
+            url = urllib.parse.urlunparse(
+                (scheme, netloc, path, params, query, fragment))
+        return url
+
+    def _get_proxy(self, session_cookie):
+        """
+        Return the server proxy of the current worker thread.
+
+        The proxy is created again when the worker switches between the
+        session and the Kerberos URL.
+        """
+        local = self._local
+        use_session = session_cookie is not None
+        proxy = getattr(local, 'proxy', None)
+        if proxy is not None and local.use_session == use_session:
+            return proxy
+
+        if proxy is not None:
+            self._close_transport(local.transport)
+        if use_session:
+            url = self._get_url(jsonclient.session_path)
+        else:
+            url = self._get_url()
+        transport = _PooledKerbTransport(
+            protocol=jsonclient.protocol, service='HTTP', ccache=self.ccache)
+        transport.client = self
+        with self._lock:
+            self._transports.append(transport)
+        local.transport = transport
+        local.proxy = JSONServerProxy(
+            url, transport=transport, encoding='UTF-8',
+            verbose=self.api.env.verbose, allow_none=True)
+        local.use_session = use_session
+        local.url = url
+        return local.proxy
+
+    def _forward(self, name, args, options):
+        """
+        Execute a command from a worker thread.
+        """
+        self._prepare()
+        context.principal = self._principal
+        context.ca_certfile = self.api.env.tls_ca_cert
+
+        # one more try with Kerberos if the session has expired
+        for _try_num in range(2):
+            session_cookie = self._session_cookie
+            proxy = self._get_proxy(session_cookie)
+            context.request_url = self._local.url
+            context.session_cookie = session_cookie
+            try:
+                return getattr(proxy, name)(list(args), options)
+            except ProtocolError as e:
+                if session_cookie is None or e.errcode != 401:
+                    raise
+                logger.debug("session cookie expired, removing it")
+                with self._lock:
+                    if self._session_cookie == session_cookie:
+                        self._session_cookie = None
+                try:
+                    delete_persistent_client_session_data(self._principal)
+                except Exception as e:
+                    logger.debug("Error trying to remove persisent "
+                                 "session data: %s", e)
+            except BaseException:
+                # the connection may be in a bad state, get a new one
+                self._local.transport.close()
+                raise
+        raise errors.NetworkError(
+            uri=self._local.url,
+            error=_("Exceeded number of tries to forward a request."))
+
+    def _params(self, name, args, options):
+        """
+        Return the forwarded name, args and options of a command.
+        """
+        if name in self.api.Command:
+            cmd = self.api.Command[name]
+            params = cmd.args_options_2_params(*args, **options)
+            params = cmd.normalize(**params)
+            params = cmd.convert(**params)
+            args, options = cmd.params_2_args_options(**params)
+            options.setdefault('version', cmd.api_version)
+            return cmd.forwarded_name, args, options
+        options = dict(options)
+        options.setdefault('version', self.api.env.api_version)
+        return name, args, options
+
+    async def call(self, name, *args, **options):
+        """
+        Execute the command *name* on the server and return its result.
+
+        Errors returned by the server are raised as `PublicError`
+        subclasses. Errors of the connection are retried, note that a
+        command may be executed twice when the connection fails after the
+        server received the request. Authentication errors are not retried.
+        """
+        name, args, options = self._params(name, args, options)
+        loop = self._get_loop()
+        executor = self._get_executor()
+        delay = self.retry_delay
+        for try_num in range(self.retries + 1):
+            try:
+                return await loop.run_in_executor(
+                    executor, self._forward, name, args, options)
+            except NETWORK_ERRORS as e:
+                if (try_num == self.retries or
+                        getattr(e, 'errcode', None) in HTTP_AUTH_ERRORS):
+                    raise errors.NetworkError(uri=self.api.env.jsonrpc_uri,
+                                              error=str(e))
+                logger.debug("[try %d]: %s failed: %s, retrying in %.1f sec",
+                             try_num + 1, name, e, delay)
+                await asyncio.sleep(delay)
+                delay *= 2
+        return None
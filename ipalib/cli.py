@@ -33,6 +33,8 @@ import optparse  # pylint: disable=deprecated-module
 import os
 import pprint
 import fcntl
+import json
+import shlex
 import termios
 import struct
 import base64
@@ -68,7 +70,7 @@ from ipalib.errors import (PublicError, CommandError, HelpError, InternalError,
                            NoSuchNamespaceError, ValidationError, NotFound,
                            NotConfiguredError, PromptFailed)
 from ipalib.constants import CLI_TAB, LDAP_GENERALIZED_TIME_FORMAT
-from ipalib.parameters import File, BinaryFile, Str, Enum, Any, Flag
+from ipalib.parameters import File, BinaryFile, Str, Enum, Any, Flag, Int
 from ipalib.text import _
 from ipalib import api  # pylint: disable=unused-import
 from ipapython.dnsutil import DNSName
@@ -1020,6 +1022,208 @@ class console(frontend.Command):
             )
 
 
+class batch_file(frontend.Command):
+    """Run IPA commands read from a file or the standard input.
+
+    Every line holds one command, written as on the command line without
+    the leading "ipa", e.g. "user-show admin --all". Lines may also be JSON
+    lists of such arguments, or JSON objects in the format of the batch
+    command: {"method": "user_show", "params": [["admin"], {"all": true}]}.
+    Empty lines and lines starting with "#" are ignored.
+
+    The commands are sent to the server in batches over a single connection
+    and their results are printed in order.
+    """
+
+    takes_args = (
+        Str('filename?',
+            label=_('File name'),
+            doc=_('File to read the commands from, "-" or no file name '
+                  'for the standard input'),
+        ),
+    )
+    takes_options = (
+        Int('batch_size',
+            cli_name='size',
+            label=_('Batch size'),
+            doc=_('Maximum number of commands sent in one request'),
+            minvalue=1,
+            default=100,
+            autofill=True,
+        ),
+    )
+    has_output = tuple()
+
+    topic = None
+
+    def _get_command(self, key):
+        name = from_cli(key)
+        if name not in self.api.Command or self.api.Command[name].NO_CLI:
+            raise CommandError(name=key)
+        return self.api.Command[name]
+
+    def _parse_method(self, value):
+        """
+        Return the command and params of a method in the batch format.
+        """
+        try:
+            name = unicode(value['method'])
+            args, options = value['params']
+            args = list(args)
+            options = dict((str(k), v) for k, v in options.items())
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise ValidationError(
+                name='params',
+                error=_('must contain a tuple (list, dict)'))
+        cmd = self._get_command(name)
+        return cmd, cmd.args_options_2_params(*args, **options)
+
+    def _parse_argv(self, argv):
+        """
+        Return the command and params of command line arguments.
+        """
+        if not argv:
+            raise ValidationError(name='line', error=_('no command given'))
+        cmd = self._get_command(argv[0])
+        cli = self.Backend.cli
+        try:
+            params = cli.parse(cmd, argv[1:])
+        except SystemExit:
+            # the usage was printed by the option parser
+            raise ValidationError(name=argv[0], error=_('invalid arguments'))
+        cli.load_files(cmd, params)
+        return cmd, params
+
+    def _parse_line(self, line):
+        """
+        Return the command of a line of input and its converted params.
+
+        Raises `PublicError` or `ValueError` if the line is not valid.
+        """
+        if line.startswith(('[', '{')):
+            value = json.loads(line)
+            if isinstance(value, dict):
+                cmd, params = self._parse_method(value)
+            else:
+                cmd, params = self._parse_argv(
+                    [unicode(arg) for arg in value])
+        else:
+            cmd, params = self._parse_argv(shlex.split(line))
+        params = cmd.normalize(**params)
+        params = cmd.convert(**params)
+        return cmd, params
+
+    def _is_batchable(self, cmd):
+        """
+        Return True if *cmd* only forwards its call to the server.
+
+        Local commands and commands doing client-side work are executed
+        one by one.
+        """
+        if isinstance(cmd, frontend.Local):
+            return False
+        return type(cmd).forward is frontend.Command.forward
+
+    def _print_result(self, cmd, params, result):
+        for param in cmd.params():
+            if param.password and param.name in params:
+                del params[param.name]
+        (args, options) = cmd.params_2_args_options(**params)
+        cmd.output_for_cli(self.api.Backend.textui, result, *args, **options)
+
+    def _print_error(self, lineno, error):
+        print('ipa: ERROR: line %d: %s' % (lineno, error))
+
+    def _send_batch(self, pending):
+        """
+        Execute the *pending* commands in a single batch request.
+
+        The results are printed in input order together with the errors of
+        the invalid lines in between.
+
+        :return: number of failed lines
+        """
+        methods = []
+        for _lineno, cmd, params, error in pending:
+            if error is not None:
+                continue
+            (args, options) = cmd.params_2_args_options(**params)
+            options['version'] = cmd.api_version
+            methods.append(
+                {u'method': unicode(cmd.forwarded_name),
+                 u'params': [list(args), options]})
+
+        results = iter(())
+        if methods:
+            results = iter(self.api.Command.batch(*methods)['results'])
+
+        failed = 0
+        for lineno, cmd, params, error in pending:
+            if error is None:
+                result = next(results)
+                error = result.pop('error', None)
+                if error is None:
+                    self._print_result(cmd, params, result)
+                    continue
+            self._print_error(lineno, error)
+            failed += 1
+        return failed
+
+    def run(self, filename=None, batch_size=100, **options):
+        if filename in (None, u'-'):
+            f = sys.stdin
+        else:
+            try:
+                f = open(filename)
+            except IOError as e:
+                sys.exit("%s: %s" % (e.filename, e.strerror))
+
+        failed = 0
+        # (lineno, cmd, params, error) of the lines not printed yet
+        pending = []
+        batched = 0
+        try:
+            for lineno, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    cmd, params = self._parse_line(line)
+                except (PublicError, ValueError) as e:
+                    pending.append((lineno, None, None, e))
+                    continue
+
+                if not self._is_batchable(cmd):
+                    # keep the order of the results
+                    failed += self._send_batch(pending)
+                    pending = []
+                    batched = 0
+                    try:
+                        result = cmd(**params)
+                    except (PublicError, ValueError) as e:
+                        self._print_error(lineno, e)
+                        failed += 1
+                    else:
+                        self._print_result(cmd, params, result)
+                    continue
+
+                pending.append((lineno, cmd, params, None))
+                batched += 1
+                if batched >= batch_size:
+                    failed += self._send_batch(pending)
+                    pending = []
+                    batched = 0
+
+            if pending:
+                failed += self._send_batch(pending)
+        finally:
+            if f is not sys.stdin:
+                f.close()
+
+        if failed:
+            sys.exit(1)
+
+
 class show_api(frontend.Command):
     'Show attributes on dynamic API object'
 
@@ -1442,6 +1646,7 @@ class IPAHelpFormatter(optparse.IndentedHelpFormatter):
 cli_plugins = (
     cli,
     textui,
+    batch_file,
     console,
     help,
     show_mappings,
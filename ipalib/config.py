@@ -521,7 +521,7 @@ class Env:
 
         # Set plugins_on_demand:
         if 'plugins_on_demand' not in self:
-            self.plugins_on_demand = (self.context == 'cli')
+            self.plugins_on_demand = (self.context in ('cli', 'server'))
 
     def _finalize_core(self, **defaults):
         """
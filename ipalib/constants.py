@@ -161,6 +161,22 @@ DEFAULT_CONFIG = (
     # Session stuff:
     ('kinit_lifetime', None),
 
+    # LDAP connection pool of the WSGI server, size 0 disables pooling.
+    # Times are in seconds.
+    ('ldap_pool_size', 8),
+    ('ldap_pool_max_idle', 300),
+    ('ldap_pool_max_lifetime', 3600),
+    ('ldap_pool_check_interval', 30),
+    # How often a cached cn=ipaConfig entry is revalidated [seconds],
+    # 0 disables the process-wide cache.
+    ('ipaconfig_cache_ttl', 30),
+    # Number of threads executing read-only methods of a batch concurrently,
+    # 0 or 1 executes them one after another.
+    ('batch_max_workers', 0),
+    # Compress RPC responses larger than this many bytes when the client
+    # accepts it, 0 leaves compression to the web server (mod_deflate).
+    ('rpc_compress_threshold', 0),
+
     # Debugging:
     ('verbose', 0),
     ('debug', False),
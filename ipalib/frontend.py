@@ -35,7 +35,7 @@ from ipalib.text import _
 from ipalib.errors import (ZeroArgumentError, MaxArgumentError, OverlapError,
     VersionError, OptionError,
     ValidationError, ConversionError)
-from ipalib import errors, messages
+from ipalib import errors, messages, stats
 from ipalib.request import context, context_frame
 from ipalib.util import classproperty, json_serialize
 
@@ -461,20 +461,21 @@ class Command(HasParam):
                 # add message only on server side
                 self.add_message(
                     messages.VersionMissing(server_version=self.api_version))
-        params = self.args_options_2_params(*args, **options)
-        logger.debug(
-            'raw: %s(%s)', self.name, ', '.join(self._repr_iter(**params))
-        )
-        if self.api.env.in_server:
-            params.update(self.get_default(**params))
-        params = self.normalize(**params)
-        params = self.convert(**params)
-        logger.debug(
-            '%s(%s)', self.name, ', '.join(self._repr_iter(**params))
-        )
-        if self.api.env.in_server:
-            self.validate(**params)
-        (args, options) = self.params_2_args_options(**params)
+        with stats.timed('params'):
+            params = self.args_options_2_params(*args, **options)
+            logger.debug(
+                'raw: %s(%s)', self.name, ', '.join(self._repr_iter(**params))
+            )
+            if self.api.env.in_server:
+                params.update(self.get_default(**params))
+            params = self.normalize(**params)
+            params = self.convert(**params)
+            logger.debug(
+                '%s(%s)', self.name, ', '.join(self._repr_iter(**params))
+            )
+            if self.api.env.in_server:
+                self.validate(**params)
+            (args, options) = self.params_2_args_options(**params)
         ret = self.run(*args, **options)
         if isinstance(ret, dict):
             for message in self.context.__messages:
@@ -16,6 +16,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+import threading
 import time
 import re
 
@@ -196,3 +198,78 @@ def get_credentials_if_valid(name=None, ccache_name=None):
         return None
     except gssapi.exceptions.GSSError:
         return None
+
+
+# ccache file -> (ccache file signature, principal, expiration time) of
+# credentials validated by get_valid_principal(), a FILE ccache holds
+# credentials of a single principal
+_valid_principals = {}
+_valid_principals_lock = threading.Lock()
+VALID_PRINCIPALS_CACHE_SIZE = 256
+
+
+def _get_ccache_signature(ccache_name):
+    '''
+    Return the path and a signature of the file of a FILE ccache or
+    ``(None, None)`` for other ccache types.
+    '''
+    scheme, location = krb5_parse_ccache(ccache_name)
+    if scheme != 'FILE':
+        return None, None
+    try:
+        st = os.stat(location)
+    except OSError:
+        return None, None
+    return location, (st.st_ino, st.st_mtime, st.st_size)
+
+
+def get_valid_principal(ccache_name, principal=None):
+    '''
+    Return the name of the principal with valid credentials in the ccache.
+
+    This is `get_credentials_if_valid` for repeated checks of the same
+    ccache. The result for a FILE ccache is cached in the process until the
+    credentials expire or the ccache file is modified.
+
+    :parameters:
+      ccache_name
+        string specifying Kerberos credentials cache name
+      principal
+        principal name as string or None for the default
+    :returns:
+      principal name as string or None if valid credentials weren't found
+    '''
+    path, signature = _get_ccache_signature(ccache_name)
+    if path is not None:
+        with _valid_principals_lock:
+            cached = _valid_principals.get(path)
+        if cached is not None:
+            cached_signature, name, expiration = cached
+            if (cached_signature == signature and
+                    time.time() < expiration and
+                    principal in (None, name)):
+                return name
+
+    gss_name = None
+    if principal is not None:
+        gss_name = gssapi.Name(principal, gssapi.NameType.kerberos_principal)
+    creds = get_credentials_if_valid(name=gss_name, ccache_name=ccache_name)
+    if not creds:
+        if path is not None:
+            with _valid_principals_lock:
+                _valid_principals.pop(path, None)
+        return None
+
+    name = unicode(creds.name)
+    if path is not None:
+        expiration = time.time() + creds.lifetime
+        with _valid_principals_lock:
+            if len(_valid_principals) >= VALID_PRINCIPALS_CACHE_SIZE:
+                now = time.time()
+                for k, v in list(_valid_principals.items()):
+                    if v[2] <= now:
+                        del _valid_principals[k]
+                if len(_valid_principals) >= VALID_PRINCIPALS_CACHE_SIZE:
+                    _valid_principals.clear()
+            _valid_principals[path] = (signature, name, expiration)
+    return name
@@ -487,6 +487,16 @@ class FailedToAddHostDNSRecords(PublicMessage):
                "%(reason)s")
 
 
+class SearchResultPage(PublicMessage):
+    """
+    **13031** Result of LDAP search is a page of all matching entries
+    """
+
+    errno = 13031
+    type = "info"
+    format = _("Entries %(first)d to %(last)d of %(total)d")
+
+
 def iter_messages(variables, base):
     """Return a tuple with all subclasses
     """
@@ -24,6 +24,8 @@ The classes in this module make heavy use of Python container emulation. If
 you are unfamiliar with this Python feature, see
 http://docs.python.org/ref/sequence-types.html
 """
+import hashlib
+import json
 import logging
 import operator
 import re
@@ -32,6 +34,7 @@ import threading
 import os
 from os import path
 import optparse  # pylint: disable=deprecated-module
+import tempfile
 import textwrap
 import collections
 import importlib
@@ -89,6 +92,101 @@ def find_modules_in_dir(src_dir):
         yield module
 
 
+class PluginModuleCache:
+    """
+    Cache of the plugin modules found in plugin packages.
+
+    The cache is stored in ``cache_dir``, keyed by the IPA version and the
+    plugin packages, and lists the modules which provide plugins. New
+    processes import these modules directly instead of searching the package
+    directories and importing helper modules which do not provide any.
+
+    The names and modification times of the files in the package directories
+    are stored with the modules, the cache is not used once a module has been
+    added, removed or changed.
+    """
+
+    # bump when the format of the cache file changes
+    DISK_FORMAT = 2
+
+    def __init__(self, cache_dir, packages):
+        self.cache_dir = cache_dir
+        self.packages = {
+            package.__name__: path.dirname(path.abspath(package.__file__))
+            for package in packages
+        }
+        key = json.dumps([VERSION, API_VERSION, sorted(self.packages.items())])
+        self.filename = path.join(
+            cache_dir,
+            'plugins-{}.json'.format(
+                hashlib.sha1(key.encode('utf-8')).hexdigest()))
+        try:
+            self.listing = {
+                name: self._list_dir(package_dir)
+                for name, package_dir in self.packages.items()
+            }
+        except OSError as e:
+            logger.debug("Unable to list plugin packages: %s", e)
+            self.listing = None
+
+    @staticmethod
+    def _list_dir(package_dir):
+        """
+        Return names and modification times of the modules in package_dir.
+        """
+        listing = []
+        for name in sorted(os.listdir(package_dir)):
+            if name.endswith('.py'):
+                mtime = os.stat(path.join(package_dir, name)).st_mtime
+                listing.append([name, mtime])
+        return listing
+
+    def load(self):
+        """
+        Return a ``dict`` mapping package names to module names or ``None``.
+        """
+        if self.listing is None:
+            return None
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug("Unable to read plugin module cache %s: %s",
+                         self.filename, e)
+            return None
+        if (not isinstance(data, dict) or
+                data.get('format') != self.DISK_FORMAT or
+                data.get('version') != VERSION or
+                data.get('packages') != self.packages or
+                data.get('listing') != self.listing):
+            logger.debug("Plugin module cache %s is outdated", self.filename)
+            return None
+        return data['modules']
+
+    def store(self, modules):
+        """
+        Store the ``dict`` mapping package names to module names.
+        """
+        if self.listing is None:
+            return
+        data = dict(format=self.DISK_FORMAT, version=VERSION,
+                    packages=self.packages, listing=self.listing,
+                    modules=modules)
+        try:
+            fd, tmpname = tempfile.mkstemp(dir=self.cache_dir,
+                                           prefix='.plugins-')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.rename(tmpname, self.filename)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        except (IOError, OSError) as e:
+            logger.debug("Unable to write plugin module cache %s: %s",
+                         self.filename, e)
+
+
 class Registry:
     """A decorator that makes plugins available to the API
 
@@ -357,6 +455,7 @@ class API(ReadOnly):
         self.__plugins_by_key = {}
         self.__default_map = {}
         self.__instances = {}
+        self.__instances_lock = threading.RLock()
         self.__next = {}
         self.__done = set()
         self.env = Env()
@@ -622,15 +721,40 @@ class API(ReadOnly):
         self.__do_if_not_done('bootstrap')
         if self.env.mode in ('dummy', 'unit_test'):
             return
-        for package in self.packages:
-            self.add_package(package)
+        packages = self.packages
+        cache = None
+        cached = None
+        cache_dir = self._get_plugin_cache_dir()
+        if cache_dir is not None:
+            cache = PluginModuleCache(cache_dir, packages)
+            cached = cache.load()
+
+        found = {}
+        for package in packages:
+            modules = None
+            if cached is not None:
+                modules = cached.get(package.__name__)
+            found[package.__name__] = self.add_package(package, modules)
+
+        if cache is not None and cached is None:
+            cache.store(found)
+
+    def _get_plugin_cache_dir(self):
+        """
+        Return the directory to cache the plugin modules in or ``None``.
+        """
+        return None
 
     # FIXME: This method has no unit test
-    def add_package(self, package):
+    def add_package(self, package, modules=None):
         """
         Add plugin modules from the ``package``.
 
         :param package: A package from which to add modules.
+        :param modules: Names of the modules to add, by default all modules
+                        found in the package are added.
+        :return: Names of the modules which were not rejected as plugin
+                 modules.
         """
         package_name = package.__name__
         package_file = package.__file__
@@ -644,15 +768,21 @@ class API(ReadOnly):
             )
 
         logger.debug("importing all plugin modules in %s...", package_name)
-        modules = getattr(package, 'modules', find_modules_in_dir(package_dir))
-        modules = ['.'.join((package_name, mname)) for mname in modules]
+        if modules is None:
+            modules = getattr(package, 'modules',
+                              find_modules_in_dir(package_dir))
 
-        for name in modules:
+        added = []
+        for mname in modules:
+            name = '.'.join((package_name, mname))
             logger.debug("importing plugin module %s", name)
             try:
                 module = importlib.import_module(name)
             except errors.SkipPluginModule as e:
+                # whether a module is skipped depends on the environment,
+                # keep it in the list
                 logger.debug("skipping plugin module %s: %s", name, e.reason)
+                added.append(mname)
                 continue
             except Exception as e:
                 if self.env.startup_traceback:
@@ -663,6 +793,9 @@ class API(ReadOnly):
                 self.add_module(module)
             except errors.PluginModuleError as e:
                 logger.debug("%s", e)
+            else:
+                added.append(mname)
+        return added
 
     def add_module(self, module):
         """
@@ -802,9 +935,17 @@ class API(ReadOnly):
             raise KeyError(plugin)
 
         try:
-            instance = self.__instances[plugin]
+            return self.__instances[plugin]
         except KeyError:
-            instance = self.__instances[plugin] = plugin(self)
+            pass
+
+        # plugins finalized on demand may be looked up by several threads
+        # working on the same request
+        with self.__instances_lock:
+            try:
+                instance = self.__instances[plugin]
+            except KeyError:
+                instance = self.__instances[plugin] = plugin(self)
 
         return instance
 
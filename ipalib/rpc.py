@@ -33,6 +33,7 @@ Also see the `ipaserver.rpcserver` module.
 from __future__ import absolute_import
 
 from decimal import Decimal
+import atexit
 import datetime
 import logging
 import os
@@ -42,6 +43,10 @@ import json
 import re
 import socket
 import gzip
+import tempfile
+import threading
+import time
+import zlib
 from cryptography import x509 as crypto_x509
 
 import gssapi
@@ -51,7 +56,7 @@ import six
 from six.moves import urllib
 
 from ipalib.backend import Connectible
-from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT
+from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT, USER_CACHE_PATH
 from ipalib.errors import (public_errors, UnknownError, NetworkError,
                            XMLRPCMarshallError, JSONError)
 from ipalib import errors, capabilities
@@ -160,6 +165,8 @@ def xml_wrap(value, version):
 
     :param value: The simple scalar or simple compound value to wrap.
     """
+    if isinstance(value, PreEncodedJSON):
+        return xml_wrap(value.value, version)
     if type(value) in (list, tuple):
         return tuple(xml_wrap(v, version) for v in value)
     if isinstance(value, dict):
@@ -334,6 +341,7 @@ class _JSONPrimer(dict):
             dict: self._enc_dict,
             crypto_x509.Certificate: self._enc_certificate,
             crypto_x509.CertificateSigningRequest: self._enc_certificate,
+            PreEncodedJSON: self._enc_pre_encoded,
         })
 
     def __missing__(self, typ):
@@ -400,6 +408,9 @@ class _JSONPrimer(dict):
     def _enc_certificate(self, val):
         return self._enc_bytes(val.public_bytes(x509_Encoding.DER))
 
+    def _enc_pre_encoded(self, val):
+        return self.convert(val.value)
+
 
 def json_encode_binary(val, version, pretty_print=False):
     """Serialize a Python object structure to JSON
@@ -418,6 +429,153 @@ def json_encode_binary(val, version, pretty_print=False):
         return json.dumps(result)
 
 
+def _json_is_streamed(val, depth):
+    cls = val.__class__
+    if depth <= 0:
+        return False
+    if cls is dict:
+        return all(k.__class__ is unicode for k in val)
+    return cls is list
+
+
+def _json_prime(val, primer, depth):
+    """Prime the outer *depth* levels of dicts and lists in place"""
+    if val.__class__ is tuple and depth > 0:
+        val = list(val)
+    if not _json_is_streamed(val, depth):
+        if val.__class__ is PreEncodedJSON:
+            return val
+        return primer.convert(val)
+    if val.__class__ is dict:
+        for k, v in six.iteritems(val):
+            val[k] = _json_prime(v, primer, depth - 1)
+    else:
+        for i, v in enumerate(val):
+            val[i] = _json_prime(v, primer, depth - 1)
+    return val
+
+
+def _json_iterencode(val, depth):
+    if not _json_is_streamed(val, depth):
+        if val.__class__ is PreEncodedJSON:
+            yield val
+        else:
+            yield json.dumps(val)
+    elif val.__class__ is dict:
+        yield '{'
+        sep = ''
+        for k, v in six.iteritems(val):
+            yield sep + json.dumps(k) + ': '
+            for chunk in _json_iterencode(v, depth - 1):
+                yield chunk
+            sep = ', '
+        yield '}'
+    else:
+        yield '['
+        sep = ''
+        for v in val:
+            yield sep
+            for chunk in _json_iterencode(v, depth - 1):
+                yield chunk
+            sep = ', '
+        yield ']'
+
+
+def json_encode_binary_iter(val, version, depth=3, chunk_size=65536,
+                            raw_values=False):
+    """Serialize a Python object structure to JSON piece by piece
+
+    The output is identical to json_encode_binary() without pretty printing.
+    The outer *depth* levels of dicts and lists are walked in Python, every
+    value below is primed and encoded on its own. The whole JSON document
+    is never held in memory.
+
+    The values are primed before this function returns, replacing them in
+    the dicts and lists of the outer *depth* levels of *val*, so there is
+    no second copy of the structure either. Errors, e.g. TypeError for a
+    value which can't be serialized, are raised here and not while the
+    chunks are consumed.
+
+    :param object val: Python object structure, modified in place
+    :param str version: client version
+    :param int depth: number of container levels to stream
+    :param int chunk_size: minimum size of the returned chunks
+    :param bool raw_values: return PreEncodedJSON values within the outer
+                            *depth* levels as they are instead of their data
+    :return: iterator over UTF-8 encoded chunks
+    """
+    val = _json_prime(val, _JSONPrimer(version), depth)
+    return _json_iter_chunks(val, depth, chunk_size, raw_values)
+
+
+def _json_iter_chunks(val, depth, chunk_size, raw_values):
+    buf = []
+    size = 0
+    for chunk in _json_iterencode(val, depth):
+        if chunk.__class__ is PreEncodedJSON:
+            if buf:
+                yield ''.join(buf).encode('utf-8')
+                buf = []
+                size = 0
+            yield chunk if raw_values else chunk.data
+            continue
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield ''.join(buf).encode('utf-8')
+            buf = []
+            size = 0
+    if buf:
+        yield ''.join(buf).encode('utf-8')
+
+
+class PreEncodedJSON(object):
+    """A value which has been serialized to JSON in advance
+
+    Large constant results (e.g. the API schema) are encoded and compressed
+    once instead of on every request. json_encode_binary_iter() inserts the
+    JSON data into its output as is and the WSGI server sends the compressed
+    form to clients accepting gzip. Everything else falls back to the
+    decoded value.
+
+    The data must not contain values depending on client capabilities, it
+    is sent to all clients regardless of their version.
+
+    :param bytes data: UTF-8 encoded JSON
+    :param bytes deflated: raw deflate stream of data, ended by a sync flush
+    :param str etag: entity tag of data
+    """
+    __slots__ = ('data', 'deflated', 'etag', '_value')
+
+    def __init__(self, data, deflated=None, etag=None):
+        if deflated is None:
+            compressor = zlib.compressobj(
+                zlib.Z_BEST_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+            deflated = (compressor.compress(data) +
+                        compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.data = data
+        self.deflated = deflated
+        self.etag = etag
+        self._value = None
+
+    @classmethod
+    def encode(cls, val, version, etag=None):
+        """Serialize a Python object structure for later use
+
+        :param object val: Python object structure
+        :param str version: API version to encode the structure for
+        :param str etag: entity tag of the result
+        """
+        data = json_encode_binary(val, version).encode('utf-8')
+        return cls(data, etag=etag)
+
+    @property
+    def value(self):
+        if self._value is None:
+            self._value = json_decode_binary(self.data)
+        return self._value
+
+
 def _ipa_obj_hook(dct, _iteritems=six.iteritems, _list=list):
     """JSON object hook
 
@@ -781,7 +939,7 @@ class KerbTransport(SSLTransport):
         the request URL. Then write the session cookie into the key
         store for the principal. If the cookie header is None or the
         session cookie is not present in the header no action is
-        taken.
+        taken. Returns the stored cookie string or None.
 
         Context Dependencies:
 
@@ -794,7 +952,7 @@ class KerbTransport(SSLTransport):
         '''
 
         if cookie_header is None:
-            return
+            return None
 
         principal = getattr(context, 'principal', None)
         request_url = getattr(context, 'request_url', None)
@@ -818,10 +976,10 @@ class KerbTransport(SSLTransport):
         except Exception as e:
             logger.error("unable to parse cookie header '%s': %s",
                          cookie_header, e)
-            return
+            return None
 
         if session_cookie is None:
-            return
+            return None
 
         cookie_string = self._slice_session_cookie(session_cookie)
         logger.debug("storing cookie '%s' for principal %s",
@@ -831,6 +989,7 @@ class KerbTransport(SSLTransport):
         except Exception as e:
             # Not fatal, we just can't use the session cookie we were sent.
             pass
+        return cookie_string
 
     def parse_response(self, response):
         if six.PY2:
@@ -851,6 +1010,187 @@ class DelegatedKerbTransport(KerbTransport):
              gssapi.RequirementFlag.out_of_sequence_detection]
 
 
+class ServerRanking(object):
+    """
+    Health and round trip time of IPA servers, stored in the user cache.
+
+    Servers are probed concurrently by opening a TCP connection to their
+    HTTP port. The results are stored per server and used to order the
+    servers tried by `RPCClient.create_connection`, so servers which are
+    down are tried last instead of waiting for their timeouts.
+    """
+
+    # how long the stored results are used [seconds]
+    ttl = 3600
+    # age of the stored results after which they are refreshed [seconds]
+    refresh_interval = 300
+    # how long to wait for a server to accept a connection [seconds]
+    probe_timeout = 3
+
+    # held while the results are written, see _finish_store
+    _store_lock = threading.Lock()
+    _finish_registered = False
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.path.join(USER_CACHE_PATH, 'ipa', 'servers.json')
+        self.filename = filename
+        self.refresh_thread = None
+
+    @staticmethod
+    def _get_address(url):
+        parsed = urllib.parse.urlparse(url)
+        port = parsed.port
+        if port is None:
+            port = 443 if parsed.scheme == 'https' else 80
+        return parsed.hostname, port
+
+    @staticmethod
+    def _is_valid(entry):
+        if not isinstance(entry, dict):
+            return False
+        rtt = entry.get('rtt')
+        return (isinstance(entry.get('time'), (int, float)) and
+                (rtt is None or isinstance(rtt, (int, float))))
+
+    def _load(self):
+        try:
+            with open(self.filename) as f:
+                results = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug('Unable to read server ranking %s: %s',
+                         self.filename, e)
+            return {}
+        if not isinstance(results, dict):
+            logger.debug('Invalid server ranking %s', self.filename)
+            return {}
+        return {
+            key: entry for key, entry in results.items()
+            if self._is_valid(entry)
+        }
+
+    @classmethod
+    def _finish_store(cls):
+        # Wait for a background refresh writing the results and keep
+        # others from starting, so no temporary file is left behind when
+        # the daemon thread is stopped at exit.
+        cls._store_lock.acquire()
+
+    def _store(self, results):
+        directory = os.path.dirname(self.filename)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            with self._store_lock:
+                fd, tmpname = tempfile.mkstemp(dir=directory,
+                                               prefix='.servers-')
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        json.dump(results, f)
+                    os.rename(tmpname, self.filename)
+                except BaseException:
+                    os.unlink(tmpname)
+                    raise
+        except (IOError, OSError) as e:
+            logger.debug('Unable to write server ranking %s: %s',
+                         self.filename, e)
+
+    def _probe_one(self, url, results):
+        host, port = self._get_address(url)
+        start = time.time()
+        try:
+            sock = socket.create_connection((host, port), self.probe_timeout)
+        except (socket.error, socket.timeout) as e:
+            logger.debug('Probing %s failed: %s', url, e)
+            rtt = None
+        else:
+            rtt = time.time() - start
+            sock.close()
+        results['%s:%d' % (host, port)] = dict(rtt=rtt, time=time.time())
+
+    def probe(self, urls):
+        """
+        Probe the servers of *urls* concurrently and store the results.
+        """
+        probed = {}
+        threads = [
+            threading.Thread(target=self._probe_one, args=(url, probed))
+            for url in urls
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        deadline = time.time() + self.probe_timeout + 1
+        for thread in threads:
+            thread.join(max(deadline - time.time(), 0))
+
+        probed = dict(probed)
+        # servers which did not answer in time are considered down
+        for url in urls:
+            key = '%s:%d' % self._get_address(url)
+            if key not in probed:
+                probed[key] = dict(rtt=None, time=time.time())
+
+        results = self._load()
+        results.update(probed)
+        self._store(results)
+        return results
+
+    def refresh(self, urls):
+        """
+        Probe the servers of *urls* in a background thread.
+
+        The thread does not keep the process from exiting.
+        """
+        if not ServerRanking._finish_registered:
+            ServerRanking._finish_registered = True
+            atexit.register(ServerRanking._finish_store)
+        thread = threading.Thread(target=self.probe, args=(urls,))
+        thread.daemon = True
+        thread.start()
+        self.refresh_thread = thread
+
+    def rank(self, urls, priorities=None):
+        """
+        Return *urls* ordered by the health and round trip time of their
+        servers.
+
+        The first URL (the configured server) stays first while it is
+        alive. The other live servers follow ordered by their SRV
+        *priorities* and, within a priority, by round trip time; servers
+        without results keep their order after the measured ones. Servers
+        which are down come last.
+
+        Nothing is probed before returning. Missing or old results are
+        refreshed in the background for the next call.
+        """
+        if priorities is None:
+            priorities = [0] * len(urls)
+        now = time.time()
+        results = self._load()
+        entries = [
+            results.get('%s:%d' % self._get_address(url)) for url in urls
+        ]
+
+        if any(e is None or now - e['time'] > self.refresh_interval
+               for e in entries):
+            self.refresh(urls)
+
+        def get_key(i):
+            entry = entries[i]
+            if entry is not None and now - entry['time'] > self.ttl:
+                entry = None
+            if entry is not None and entry['rtt'] is None:
+                return (2, priorities[i], 0, i)
+            if i == 0:
+                return (0, 0, 0, i)
+            if entry is None:
+                return (1, priorities[i], 1, i)
+            return (1, priorities[i], 0, entry['rtt'], i)
+
+        return [urls[i] for i in sorted(range(len(urls)), key=get_key)]
+
+
 class RPCClient(Connectible):
     """
     Forwarding backend plugin for XML-RPC client.
@@ -868,6 +1208,13 @@ class RPCClient(Connectible):
         """
         Create a list of urls consisting of the available IPA servers.
         """
+        return [url for url, _priority in self._get_servers(rpc_uri)]
+
+    def _get_servers(self, rpc_uri):
+        """
+        Return the urls of the available IPA servers with their SRV
+        priority, the configured server first with priority 0.
+        """
         # the configured URL defines what we use for the discovered servers
         (_scheme, _netloc, path, _params, _query, _fragment
             ) = urllib.parse.urlparse(rpc_uri)
@@ -881,13 +1228,12 @@ class RPCClient(Connectible):
 
         for answer in answers:
             server = str(answer.target).rstrip(".")
-            servers.append('https://%s%s' % (ipautil.format_netloc(server), path))
-
-        # make sure the configured master server is there just once and
-        # it is the first one.
-        if rpc_uri in servers:
-            servers.remove(rpc_uri)
-        servers.insert(0, rpc_uri)
+            url = 'https://%s%s' % (ipautil.format_netloc(server), path)
+            # make sure the configured master server is there just once
+            # and it is the first one.
+            if url != rpc_uri:
+                servers.append((url, answer.priority))
+        servers.insert(0, (rpc_uri, 0))
 
         return servers
 
@@ -1022,7 +1368,11 @@ class RPCClient(Connectible):
         except (errors.CCacheError, ValueError):
             # No session key, do full Kerberos auth
             pass
-        urls = self.get_url_list(rpc_uri)
+        servers = self._get_servers(rpc_uri)
+        urls = [url for url, _priority in servers]
+        if fallback and len(urls) > 1:
+            urls = ServerRanking().rank(
+                urls, [priority for _url, priority in servers])
 
         proxy_kw = {
             'allow_none': True,
@@ -0,0 +1,158 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Per-request timing of commands and backend operations.
+
+While a server request is handled, a `RequestStats` instance is stored on
+`ipalib.request.context`. Code talking to backends reports the duration of
+its operations with `timed()`, which does nothing outside of a request.
+When the request is finished, its statistics are added to the per-process
+totals returned by `get_totals()`.
+"""
+
+import bisect
+import contextlib
+import threading
+import time
+
+from ipalib.request import context
+
+
+class RequestStats(object):
+    """
+    Count and duration of the operations performed by one request.
+
+    The statistics may be shared by the threads working on the request.
+    """
+    __slots__ = ('name', 'start', 'duration', 'operations', '_lock')
+
+    def __init__(self):
+        self.name = None
+        self.start = time.time()
+        self.duration = None
+        # operation name -> [count, total duration in seconds]
+        self.operations = {}
+        self._lock = threading.Lock()
+
+    def add(self, operation, duration, count=1):
+        with self._lock:
+            try:
+                values = self.operations[operation]
+            except KeyError:
+                self.operations[operation] = [count, duration]
+            else:
+                values[0] += count
+                values[1] += duration
+
+    def as_dict(self):
+        """Return the statistics as a JSON serializable ``dict``."""
+        with self._lock:
+            operations = {
+                name: dict(count=count, duration=round(duration, 6))
+                for name, (count, duration) in self.operations.items()
+            }
+        return dict(
+            command=self.name,
+            duration=round(self.duration or 0.0, 6),
+            operations=operations,
+        )
+
+
+# upper bounds of the command duration histogram buckets [seconds]
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                    10.0, 30.0)
+
+# time the statistics of this process started to be collected
+process_start_time = time.time()
+
+# per-process totals: name -> [count, total duration in seconds]
+# commands additionally count their requests per duration bucket, the last
+# bucket holds requests exceeding the largest bound
+_command_totals = {}
+_operation_totals = {}
+_totals_lock = threading.Lock()
+
+
+def start_request():
+    """
+    Start collecting statistics for the request handled by this thread.
+    """
+    stats = RequestStats()
+    context.request_stats = stats
+    return stats
+
+
+def finish_request(name=None):
+    """
+    Stop collecting statistics for the current request.
+
+    The statistics are added to the per-process totals under the command
+    *name* and returned, ``None`` is returned if no request was started.
+    """
+    stats = getattr(context, 'request_stats', None)
+    if stats is None:
+        return None
+    del context.request_stats
+
+    stats.name = name
+    stats.duration = time.time() - stats.start
+    with _totals_lock:
+        if name is not None:
+            values = _command_totals.get(name)
+            if values is None:
+                values = [0, 0.0, [0] * (len(DURATION_BUCKETS) + 1)]
+                _command_totals[name] = values
+            values[0] += 1
+            values[1] += stats.duration
+            values[2][bisect.bisect_left(
+                DURATION_BUCKETS, stats.duration)] += 1
+        for operation, (count, duration) in stats.operations.items():
+            values = _operation_totals.setdefault(operation, [0, 0.0])
+            values[0] += count
+            values[1] += duration
+    return stats
+
+
+def get_request_stats():
+    """
+    Return the `RequestStats` of the current request or ``None``.
+    """
+    return getattr(context, 'request_stats', None)
+
+
+@contextlib.contextmanager
+def timed(operation):
+    """
+    Context manager recording the duration of its block as *operation*.
+    """
+    stats = getattr(context, 'request_stats', None)
+    if stats is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        stats.add(operation, time.time() - start)
+
+
+def get_totals():
+    """
+    Return the per-process totals of finished requests.
+
+    :return: ``dict`` with the keys ``commands`` mapping command names to
+             ``(count, duration, buckets)`` tuples and ``operations``
+             mapping operation names to ``(count, duration)`` tuples. The
+             *buckets* hold the number of requests per `DURATION_BUCKETS`
+             bound (not cumulative) and the number of slower requests.
+    """
+    with _totals_lock:
+        return dict(
+            commands={
+                k: (count, duration, tuple(buckets))
+                for k, (count, duration, buckets) in _command_totals.items()
+            },
+            operations={k: tuple(v) for k, v in _operation_totals.items()},
+        )
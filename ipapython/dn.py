@@ -460,6 +460,26 @@ def _normalize_ava_input(val):
     return val
 
 
+@functools.lru_cache(maxsize=4096)
+def _parse_dn(value):
+    """
+    Parse a DN string.
+
+    Returns a tuple of RDNs, each a tuple of (attr, value, flags) AVAs in
+    sorted order, and the normalized string form of the DN. Results are
+    cached since the same DNs are parsed over and over again; they are
+    shared and must never be modified.
+    """
+    try:
+        rdns = str2dn(val_encode(value))
+    except DECODING_ERROR:
+        raise ValueError("malformed RDN string = \"%s\"" % value)
+    for rdn in rdns:
+        sort_avas(rdn)
+    rdns = tuple(tuple(tuple(ava) for ava in rdn) for rdn in rdns)
+    return rdns, dn2str(rdns)
+
+
 def str2rdn(value):
     try:
         rdns = str2dn(value.encode('utf-8'))
@@ -1103,7 +1123,24 @@ class DN:
     AVA_type = AVA
     RDN_type = RDN
 
+    # Normalized string form and comparison key, computed on demand.
+    # Both are derived from rdns, which are never modified in place and
+    # may be shared between DN instances.
+    _str = None
+    _key = None
+
     def __init__(self, *args, **kwds):
+        if len(args) == 1:
+            value = args[0]
+            if isinstance(value, str):
+                rdns, self._str = _parse_dn(value)
+                self.rdns = list(rdns)
+                return
+            elif isinstance(value, DN):
+                self.rdns = list(value.rdns)
+                self._str = value._str
+                self._key = value._key
+                return
         self.rdns = self._rdns_from_sequence(args)
 
     def _copy_rdns(self, rdns=None):
@@ -1113,16 +1150,9 @@ class DN:
 
     def _rdns_from_value(self, value):
         if isinstance(value, str):
-            try:
-                if isinstance(value, str):
-                    value = val_encode(value)
-                rdns = str2dn(value)
-            except DECODING_ERROR:
-                raise ValueError("malformed RDN string = \"%s\"" % value)
-            for rdn in rdns:
-                sort_avas(rdn)
+            rdns = list(_parse_dn(value)[0])
         elif isinstance(value, DN):
-            rdns = value._copy_rdns()
+            rdns = value.rdns
         elif isinstance(value, (tuple, list, AVA)):
             ava = get_ava(value)
             rdns = [[ava]]
@@ -1156,7 +1186,11 @@ class DN:
         return self.RDN_type(*rdn, **{'raw': True})
 
     def ldap_text(self):
-        return dn2str(self.rdns)
+        text = self._str
+        if text is None:
+            text = dn2str(self.rdns)
+            self._str = text
+        return text
 
     def x500_text(self):
         return dn2str(reversed(self.rdns))
@@ -1195,20 +1229,18 @@ class DN:
             raise TypeError("unsupported type for DN indexing, must be int, basestring or slice; not %s" % \
                                 (key.__class__.__name__))
 
-    def __hash__(self):
-        # Hash is computed from DN's string representation.
-        #
+    def _get_key(self):
         # Because attrs & values are comparison case-insensitive the
-        # hash value between two objects which compare as equal but
-        # differ in case must yield the same hash value.
+        # key is built from the lower-cased AVAs of each RDN. DNs which
+        # compare as equal have equal keys and thus equal hash values.
+        key = self._key
+        if key is None:
+            key = tuple(rdn_key(rdn) for rdn in self.rdns)
+            self._key = key
+        return key
 
-        str_dn = ';,'.join([
-            '++'.join([
-                '=='.join((atype, avalue or ''))
-                for atype, avalue, _dummy in rdn
-            ]) for rdn in self.rdns
-        ])
-        return hash(str_dn.lower())
+    def __hash__(self):
+        return hash(self._get_key())
 
     def __eq__(self, other):
         # Try coercing to DN, if successful compare to coerced object
@@ -1227,7 +1259,7 @@ class DN:
             return False
 
         # Perform comparison between objects of same type
-        return self._cmp_sequence(other, 0, len(self)) == 0
+        return self._get_key() == other._get_key()
 
     def __ne__(self, other):
         return not self.__eq__(other)
@@ -1239,7 +1271,7 @@ class DN:
         if len(self) != len(other):
             return len(self) < len(other)
 
-        return self._cmp_sequence(other, 0, len(self)) < 0
+        return self._get_key() < other._get_key()
 
     def _cmp_sequence(self, pattern, self_start, pat_len):
         self_idx = self_start
@@ -1317,7 +1349,8 @@ class DN:
                 start = end - pat_len
 
         if end-start >= pat_len:
-            return not self._cmp_sequence(pattern, start, pat_len)
+            return (self._get_key()[start:start + pat_len] ==
+                    pattern._get_key())
         return 0
 
     def __contains__(self, other):
@@ -30,7 +30,7 @@ from six.moves.urllib.parse import urlencode
 # pylint: enable=import-error
 
 # pylint: disable=ipa-forbidden-import
-from ipalib import api, errors
+from ipalib import api, errors, stats
 from ipalib.util import create_https_connection
 from ipalib.errors import NetworkError
 from ipalib.text import _
@@ -228,14 +228,15 @@ def _httplib_request(
         headers['content-type'] = 'application/x-www-form-urlencoded'
 
     try:
-        conn = connection_factory(host, port, **connection_options)
-        conn.request(method, uri, body=request_body, headers=headers)
-        res = conn.getresponse()
-
-        http_status = res.status
-        http_headers = res.msg
-        http_body = res.read()
-        conn.close()
+        with stats.timed('dogtag'):
+            conn = connection_factory(host, port, **connection_options)
+            conn.request(method, uri, body=request_body, headers=headers)
+            res = conn.getresponse()
+
+            http_status = res.status
+            http_headers = res.msg
+            http_body = res.read()
+            conn.close()
     except Exception as e:
         logger.debug("httplib request failed:", exc_info=True)
         raise NetworkError(uri=uri, error=str(e))
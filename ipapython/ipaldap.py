@@ -21,6 +21,8 @@
 
 import binascii
 import errno
+import hashlib
+import json
 import logging
 import time
 import datetime
@@ -29,6 +31,7 @@ from copy import deepcopy
 import contextlib
 import os
 import pwd
+import tempfile
 import warnings
 
 # pylint: disable=import-error
@@ -38,14 +41,18 @@ from six.moves.urllib.parse import urlparse
 from cryptography import x509 as crypto_x509
 
 import ldap
+import ldap.ldapobject
 import ldap.sasl
 import ldap.filter
 from ldap.controls import SimplePagedResultsControl, GetEffectiveRightsControl
+from ldap.controls.sss import SSSRequestControl
+from ldap.controls.vlv import VLVRequestControl, VLVResponseControl
 import six
 
 # pylint: disable=ipa-forbidden-import
 from ipalib import errors, x509, _
 from ipalib.constants import LDAP_GENERALIZED_TIME_FORMAT
+from ipalib.stats import get_request_stats
 # pylint: enable=ipa-forbidden-import
 from ipapython.ipautil import format_netloc, CIDict
 from ipapython.dn import DN
@@ -92,6 +99,82 @@ if six.PY2 and hasattr(ldap, 'LDAPBytesWarning'):
     )
 
 
+class _InstrumentedLDAPObject(ldap.ldapobject.SimpleLDAPObject):
+    """
+    python-ldap connection reporting its operations to `ipalib.stats`.
+
+    Every operation is counted once when it is sent. The time spent waiting
+    for its results is added to the operation's duration.
+    """
+
+    # python-ldap functions sending requests and the operations they start
+    _operations = {
+        'abandon_ext': 'ldap.abandon',
+        'add_ext': 'ldap.add',
+        'compare_ext': 'ldap.compare',
+        'delete_ext': 'ldap.delete',
+        'extop': 'ldap.extop',
+        'modify_ext': 'ldap.modify',
+        'passwd': 'ldap.passwd',
+        'rename': 'ldap.modrdn',
+        'sasl_bind_s': 'ldap.bind',
+        'sasl_interactive_bind_s': 'ldap.bind',
+        'search_ext': 'ldap.search',
+        'simple_bind': 'ldap.bind',
+        'unbind_ext': 'ldap.unbind',
+        'whoami_s': 'ldap.whoami',
+    }
+
+    # result types after which more results of the operation follow
+    _partial_results = frozenset([
+        ldap.RES_SEARCH_ENTRY,
+        ldap.RES_SEARCH_REFERENCE,
+        getattr(ldap, 'RES_INTERMEDIATE', 0x79),
+    ])
+
+    def __init__(self, *args, **kwargs):
+        # message ID -> operation, for operations sent during a request
+        self._pending_operations = {}
+        ldap.ldapobject.SimpleLDAPObject.__init__(self, *args, **kwargs)
+
+    def _ldap_call(self, func, *args, **kwargs):
+        call = ldap.ldapobject.SimpleLDAPObject._ldap_call
+        stats = get_request_stats()
+        if stats is None:
+            return call(self, func, *args, **kwargs)
+
+        name = func.__name__
+        pending = self._pending_operations
+        start = time.time()
+        if name.startswith('result'):
+            msgid = args[0] if args else ldap.RES_ANY
+            operation = pending.get(msgid, 'ldap.result')
+            result = None
+            try:
+                result = call(self, func, *args, **kwargs)
+            finally:
+                stats.add(operation, time.time() - start, count=0)
+                if not result or result[0] not in self._partial_results:
+                    pending.pop(msgid, None)
+            return result
+
+        operation = self._operations.get(name)
+        if operation is None:
+            return call(self, func, *args, **kwargs)
+        try:
+            result = call(self, func, *args, **kwargs)
+        finally:
+            stats.add(operation, time.time() - start)
+        if name == 'abandon_ext':
+            pending.pop(args[0], None)
+        elif isinstance(result, int):
+            if len(pending) > 1000:
+                # results of old operations were never collected
+                pending.clear()
+            pending[result] = operation
+        return result
+
+
 def ldap_initialize(uri, cacertfile=None):
     """Wrapper around ldap.initialize()
 
@@ -103,8 +186,9 @@ def ldap_initialize(uri, cacertfile=None):
       locations, also known as system-wide trust store.
     * Cert validation is enforced.
     * SSLv2 and SSLv3 are disabled.
+    * Operations are reported to `ipalib.stats`.
     """
-    conn = ldap.initialize(uri)
+    conn = _InstrumentedLDAPObject(uri)
 
     # Do not perform reverse DNS lookups to canonicalize SASL host names
     conn.set_option(ldap.OPT_X_SASL_NOCANON, ldap.OPT_ON)
@@ -129,21 +213,89 @@ def ldap_initialize(uri, cacertfile=None):
 class _ServerSchema:
     '''
     Properties of a schema retrieved from an LDAP server.
+
+    Either the full schema or only the attribute table loaded from the
+    on-disk cache may be present. The full schema is retrieved lazily
+    by `SchemaCache.get_schema` in the latter case.
     '''
 
-    def __init__(self, server, schema):
+    def __init__(self, server, schema, attribute_table=None):
         self.server = server
         self.schema = schema
+        self._attribute_table = attribute_table
         self.retrieve_timestamp = time.time()
 
+    @property
+    def attribute_table(self):
+        if self._attribute_table is None:
+            self._attribute_table = _build_attribute_table(self.schema)
+        return self._attribute_table
+
+
+def _build_attribute_table(schema):
+    """
+    Build a mapping of lower-cased attribute names and OIDs to
+    ``(names, syntax, single_value)`` tuples from a SubSchema.
+    """
+    table = {}
+    for oid in schema.listall(ldap.schema.AttributeType):
+        obj = schema.get_obj(ldap.schema.AttributeType, oid)
+        names = tuple(obj.names)
+        syntax = obj.syntax
+        if six.PY2:
+            oid = oid.decode('utf-8')
+            names = tuple(n.decode('utf-8') for n in names)
+            if syntax is not None:
+                syntax = syntax.decode('utf-8')
+        info = (names, syntax, bool(obj.single_value))
+        table[oid.lower()] = info
+        for name in names:
+            table[name.lower()] = info
+    return table
+
+
+class _SchemaAttributeInfo:
+    """
+    ``(names, syntax, single_value)`` view of a schema AttributeType, as
+    stored in the attribute table. Fields are only read when accessed.
+    """
+    __slots__ = ('_obj',)
+
+    _fields = ('names', 'syntax', 'single_value')
+
+    def __init__(self, obj):
+        self._obj = obj
+
+    def __getitem__(self, index):
+        value = getattr(self._obj, self._fields[index])
+        if index == 0:
+            value = tuple(value)
+            if six.PY2:
+                value = tuple(n.decode('utf-8') for n in value)
+        elif index == 1 and six.PY2 and value is not None:
+            value = value.decode('utf-8')
+        elif index == 2:
+            value = bool(value)
+        return value
+
 
 class SchemaCache:
     '''
     Cache the schema's from individual LDAP servers.
+
+    If ``cache_dir`` is set, the attribute table (names, syntax and
+    single-value flag of every attribute type) is also stored on disk,
+    keyed by the nsSchemaCSN of the server. New processes load the table
+    from there instead of downloading and parsing the whole schema, as
+    long as the CSN did not change.
     '''
 
+    # bump when the format of the on-disk attribute table changes
+    DISK_FORMAT = 1
+
     def __init__(self):
         self.servers = {}
+        self.cache_dir = None
 
     def get_schema(self, url, conn, force_update=False):
         '''
@@ -160,11 +312,37 @@ class SchemaCache:
 
         server_schema = self.servers.get(url)
         if server_schema is None:
-            schema = self._retrieve_schema_from_server(url, conn)
-            server_schema = _ServerSchema(url, schema)
-            self.servers[url] = server_schema
+            server_schema = self._retrieve_server_schema(url, conn)
+        elif server_schema.schema is None:
+            # only the attribute table was loaded from disk
+            server_schema.schema = self._retrieve_schema_from_server(
+                url, conn)
         return server_schema.schema
 
+    def get_attribute_table(self, url, conn, force_update=False):
+        '''
+        Return the attribute table of a specific LDAP server.
+
+        The table maps lower-cased attribute names and OIDs to
+        ``(names, syntax, single_value)`` tuples.
+        '''
+
+        if force_update:
+            self.flush(url)
+
+        server_schema = self.servers.get(url)
+        if server_schema is None:
+            csn = None
+            if self.cache_dir is not None and not force_update:
+                csn = self._get_schema_csn(conn)
+                table = self._load_attribute_table(url, csn)
+                if table is not None:
+                    server_schema = _ServerSchema(url, None, table)
+                    self.servers[url] = server_schema
+            if server_schema is None:
+                server_schema = self._retrieve_server_schema(url, conn, csn)
+        return server_schema.attribute_table
+
     def flush(self, url):
         logger.debug('flushing %s from SchemaCache', url)
         try:
@@ -172,6 +350,76 @@ class SchemaCache:
         except KeyError:
             pass
 
+    def _retrieve_server_schema(self, url, conn, csn=None):
+        schema = self._retrieve_schema_from_server(url, conn)
+        server_schema = _ServerSchema(url, schema)
+        self.servers[url] = server_schema
+        if self.cache_dir is not None:
+            if csn is None:
+                csn = self._get_schema_csn(conn)
+            self._store_attribute_table(
+                url, csn, server_schema.attribute_table)
+        return server_schema
+
+    def _get_schema_csn(self, conn):
+        try:
+            schema_entry = conn.search_s(
+                'cn=schema', ldap.SCOPE_BASE, attrlist=['nsSchemaCSN'])[0]
+        except (ldap.LDAPError, IndexError) as e:
+            logger.debug('Unable to retrieve schema CSN: %s', e)
+            return None
+        for name, values in schema_entry[1].items():
+            if name.lower() == 'nsschemacsn' and values:
+                return values[0].decode('utf-8')
+        return None
+
+    def _get_cache_filename(self, url):
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        return os.path.join(
+            self.cache_dir,
+            'schema-{}.json'.format(hashlib.sha256(url).hexdigest()))
+
+    def _load_attribute_table(self, url, csn):
+        if csn is None:
+            return None
+        filename = self._get_cache_filename(url)
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            logger.debug('Unable to read schema cache %s: %s', filename, e)
+            return None
+        if (data.get('format') != self.DISK_FORMAT or
+                data.get('csn') != csn):
+            logger.debug('Schema cache %s is outdated', filename)
+            return None
+        logger.debug('Loaded attribute table for %s from %s', url, filename)
+        return {
+            key: (tuple(names), syntax, single_value)
+            for key, (names, syntax, single_value)
+            in data['attributes'].items()
+        }
+
+    def _store_attribute_table(self, url, csn, table):
+        if csn is None:
+            return
+        filename = self._get_cache_filename(url)
+        data = dict(format=self.DISK_FORMAT, url=url, csn=csn,
+                    attributes=table)
+        try:
+            fd, tmpname = tempfile.mkstemp(dir=self.cache_dir,
+                                           prefix='.schema-')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(data, f, separators=(',', ':'))
+                os.rename(tmpname, filename)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        except (IOError, OSError) as e:
+            logger.debug('Unable to write schema cache %s: %s', filename, e)
+
     def _retrieve_schema_from_server(self, url, conn):
         """
         Retrieve the LDAP schema from the provided url and determine if
@@ -272,7 +520,10 @@ class LDAPEntry(MutableMapping):
         if isinstance(_obj, LDAPEntry):
             #pylint: disable=E1103
             self._not_list = set(_obj._not_list)
-            self._orig_raw = dict(_obj._orig_raw)
+            if _obj._orig_raw is not None:
+                self._orig_raw = dict(_obj._orig_raw)
+            else:
+                self._orig_raw = None
             if _obj.conn is _conn:
                 self._names = CIDict(_obj._names)
                 self._nice = dict(_obj._nice)
@@ -285,6 +536,28 @@ class LDAPEntry(MutableMapping):
 
         self.update(_obj, **kwargs)
 
+    @classmethod
+    def _from_result(cls, conn, dn, attrs, read_only=False):
+        """
+        Create an entry from the attributes of a python-ldap search result.
+
+        The attribute value lists are taken over by the entry. Unless
+        read_only is set, they are recorded as the original values for
+        generate_modlist(). Read-only entries can still be modified, but
+        generate_modlist() can only be used after reset_modlist().
+        """
+        entry = cls(conn, dn)
+        for name, values in attrs.items():
+            name = entry._add_attr_name(entry._attr_name(name))
+            entry._raw[name] = values
+            entry._nice[name] = None
+        if read_only:
+            entry._orig_raw = None
+        else:
+            entry._orig_raw = {name: list(values)
+                               for name, values in entry._raw.items()}
+        return entry
+
     @property
     def conn(self):
         return self._conn
@@ -386,22 +659,14 @@ class LDAPEntry(MutableMapping):
         if name in self._names:
             return self._names[name]
 
-        if self._conn.schema is not None:
-            if six.PY2:
-                encoded_name = name.encode('utf-8')
-            else:
-                encoded_name = name
-            attrtype = self._conn.schema.get_obj(
-                ldap.schema.AttributeType, encoded_name)
-            if attrtype is not None:
-                for altname in attrtype.names:
-                    if six.PY2:
-                        altname = altname.decode('utf-8')
-                    self._names[altname] = name
+        attrinfo = self._conn.get_attribute_info(name)
+        if attrinfo is not None:
+            for altname in attrinfo[0]:
+                self._names[altname] = name
 
         self._names[name] = name
 
-        for oldname in list(self._orig_raw):
+        for oldname in list(self._orig_raw or ()):
             if self._names.get(oldname) == name:
                 self._orig_raw[name] = self._orig_raw.pop(oldname)
                 break
@@ -538,9 +803,16 @@ class LDAPEntry(MutableMapping):
         if other is None:
             other = self
         assert isinstance(other, LDAPEntry)
-        self._orig_raw = deepcopy(dict(other.raw))
+        # values are lists of immutable bytes, no need for deepcopy()
+        self._orig_raw = {name: list(values)
+                          for name, values in other.raw.items()}
 
     def generate_modlist(self):
+        if self._orig_raw is None:
+            raise ValueError(
+                "original values of read-only entry '%s' are not known, "
+                "call reset_modlist() before modifying it" % self._dn)
+
         modlist = []
 
         names = set(self)
@@ -635,6 +907,93 @@ class SingleValueLDAPEntryView(LDAPEntryView):
             self._entry[name] = [value]
 
 
+class LDAPSearchIterator:
+    """
+    Iterator over the entries of a search, see `LDAPClient.iter_entries`.
+
+    ``truncated`` is set once the iterator is exhausted.
+    """
+
+    def __init__(self, generator_factory):
+        self.truncated = False
+        self._generator = generator_factory(self)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._generator)
+
+    next = __next__
+
+    def close(self):
+        """Stop the search before all entries were consumed."""
+        self._generator.close()
+
+
+class LDAPOperation:
+    """
+    A pending asynchronous LDAP operation.
+
+    Instances are returned by the ``*_async`` methods of `LDAPClient`.
+    The request is sent to the server immediately; ``result()`` waits for
+    the response and returns it, raising the same `errors.PublicError`
+    subclasses as the synchronous methods. This allows callers to send
+    many independent requests before waiting for the first response, so
+    N operations cost one round trip instead of N.
+    """
+
+    def __init__(self, client, msgid, convert, arg_desc=None):
+        self._client = client
+        self._msgid = msgid
+        self._convert = convert
+        self._arg_desc = arg_desc
+        self._done = False
+        self._result = None
+        self._error = None
+
+    @property
+    def msgid(self):
+        return self._msgid
+
+    def done(self):
+        """Return True if the result was already collected."""
+        return self._done
+
+    def result(self, timeout=None):
+        """
+        Wait for the operation to complete and return its result.
+        """
+        if not self._done:
+            try:
+                with self._client.error_handler(self._arg_desc):
+                    _type, data, _msgid, ctrls = self._client.conn.result3(
+                        self._msgid, 1, timeout)
+                    self._result = self._convert(data, ctrls)
+            except errors.PublicError as e:
+                self._error = e
+            finally:
+                self._done = True
+
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def abandon(self):
+        """
+        Abandon the operation if its result was not collected yet.
+        """
+        if self._done:
+            return
+        try:
+            with self._client.error_handler():
+                self._client.conn.abandon(self._msgid)
+        finally:
+            self._done = True
+            self._error = errors.DatabaseError(
+                desc=u'Abandoned', info=u'operation was abandoned')
+
+
 class LDAPClient:
     """LDAP backend class
 
@@ -781,6 +1140,9 @@ class LDAPClient:
 
         self._has_schema = False
         self._schema = None
+        self._has_attribute_table = False
+        self._attribute_table = None
+        self._schema_refreshed = False
 
         self._conn = self._connect()
 
@@ -806,7 +1168,7 @@ class LDAPClient:
             try:
                 schema = schema_cache.get_schema(
                     self.ldap_uri, self.conn,
-                    force_update=self._force_schema_updates)
+                    force_update=self._get_schema_force_update())
             except (errors.ExecutionError, IndexError):
                 schema = None
 
@@ -816,6 +1178,32 @@ class LDAPClient:
 
         return self._schema
 
+    def _get_attribute_table(self):
+        if self._no_schema:
+            return None
+
+        if not self._has_attribute_table:
+            try:
+                table = schema_cache.get_attribute_table(
+                    self.ldap_uri, self.conn,
+                    force_update=self._get_schema_force_update())
+            except (errors.ExecutionError, IndexError):
+                table = None
+
+            # bypass ldap2's locking
+            object.__setattr__(self, '_attribute_table', table)
+            object.__setattr__(self, '_has_attribute_table', True)
+
+        return self._attribute_table
+
+    def _get_schema_force_update(self):
+        # The schema is refreshed only once per bind, regardless of whether
+        # the full schema or the attribute table is requested first.
+        force_update = (self._force_schema_updates and
+                        not self._schema_refreshed)
+        object.__setattr__(self, '_schema_refreshed', True)
+        return force_update
+
     def _flush_schema(self):
         '''
         Force this instance to forget it's cached schema and reacquire
@@ -844,6 +1232,35 @@ class LDAPClient:
         # bypass ldap2's locking
         object.__setattr__(self, '_has_schema', False)
         object.__setattr__(self, '_schema', None)
+        object.__setattr__(self, '_has_attribute_table', False)
+        object.__setattr__(self, '_attribute_table', None)
+        object.__setattr__(self, '_schema_refreshed', False)
+
+    def get_attribute_info(self, name_or_oid):
+        """
+        Look up an attribute type in the schema attribute table.
+
+        Returns a ``(names, syntax, single_value)`` tuple or None if the
+        schema is not available or the attribute type is unknown.
+        """
+        if self._has_schema:
+            # The full schema was loaded already, use it directly.
+            schema = self._schema
+            if schema is None:
+                return None
+            if six.PY2 and isinstance(name_or_oid, unicode):
+                name_or_oid = name_or_oid.encode('utf-8')
+            obj = schema.get_obj(ldap.schema.AttributeType, name_or_oid)
+            if obj is None:
+                return None
+            return _SchemaAttributeInfo(obj)
+
+        table = self._get_attribute_table()
+        if table is None:
+            return None
+        if isinstance(name_or_oid, bytes):
+            name_or_oid = name_or_oid.decode('utf-8')
+        return table.get(name_or_oid.lower())
 
     def get_attribute_type(self, name_or_oid):
         if not self._decode_attrs:
@@ -857,12 +1274,10 @@ class LDAPClient:
         if name_or_oid in self._SYNTAX_OVERRIDE:
             return self._SYNTAX_OVERRIDE[name_or_oid]
 
-        schema = self._get_schema()
-        if schema is not None:
-            # Try to lookup the syntax in the schema returned by the server
-            obj = schema.get_obj(ldap.schema.AttributeType, name_or_oid)
-            if obj is not None and obj.syntax in self._SYNTAX_MAPPING:
-                return self._SYNTAX_MAPPING[obj.syntax]
+        # Try to lookup the syntax in the schema returned by the server
+        attrinfo = self.get_attribute_info(name_or_oid)
+        if attrinfo is not None and attrinfo[1] in self._SYNTAX_MAPPING:
+            return self._SYNTAX_MAPPING[attrinfo[1]]
 
         return unicode
 
@@ -889,11 +1304,9 @@ class LDAPClient:
         if name_or_oid in self._SINGLE_VALUE_OVERRIDE:
             return self._SINGLE_VALUE_OVERRIDE[name_or_oid]
 
-        schema = self._get_schema()
-        if schema is not None:
-            obj = schema.get_obj(ldap.schema.AttributeType, name_or_oid)
-            if obj is not None:
-                return obj.single_value
+        attrinfo = self.get_attribute_info(name_or_oid)
+        if attrinfo is not None:
+            return attrinfo[2]
 
         return None
 
@@ -972,7 +1385,7 @@ class LDAPClient:
         else:
             raise TypeError("attempt to pass unsupported type from ldap, value=%s type=%s" %(val, type(val)))
 
-    def _convert_result(self, result):
+    def _convert_result(self, result, read_only=False):
         '''
         result is a python-ldap result tuple of the form (dn, attrs),
         where dn is a string containing the dn (distinguished name) of
@@ -980,7 +1393,9 @@ class LDAPClient:
         associated with the entry. The keys of attrs are strings, and
         the associated values are lists of strings.
 
-        We convert the tuple to an LDAPEntry object.
+        We convert the tuple to an LDAPEntry object. With read_only, the
+        original values of the entry are not recorded, see
+        LDAPEntry._from_result.
         '''
 
         ipa_result = []
@@ -997,11 +1412,8 @@ class LDAPClient:
 
                 continue
 
-            ipa_entry = LDAPEntry(self, DN(original_dn))
-
-            for attr, original_values in original_attrs.items():
-                ipa_entry.raw[attr] = original_values
-            ipa_entry.reset_modlist()
+            ipa_entry = LDAPEntry._from_result(
+                self, DN(original_dn), original_attrs, read_only)
 
             ipa_result.append(ipa_entry)
 
@@ -1391,7 +1803,7 @@ class LDAPClient:
     def find_entries(
             self, filter=None, attrs_list=None, base_dn=None,
             scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
-            paged_search=False, get_effective_rights=False):
+            paged_search=False, get_effective_rights=False, read_only=False):
         """
         Return a list of entries and indication of whether the results were
         truncated ([(dn, entry_attrs)], truncated) matching specified search
@@ -1409,17 +1821,132 @@ class LDAPClient:
                            (default unlimited)
         :param paged_search: search using paged results control
         :param get_effective_rights: use GetEffectiveRights control
+        :param read_only: do not record the original values of the entries,
+                          generate_modlist() can not be used on them
 
         :raises: errors.NotFound if result set is empty
                                  or base_dn doesn't exist
         """
+        entries = self.iter_entries(
+            filter, attrs_list, base_dn, scope, time_limit=time_limit,
+            size_limit=size_limit, paged_search=paged_search,
+            get_effective_rights=get_effective_rights, read_only=read_only)
+        res = list(entries)
+
+        if not res and not entries.truncated:
+            raise errors.EmptyResult(reason='no matching entry found')
+
+        return (res, entries.truncated)
+
+    def find_entries_page(
+            self, filter=None, attrs_list=None, base_dn=None,
+            scope=ldap.SCOPE_SUBTREE, sort_attr=None, offset=0,
+            page_size=100, time_limit=None, read_only=False):
+        """
+        Return one page of the entries matching specified search parameters
+        and the number of all matching entries ([entries], total).
+
+        The entries are sorted by the server (RFC 2891) and only the
+        requested page is sent, using the Virtual List View control, so the
+        cost of a page does not depend on the size of the result set.
+
+        Keyword arguments:
+        :param sort_attr: attribute to sort the entries by
+        :param offset: index of the first entry of the page, starting at 0
+        :param page_size: maximum number of entries of the page
+
+        See find_entries for description of the other arguments. An empty
+        page is not an error.
+
+        :raises: errors.NotFound if base_dn doesn't exist
+        """
+        if base_dn is None:
+            base_dn = DN()
+        assert isinstance(base_dn, DN)
+        assert sort_attr
+        assert offset >= 0 and page_size > 0
+        if not filter:
+            filter = '(objectClass=*)'
+
+        if time_limit is None:
+            time_limit = self.time_limit
+        if time_limit == 0:
+            time_limit = -1.0
+        if not isinstance(time_limit, float):
+            time_limit = float(time_limit)
+
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        # VLV offsets start at 1, content_count=0 means unknown to the client
+        sctrls = [
+            SSSRequestControl(criticality=True, ordering_rules=[sort_attr]),
+            VLVRequestControl(criticality=True, before_count=0,
+                              after_count=page_size - 1, offset=offset + 1,
+                              content_count=0),
+        ]
+
+        with self.error_handler():
+            if six.PY2:
+                filter = self.encode(filter)
+                attrs_list = self.encode(attrs_list)
+
+            id = self.conn.search_ext(
+                str(base_dn), scope, filter, attrs_list,
+                serverctrls=sctrls, timeout=time_limit)
+            _objtype, res_list, _res_id, res_ctrls = self.conn.result3(
+                id, 1, time_limit)
+
+        for ctrl in res_ctrls:
+            if isinstance(ctrl, VLVResponseControl):
+                break
+        else:
+            raise errors.DatabaseError(
+                desc=_('Virtual list view not supported'),
+                info=str(base_dn))
+        if ctrl.result != 0:
+            raise errors.DatabaseError(
+                desc=_('Virtual list view failed'),
+                info=_('result code %(code)d') % dict(code=ctrl.result))
+
+        total = ctrl.content_count
+        if offset >= total:
+            # the server returns the last entries for an offset past the end
+            return ([], total)
+        return (self._convert_result(res_list, read_only), total)
+
+    def iter_entries(
+            self, filter=None, attrs_list=None, base_dn=None,
+            scope=ldap.SCOPE_SUBTREE, time_limit=None, size_limit=None,
+            paged_search=False, get_effective_rights=False, read_only=False):
+        """
+        Return an iterator over entries matching specified search parameters.
+
+        Entries are yielded as they are received from the server, so unlike
+        find_entries the whole result set is never held in memory. With
+        paged_search, the server only sends the next page once the previous
+        one was consumed.
+
+        The returned `LDAPSearchIterator` has a ``truncated`` attribute,
+        which is valid once the iterator is exhausted and has the same
+        meaning as the truncated flag returned by find_entries. An empty
+        result set is not an error.
+
+        See find_entries for description of the arguments.
+        """
+        return LDAPSearchIterator(
+            lambda it: self._iter_entries(
+                it, filter, attrs_list, base_dn, scope, time_limit,
+                size_limit, paged_search, get_effective_rights, read_only))
+
+    def _iter_entries(
+            self, iterator, filter, attrs_list, base_dn, scope, time_limit,
+            size_limit, paged_search, get_effective_rights, read_only):
         if base_dn is None:
             base_dn = DN()
         assert isinstance(base_dn, DN)
         if not filter:
             filter = '(objectClass=*)'
-        res = []
-        truncated = False
 
         if time_limit is None:
             time_limit = self.time_limit
@@ -1460,6 +1987,7 @@ class LDAPClient:
                 else:
                     sctrls = base_sctrls or None
 
+                id = None
                 try:
                     id = self.conn.search_ext(
                         str(base_dn), scope, filter, attrs_list,
@@ -1470,10 +1998,11 @@ class LDAPClient:
                         result = self.conn.result3(id, 0)
                         objtype, res_list, _res_id, res_ctrls = result
                         if objtype == ldap.RES_SEARCH_RESULT:
+                            id = None
                             break
-                        res_list = self._convert_result(res_list)
+                        res_list = self._convert_result(res_list, read_only)
                         if res_list:
-                            res.append(res_list[0])
+                            yield res_list[0]
 
                     if paged_search:
                         # Get cookie for the next page
@@ -1483,43 +2012,56 @@ class LDAPClient:
                                 break
                         else:
                             cookie = ''
+                except GeneratorExit:
+                    # the consumer stopped early, do not let the server
+                    # keep sending entries
+                    if id is not None:
+                        try:
+                            self.conn.abandon(id)
+                        except ldap.LDAPError as e:
+                            logger.debug("Error abandoning search: %s", e)
+                    if paged_search and cookie:
+                        self._cancel_paged_search(
+                            base_dn, scope, filter, attrs_list, time_limit,
+                            size_limit, cookie)
+                    raise
                 except ldap.ADMINLIMIT_EXCEEDED:
-                    truncated = TRUNCATED_ADMIN_LIMIT
+                    iterator.truncated = TRUNCATED_ADMIN_LIMIT
                     break
                 except ldap.SIZELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_SIZE_LIMIT
+                    iterator.truncated = TRUNCATED_SIZE_LIMIT
                     break
                 except ldap.TIMELIMIT_EXCEEDED:
-                    truncated = TRUNCATED_TIME_LIMIT
+                    iterator.truncated = TRUNCATED_TIME_LIMIT
                     break
                 except ldap.LDAPError as e:
                     # If paged search is in progress, try to cancel it
                     if paged_search and cookie:
-                        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
-                        try:
-                            self.conn.search_ext_s(
-                                str(base_dn), scope, filter, attrs_list,
-                                serverctrls=sctrls, timeout=time_limit,
-                                sizelimit=size_limit)
-                        except ldap.LDAPError as e:
-                            logger.warning(
-                                "Error cancelling paged search: %s", e)
+                        self._cancel_paged_search(
+                            base_dn, scope, filter, attrs_list, time_limit,
+                            size_limit, cookie)
                         cookie = ''
 
                     try:
                         raise e
                     except (ldap.ADMINLIMIT_EXCEEDED, ldap.TIMELIMIT_EXCEEDED,
                             ldap.SIZELIMIT_EXCEEDED):
-                        truncated = True
+                        iterator.truncated = True
                         break
 
                 if not paged_search or not cookie:
                     break
 
-        if not res and not truncated:
-            raise errors.EmptyResult(reason='no matching entry found')
-
-        return (res, truncated)
+    def _cancel_paged_search(self, base_dn, scope, filter, attrs_list,
+                             time_limit, size_limit, cookie):
+        sctrls = [SimplePagedResultsControl(0, 0, cookie)]
+        try:
+            self.conn.search_ext_s(
+                str(base_dn), scope, filter, attrs_list,
+                serverctrls=sctrls, timeout=time_limit,
+                sizelimit=size_limit)
+        except ldap.LDAPError as e:
+            logger.warning("Error cancelling paged search: %s", e)
 
     def __get_effective_rights_control(self):
         """Construct a GetEffectiveRights control for current user."""
@@ -1654,6 +2196,91 @@ class LDAPClient:
         else:
             return True
 
+    # Asynchronous (pipelined) operations
+    #
+    # Each method sends its request right away and returns an LDAPOperation.
+    # Submit all independent operations first and collect the results
+    # afterwards, e.g.:
+    #
+    # ops = [ldap.get_entry_async(dn, ['']) for dn in dns]
+    # for op in ops:
+    #     try:
+    #         entry = op.result()
+    #     except errors.NotFound:
+    #         ...
+
+    def search_async(self, base_dn, scope=ldap.SCOPE_SUBTREE, filter=None,
+                     attrs_list=None, time_limit=None, size_limit=None):
+        """
+        Start a search and return an LDAPOperation.
+
+        The result of the operation is a (possibly empty) list of
+        LDAPEntry objects.
+        """
+        def convert(data, ctrls):
+            return self._convert_result(data)
+
+        return self._search_async(convert, base_dn, scope, filter,
+                                  attrs_list, time_limit, size_limit)
+
+    def get_entry_async(self, dn, attrs_list=None):
+        """
+        Start reading an entry by DN and return an LDAPOperation.
+
+        The result of the operation is the LDAPEntry; `errors.NotFound` is
+        raised by ``result()`` if the entry does not exist.
+        """
+        def convert(data, ctrls):
+            entries = self._convert_result(data)
+            if not entries:
+                raise errors.EmptyResult(reason='no matching entry found')
+            return entries[0]
+
+        return self._search_async(convert, dn, self.SCOPE_BASE, None,
+                                  attrs_list)
+
+    def _search_async(self, convert, base_dn, scope, filter, attrs_list,
+                      time_limit=None, size_limit=None):
+        assert isinstance(base_dn, DN)
+        if not filter:
+            filter = '(objectClass=*)'
+        if time_limit is None:
+            time_limit = self.time_limit
+        if time_limit == 0:
+            time_limit = -1.0
+        if size_limit is None:
+            size_limit = self.size_limit
+        if attrs_list:
+            attrs_list = [a.lower() for a in set(attrs_list)]
+
+        with self.error_handler():
+            if six.PY2:
+                filter = self.encode(filter)
+                attrs_list = self.encode(attrs_list)
+            msgid = self.conn.search_ext(
+                str(base_dn), scope, filter, attrs_list,
+                timeout=float(time_limit), sizelimit=int(size_limit))
+
+        return LDAPOperation(self, msgid, convert)
+
+    def modify_async(self, dn, modlist):
+        """
+        Start modifying an entry and return an LDAPOperation.
+
+        ``modlist`` is a python-ldap modlist of IPA typed values, see
+        `modify_s`. The result of the operation is None.
+        """
+        assert isinstance(dn, DN)
+
+        def convert(data, ctrls):
+            return None
+
+        with self.error_handler():
+            modlist = [(a, str(b), self.encode(c)) for a, b, c in modlist]
+            msgid = self.conn.modify_ext(str(dn), modlist)
+
+        return LDAPOperation(self, msgid, convert)
+
 
 def get_ldap_uri(host='', port=389, cacert=None, ldapi=False, realm=None,
                  protocol=None):
@@ -0,0 +1,275 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Metrics of the IPA server processes in the Prometheus text format.
+
+Every WSGI process publishes its `ipalib.stats` totals to a spool directory
+shared by all processes of the server. The metrics endpoint sums up the
+files of all processes. Files of processes which have exited are merged
+into a single file of retired totals, so counters do not go backwards when
+mod_wsgi recycles a process.
+"""
+
+import errno
+import fcntl
+import json
+import logging
+import os
+import tempfile
+
+from ipalib import stats
+
+logger = logging.getLogger(__name__)
+
+# counters of the LDAP connection pool, the other values are gauges
+POOL_COUNTERS = ('hits', 'misses', 'created', 'evicted', 'discarded')
+
+RETIRED_NAME = 'retired.json'
+LOCK_NAME = '.lock'
+
+
+def get_snapshot(pool_stats=None):
+    """
+    Return the metrics of this process as a JSON serializable ``dict``.
+    """
+    totals = stats.get_totals()
+    return dict(
+        pid=os.getpid(),
+        start_time=stats.process_start_time,
+        commands={
+            name: [count, duration, list(buckets)]
+            for name, (count, duration, buckets)
+            in totals['commands'].items()
+        },
+        operations={
+            name: [count, duration]
+            for name, (count, duration) in totals['operations'].items()
+        },
+        pool=pool_stats or {},
+    )
+
+
+def merge_snapshots(target, snapshot):
+    """
+    Add the counters of *snapshot* to *target*.
+    """
+    commands = target.setdefault('commands', {})
+    for name, (count, duration, buckets) in snapshot['commands'].items():
+        values = commands.get(name)
+        if values is None:
+            commands[name] = [count, duration, list(buckets)]
+        else:
+            values[0] += count
+            values[1] += duration
+            values[2] = [a + b for a, b in zip(values[2], buckets)]
+    operations = target.setdefault('operations', {})
+    for name, (count, duration) in snapshot['operations'].items():
+        values = operations.setdefault(name, [0, 0.0])
+        values[0] += count
+        values[1] += duration
+    pool = target.setdefault('pool', {})
+    for name in POOL_COUNTERS:
+        if name in snapshot['pool']:
+            pool[name] = pool.get(name, 0) + snapshot['pool'][name]
+    return target
+
+
+def _pid_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno != errno.ESRCH
+    return True
+
+
+class MetricsSpool(object):
+    """
+    Directory with one metrics file per server process.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def _get_filename(self, snapshot):
+        return os.path.join(
+            self.directory,
+            '%d-%d.json' % (snapshot['pid'], int(snapshot['start_time'])))
+
+    def _write(self, filename, data):
+        fd, tmpname = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.rename(tmpname, filename)
+        except BaseException:
+            os.unlink(tmpname)
+            raise
+
+    def _read(self, filename):
+        try:
+            with open(filename) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            if getattr(e, 'errno', None) != errno.ENOENT:
+                logger.debug('Unable to read metrics %s: %s', filename, e)
+            return None
+
+    def publish(self, snapshot):
+        """
+        Store the *snapshot* of this process.
+        """
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+            self._write(self._get_filename(snapshot), snapshot)
+        except (IOError, OSError) as e:
+            logger.debug('Unable to write metrics to %s: %s',
+                         self.directory, e)
+
+    def _retire(self, names):
+        """
+        Merge the files *names* of exited processes into the retired totals.
+        """
+        with open(os.path.join(self.directory, LOCK_NAME), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired_name = os.path.join(self.directory, RETIRED_NAME)
+            retired = self._read(retired_name) or {}
+            filenames = []
+            for name in names:
+                filename = os.path.join(self.directory, name)
+                snapshot = self._read(filename)
+                if snapshot is not None:
+                    merge_snapshots(retired, snapshot)
+                    filenames.append(filename)
+            if filenames:
+                self._write(retired_name, retired)
+                for filename in filenames:
+                    os.unlink(filename)
+            return retired
+
+    def collect(self):
+        """
+        Return the snapshots of the running processes and the retired totals.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except (IOError, OSError) as e:
+            logger.debug('Unable to list metrics in %s: %s',
+                         self.directory, e)
+            return [], {}
+
+        snapshots = []
+        exited = []
+        for name in sorted(names):
+            if name.startswith('.') or not name.endswith('.json'):
+                continue
+            if name == RETIRED_NAME:
+                continue
+            try:
+                pid = int(name.split('-', 1)[0])
+            except ValueError:
+                continue
+            if not _pid_exists(pid):
+                exited.append(name)
+                continue
+            snapshot = self._read(os.path.join(self.directory, name))
+            if snapshot is not None:
+                snapshots.append(snapshot)
+
+        try:
+            if exited:
+                retired = self._retire(exited)
+            else:
+                retired = self._read(
+                    os.path.join(self.directory, RETIRED_NAME)) or {}
+        except (IOError, OSError) as e:
+            logger.debug('Unable to retire metrics in %s: %s',
+                         self.directory, e)
+            retired = {}
+        return snapshots, retired
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def format_metrics(snapshots, retired):
+    """
+    Format the snapshots of the running processes and the retired totals
+    in the Prometheus text exposition format.
+    """
+    total = merge_snapshots({}, dict(
+        commands=retired.get('commands', {}),
+        operations=retired.get('operations', {}),
+        pool=retired.get('pool', {}),
+    ))
+    for snapshot in snapshots:
+        merge_snapshots(total, snapshot)
+
+    lines = []
+
+    def family(name, kind, doc):
+        lines.append('# HELP %s %s' % (name, doc))
+        lines.append('# TYPE %s %s' % (name, kind))
+
+    def sample(name, labels, value):
+        if labels:
+            label_str = ','.join(
+                '%s="%s"' % (k, _escape(v)) for k, v in labels)
+            lines.append('%s{%s} %s' % (name, label_str,
+                                        _format_value(value)))
+        else:
+            lines.append('%s %s' % (name, _format_value(value)))
+
+    family('ipa_command_duration_seconds', 'histogram',
+           'Duration of the commands executed by the IPA server.')
+    bounds = [repr(float(b)) for b in stats.DURATION_BUCKETS] + ['+Inf']
+    for name, (count, duration, buckets) in sorted(total['commands'].items()):
+        cumulative = 0
+        for bound, bucket in zip(bounds, buckets):
+            cumulative += bucket
+            sample('ipa_command_duration_seconds_bucket',
+                   [('command', name), ('le', bound)], cumulative)
+        sample('ipa_command_duration_seconds_sum', [('command', name)],
+               duration)
+        sample('ipa_command_duration_seconds_count', [('command', name)],
+               count)
+
+    family('ipa_operations_total', 'counter',
+           'Number of LDAP, Dogtag and other backend operations.')
+    for name, (count, _duration) in sorted(total['operations'].items()):
+        sample('ipa_operations_total', [('operation', name)], count)
+    family('ipa_operation_duration_seconds_total', 'counter',
+           'Time spent in LDAP, Dogtag and other backend operations.')
+    for name, (_count, duration) in sorted(total['operations'].items()):
+        sample('ipa_operation_duration_seconds_total', [('operation', name)],
+               duration)
+
+    for name in POOL_COUNTERS:
+        family('ipa_ldap_pool_%s_total' % name, 'counter',
+               'LDAP connection pool %s.' % name)
+        sample('ipa_ldap_pool_%s_total' % name, [],
+               total['pool'].get(name, 0))
+    family('ipa_ldap_pool_connections', 'gauge',
+           'LDAP connections of the pools of the running processes.')
+    for state in ('idle', 'in_use'):
+        sample('ipa_ldap_pool_connections', [('state', state)],
+               sum(s['pool'].get(state, 0) for s in snapshots))
+
+    family('ipa_process_start_time_seconds', 'gauge',
+           'Start time of the running IPA server processes since the epoch.')
+    for snapshot in snapshots:
+        sample('ipa_process_start_time_seconds',
+               [('pid', str(snapshot['pid']))], snapshot['start_time'])
+
+    lines.append('')
+    return '\n'.join(lines)
@@ -20,6 +20,7 @@
 Base classes for LDAP plugins.
 """
 
+import functools
 import re
 import time
 from copy import deepcopy
@@ -35,7 +36,8 @@ from ipalib import output
 from ipalib.text import _
 from ipalib.util import json_serialize, validate_hostname
 from ipalib.capabilities import client_has_capability
-from ipalib.messages import add_message, SearchResultTruncated
+from ipalib.messages import (add_message, SearchResultTruncated,
+                             SearchResultPage)
 from ipapython.dn import DN, RDN
 from ipapython.version import API_VERSION
 
@@ -44,6 +46,9 @@ if six.PY3:
 
 DNA_MAGIC = -1
 
+# characters which make the value of a RDN need full DN parsing
+_RDN_VALUE_SPECIAL_RE = re.compile(br'[\\"+;<>=#]|^ | $')
+
 global_output_params = (
     Flag('has_password',
         label=_('Password'),
@@ -523,6 +528,108 @@ def add_missing_object_class(ldap, objectclass, dn, entry_attrs=None, update=Tru
     return entry_attrs
 
 
+class MembershipGraph:
+    """
+    Indirect membership of a set of entries.
+
+    Instead of one or two subtree searches for each entry, the groups nested
+    in all the entries and the entries which have any of them as a direct
+    member are read with one search each per batch of entries. Only the
+    entries related to the given entries are read, the searches use the
+    same filters as `LDAPObject.get_memberindirect` and
+    `LDAPObject.get_memberofindirect`.
+    """
+
+    member_attrs = ('member', 'memberuser', 'memberhost')
+
+    # maximum number of entries in the filter of a single search
+    batch_size = 100
+
+    def __init__(self, ldap, base_dn, entries, memberindirect=True,
+                 memberofindirect=True):
+        # DN of a given entry -> raw member values of its nested groups
+        self._nested = {}
+        # DN of a given entry -> DNs of entries it is a direct member of
+        self._parents = {}
+
+        dns = [entry.dn for entry in entries]
+        for i in range(0, len(dns), self.batch_size):
+            batch = dns[i:i + self.batch_size]
+            if memberindirect:
+                self._read_nested(ldap, base_dn, batch)
+            if memberofindirect:
+                self._read_parents(ldap, base_dn, batch)
+
+    @staticmethod
+    def _to_dn(value):
+        return DN(value.decode('utf-8'))
+
+    def _read_nested(self, ldap, base_dn, dns):
+        mo_filter = ldap.make_filter({'memberof': dns}, rules=ldap.MATCH_ANY)
+        filter = ldap.combine_filters(
+            ('(member=*)', mo_filter), ldap.MATCH_ALL)
+        entries = ldap.iter_entries(
+            filter, ['member', 'memberof'], base_dn,
+            size_limit=-1,  # paged search will get everything anyway
+            paged_search=True, read_only=True)
+        wanted = set(dns)
+        for entry in entries:
+            for value in entry.raw.get('memberof', []):
+                dn = self._to_dn(value)
+                if dn in wanted:
+                    self._nested.setdefault(dn, []).extend(
+                        entry.raw.get('member', []))
+
+    def _read_parents(self, ldap, base_dn, dns):
+        filter = ldap.make_filter(
+            {attr: dns for attr in self.member_attrs}, rules=ldap.MATCH_ANY)
+        entries = ldap.iter_entries(
+            filter, list(self.member_attrs), base_dn,
+            size_limit=-1,  # paged search will get everything anyway
+            paged_search=True, read_only=True)
+        wanted = set(dns)
+        for entry in entries:
+            for attr in self.member_attrs:
+                for value in entry.raw.get(attr, []):
+                    dn = self._to_dn(value)
+                    if dn in wanted:
+                        self._parents.setdefault(dn, set()).add(entry.dn)
+
+    def get_memberindirect(self, group_entry):
+        """
+        Get indirect members, see `LDAPObject.get_memberindirect`
+        """
+        direct = set(
+            self._to_dn(v) for v in group_entry.raw.get('member', []))
+
+        indirect = {}
+        for value in self._nested.get(group_entry.dn, ()):
+            dn = self._to_dn(value)
+            if dn not in direct:
+                indirect.setdefault(dn, value)
+
+        if indirect:
+            group_entry.raw['memberindirect'] = list(indirect.values())
+
+    def get_memberofindirect(self, entry):
+        """
+        Get indirect membership, see `LDAPObject.get_memberofindirect`
+        """
+        parents = self._parents.get(entry.dn, ())
+
+        direct = []
+        indirect = []
+        for value in entry.raw.get('memberof', []):
+            if self._to_dn(value) in parents:
+                direct.append(value)
+            else:
+                indirect.append(value)
+
+        entry.raw['memberof'] = direct
+        if indirect:
+            entry.raw['memberofindirect'] = indirect
+
+
 class LDAPObject(Object):
     """
     Object representing a LDAP entry.
@@ -548,6 +655,8 @@ class LDAPObject(Object):
     hidden_attributes = ['objectclass', 'aci']
     # set rdn_attribute only if RDN attribute differs from primary key!
     rdn_attribute = ''
+    # built on first use by _get_member_index()
+    _member_index = None
     uuid_attribute = ''
     attribute_members = {}
     allow_rename = False
@@ -640,11 +749,54 @@ class LDAPObject(Object):
         oc = [x.lower() for x in classes]
         return objectclass.lower() in oc
 
+    def _get_member_index(self):
+        """
+        Return the member DN index used by convert_attribute_members.
+
+        For each attribute in attribute_members the index holds a tuple
+        (suffixes, containers). containers is the list of
+        (ldap_obj, container_dn, new_attr_name) tuples of the candidate
+        objects, in order. suffixes maps the normalized UTF-8 string of a
+        container DN to (ldap_obj, new_attr_name, pkey_name) for objects
+        whose primary key is the value of the first RDN of their entries,
+        so that such member DNs can be converted without parsing them.
+        """
+        index = self._member_index
+        if index is not None:
+            return index
+
+        index = {}
+        for attr, ldap_obj_names in self.attribute_members.items():
+            containers = []
+            suffixes = {}
+            for ldap_obj_name in ldap_obj_names:
+                ldap_obj = self.api.Object[ldap_obj_name]
+                container_dn = DN(ldap_obj.container_dn, self.api.env.basedn)
+                new_attr_name = '%s_%s' % (attr, ldap_obj.name)
+                containers.append((ldap_obj, container_dn, new_attr_name))
+
+                # DNs directly in this container belong to the first
+                # candidate whose container is a suffix of it
+                winner, _container_dn, winner_attr_name = next(
+                    c for c in containers if container_dn.endswith(c[1]))
+                if (type(winner).get_primary_key_from_dn is
+                        LDAPObject.get_primary_key_from_dn and
+                        not winner.rdn_attribute and
+                        winner.primary_key is not None):
+                    suffix = str(container_dn).lower().encode('utf-8')
+                    suffixes.setdefault(suffix, (
+                        winner, winner_attr_name,
+                        winner.primary_key.name.encode('utf-8')))
+            index[attr] = (suffixes, containers)
+
+        object.__setattr__(self, '_member_index', index)
+        return index
+
     def convert_attribute_members(self, entry_attrs, *keys, **options):
         if options.get('raw', False):
             return
 
-        container_dns = {}
+        index = self._get_member_index()
         new_attrs = {}
 
         for attr in self.attribute_members:
@@ -654,32 +806,53 @@ class LDAPObject(Object):
                 continue
             del entry_attrs[attr]
 
+            suffixes, containers = index[attr]
             for member in value:
-                memberdn = DN(member.decode('utf-8'))
-                for ldap_obj_name in self.attribute_members[attr]:
-                    ldap_obj = self.api.Object[ldap_obj_name]
-                    try:
-                        container_dn = container_dns[ldap_obj_name]
-                    except KeyError:
-                        container_dn = DN(ldap_obj.container_dn, api.env.basedn)
-                        container_dns[ldap_obj_name] = container_dn
-
-                    if memberdn.endswith(container_dn):
-                        new_value = ldap_obj.get_primary_key_from_dn(memberdn)
-                        new_attr_name = '%s_%s' % (attr, ldap_obj.name)
-                        try:
-                            new_attr = new_attrs[new_attr_name]
-                        except KeyError:
-                            new_attr = entry_attrs.setdefault(new_attr_name, [])
-                            new_attrs[new_attr_name] = new_attr
-                        new_attr.append(new_value)
-                        break
+                # fast path for "<pkey>=<value>,<container>"
+                rdn, _sep, suffix = member.partition(b',')
+                try:
+                    ldap_obj, new_attr_name, pkey_name = (
+                        suffixes[suffix.lower()])
+                except KeyError:
+                    new_value = None
+                else:
+                    name, _sep, new_value = rdn.partition(b'=')
+                    if (name == pkey_name and new_value and
+                            not _RDN_VALUE_SPECIAL_RE.search(new_value)):
+                        new_value = new_value.decode('utf-8')
+                    else:
+                        new_value = None
+
+                if new_value is None:
+                    memberdn = DN(member.decode('utf-8'))
+                    for ldap_obj, container_dn, new_attr_name in containers:
+                        if memberdn.endswith(container_dn):
+                            new_value = ldap_obj.get_primary_key_from_dn(
+                                memberdn)
+                            break
+                    else:
+                        continue
+
+                try:
+                    new_attr = new_attrs[new_attr_name]
+                except KeyError:
+                    new_attr = entry_attrs.setdefault(new_attr_name, [])
+                    new_attrs[new_attr_name] = new_attr
+                new_attr.append(new_value)
+
+    def get_indirect_members(self, entry_attrs, attrs_list, graph=None):
+        """
+        Fill in indirect membership attributes requested in attrs_list.
 
-    def get_indirect_members(self, entry_attrs, attrs_list):
+        If a MembershipGraph is passed in graph, it is used instead of
+        searching the tree.
+        """
+        if graph is None:
+            graph = self
         if 'memberindirect' in attrs_list:
-            self.get_memberindirect(entry_attrs)
+            graph.get_memberindirect(entry_attrs)
         if 'memberofindirect' in attrs_list:
-            self.get_memberofindirect(entry_attrs)
+            graph.get_memberofindirect(entry_attrs)
 
     def get_memberindirect(self, group_entry):
         """
@@ -1692,13 +1865,12 @@ class LDAPAddMember(LDAPModMember):
         completed = 0
         for (attr, objs) in member_dns.items():
             for ldap_obj_name in objs:
-                for m_dn in member_dns[attr][ldap_obj_name]:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.add_entry_to_group(m_dn, dn, attr, allow_same=self.allow_same)
-                    except errors.PublicError as e:
+                m_dns = [m_dn for m_dn in member_dns[attr][ldap_obj_name]
+                         if m_dn]
+                results = ldap.add_entries_to_group(
+                    m_dns, dn, attr, allow_same=self.allow_same)
+                for m_dn, e in results:
+                    if e is not None:
                         ldap_obj = self.api.Object[ldap_obj_name]
                         failed[attr][ldap_obj_name].append((
                             ldap_obj.get_primary_key_from_dn(m_dn),
@@ -1790,13 +1962,10 @@ class LDAPRemoveMember(LDAPModMember):
         completed = 0
         for (attr, objs) in member_dns.items():
             for ldap_obj_name, m_dns in objs.items():
-                for m_dn in m_dns:
-                    assert isinstance(m_dn, DN)
-                    if not m_dn:
-                        continue
-                    try:
-                        ldap.remove_entry_from_group(m_dn, dn, attr)
-                    except errors.PublicError as e:
+                m_dns = [m_dn for m_dn in m_dns if m_dn]
+                results = ldap.remove_entries_from_group(m_dns, dn, attr)
+                for m_dn, e in results:
+                    if e is not None:
                         ldap_obj = self.api.Object[ldap_obj_name]
                         failed[attr][ldap_obj_name].append((
                             ldap_obj.get_primary_key_from_dn(m_dn),
@@ -1889,6 +2058,21 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             minvalue=0,
             autofill=False,
         ),
+        Int('page_size?',
+            label=_('Page Size'),
+            doc=_('Return only one page of this many entries, sorted by the '
+                  'server'),
+            flags=['no_display'],
+            minvalue=1,
+            autofill=False,
+        ),
+        Int('page_offset?',
+            label=_('Page Offset'),
+            doc=_('Index of the first entry of the page (default 0)'),
+            flags=['no_display'],
+            minvalue=0,
+            autofill=False,
+        ),
     )
 
     def get_args(self):
@@ -2055,8 +2239,26 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
                 self, ldap, filter, attrs_list, base_dn, scope, *args, **options)
             assert isinstance(base_dn, DN)
 
+        if options.get('page_size'):
+            return self._execute_page(
+                ldap, filter, attrs_list, base_dn, scope, keys,
+                *args, **options)
+
+        post_callbacks = list(self.get_callbacks('post'))
+        # Without post callbacks nothing needs to see the LDAPEntry objects,
+        # so convert them one by one as they arrive instead of holding both
+        # the entries and their converted copies of the whole result set.
+        convert_early = all(
+            c == LDAPSearch.post_callback for c in post_callbacks)
+        if convert_early:
+            find_entries = functools.partial(
+                self._find_converted_entries, args, options)
+        else:
+            find_entries = ldap.find_entries
+
         try:
-            (entries, truncated) = self._exc_wrapper(args, options, ldap.find_entries)(
+            (entries, truncated) = self._exc_wrapper(
+                args, options, find_entries)(
                 filter, attrs_list, base_dn, scope,
                 time_limit=options.get('timelimit', None),
                 size_limit=options.get('sizelimit', None)
@@ -2067,26 +2269,19 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
             return self.api.Object[self.obj.parent_object].handle_not_found(
                 *keys)
 
-        for callback in self.get_callbacks('post'):
-            truncated = callback(
-                self, ldap, entries, truncated, *args, **options
-            )
-
-        if self.sort_result_entries:
-            if self.obj.primary_key:
-                def sort_key(x):
-                    return self.obj.primary_key.sort_key(
-                        x[self.obj.primary_key.name][0])
-                entries.sort(key=sort_key)
+        if not convert_early:
+            for callback in post_callbacks:
+                truncated = callback(
+                    self, ldap, entries, truncated, *args, **options
+                )
 
-        if not options.get('raw', False):
-            for entry in entries:
-                self.obj.get_indirect_members(entry, attrs_list)
-                self.obj.convert_attribute_members(entry, *args, **options)
+            if self.sort_result_entries and self.obj.primary_key:
+                entries.sort(key=self._get_sort_key)
 
-        for (i, e) in enumerate(entries):
-            entries[i] = entry_to_dict(e, **options)
-            entries[i]['dn'] = e.dn
+            graph = self._get_membership_graph(entries, attrs_list, options)
+            for (i, e) in enumerate(entries):
+                entries[i] = self._convert_entry(e, attrs_list, graph, *args,
+                                                 **options)
 
         result = dict(
             result=entries,
@@ -2102,6 +2297,130 @@ class LDAPSearch(BaseLDAPCommand, crud.Search):
 
         return result
 
+    def _execute_page(self, ldap, filter, attrs_list, base_dn, scope, keys,
+                      *args, **options):
+        """
+        Search one page of the entries sorted by the primary key on the
+        server, see LDAPClient.find_entries_page.
+        """
+        if not self.obj.primary_key or not self.sort_result_entries:
+            raise errors.ValidationError(
+                name='page_size',
+                error=_('paged search is not supported for %(objects)s')
+                % dict(objects=self.obj.object_name_plural))
+
+        offset = options.get('page_offset') or 0
+        try:
+            (entries, total) = self._exc_wrapper(
+                args, options, ldap.find_entries_page)(
+                filter, attrs_list, base_dn, scope,
+                sort_attr=self.obj.primary_key.name,
+                offset=offset,
+                page_size=options['page_size'],
+                time_limit=options.get('timelimit', None)
+            )
+        except errors.NotFound:
+            return self.api.Object[self.obj.parent_object].handle_not_found(
+                *keys)
+
+        # the window sent by the server, post callbacks may drop entries
+        # but the next page still starts after it
+        last = offset + len(entries)
+        # more entries follow this page
+        truncated = last < total
+        for callback in self.get_callbacks('post'):
+            truncated = callback(
+                self, ldap, entries, truncated, *args, **options
+            )
+
+        graph = self._get_membership_graph(entries, attrs_list, options)
+        for (i, e) in enumerate(entries):
+            entries[i] = self._convert_entry(e, attrs_list, graph, *args,
+                                             **options)
+
+        result = dict(
+            result=entries,
+            count=len(entries),
+            truncated=bool(truncated),
+        )
+        if last > offset:
+            add_message(options['version'], result, SearchResultPage(
+                first=offset + 1, last=last, total=total))
+        return result
+
+    def _get_sort_key(self, entry):
+        return self.obj.primary_key.sort_key(
+            entry[self.obj.primary_key.name][0])
+
+    def _get_membership_graph(self, entries, attrs_list, options):
+        """
+        Return a MembershipGraph of entries if their indirect membership
+        needs to be resolved, None otherwise.
+        """
+        if options.get('raw', False):
+            return None
+        memberindirect = 'memberindirect' in attrs_list
+        memberofindirect = 'memberofindirect' in attrs_list
+        if not memberindirect and not memberofindirect:
+            return None
+        return MembershipGraph(self.obj.backend, self.api.env.basedn,
+                               entries, memberindirect, memberofindirect)
+
+    def _convert_entry(self, entry, attrs_list, graph, *args, **options):
+        if not options.get('raw', False):
+            self.obj.get_indirect_members(entry, attrs_list, graph)
+            self.obj.convert_attribute_members(entry, *args, **options)
+
+        result = entry_to_dict(entry, **options)
+        result['dn'] = entry.dn
+        return result
+
+    def _find_converted_entries(self, args, options, filter, attrs_list,
+                                base_dn, scope, time_limit=None,
+                                size_limit=None):
+        """
+        Search entries and convert them to dicts while they are received.
+
+        Returns the same (entries, truncated) tuple as ldap2.find_entries,
+        except that the entries are already converted and sorted.
+        """
+        ldap = self.obj.backend
+        sort = self.sort_result_entries and self.obj.primary_key
+
+        # the entries are only converted, never written back
+        iterator = ldap.iter_entries(filter, attrs_list, base_dn, scope,
+                                     time_limit=time_limit,
+                                     size_limit=size_limit,
+                                     read_only=True)
+        entries = []
+        pending = []
+
+        def convert_pending():
+            # indirect membership is resolved for a batch of entries at once
+            graph = self._get_membership_graph(pending, attrs_list, options)
+            for entry in pending:
+                sort_key = self._get_sort_key(entry) if sort else None
+                entries.append(
+                    (sort_key,
+                     self._convert_entry(
+                         entry, attrs_list, graph, *args, **options)))
+            del pending[:]
+
+        for entry in iterator:
+            pending.append(entry)
+            if len(pending) >= MembershipGraph.batch_size:
+                convert_pending()
+        if pending:
+            convert_pending()
+
+        if not entries and not iterator.truncated:
+            raise errors.EmptyResult(reason='no matching entry found')
+
+        if sort:
+            entries.sort(key=lambda e: e[0])
+
+        return ([e for _sort_key, e in entries], iterator.truncated)
+
     def pre_callback(self, ldap, filters, attrs_list, base_dn, scope, *args, **options):
         assert isinstance(base_dn, DN)
         return (filters, base_dn, scope)
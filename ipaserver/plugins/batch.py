@@ -18,7 +18,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
 import logging
+import threading
 
 import six
 
@@ -28,9 +30,10 @@ from ipalib.frontend import Local
 from ipalib.parameters import Str, Dict
 from ipalib.output import Output
 from ipalib.text import _
-from ipalib.request import context
+from ipalib.request import context, destroy_context
 from ipalib.plugable import Registry
 from ipapython.version import API_VERSION
+from ipaserver.plugins.baseldap import LDAPRetrieve, LDAPSearch
 
 __doc__ = _("""
 Plugin to make multiple ipa calls via one remote procedure call
@@ -93,69 +96,142 @@ class batch(Command):
         Output('results', (list, tuple), doc='')
     )
 
-    def execute(self, methods=None, **options):
-        results = []
-        for arg in (methods or []):
-            params = dict()
-            name = None
+    # request state passed on to the threads of concurrent batches
+    _context_attrs = (
+        'ccache_name', 'languages', 'client_ip', 'request_stats')
+
+    def _execute_method(self, arg, options):
+        params = dict()
+        name = None
+        try:
+            if 'method' not in arg:
+                raise errors.RequirementError(name='method')
+            if 'params' not in arg:
+                raise errors.RequirementError(name='params')
+            name = arg['method']
+            if (name not in self.api.Command or
+                    isinstance(self.api.Command[name], Local)):
+                raise errors.CommandError(name=name)
+
+            # If params are not formated as a tuple(list, dict)
+            # the following lines will raise an exception
+            # that triggers an internal server error
+            # Raise a ConversionError instead to report the issue
+            # to the client
             try:
-                if 'method' not in arg:
-                    raise errors.RequirementError(name='method')
-                if 'params' not in arg:
-                    raise errors.RequirementError(name='params')
-                name = arg['method']
-                if (name not in self.api.Command or
-                        isinstance(self.api.Command[name], Local)):
-                    raise errors.CommandError(name=name)
-
-                # If params are not formated as a tuple(list, dict)
-                # the following lines will raise an exception
-                # that triggers an internal server error
-                # Raise a ConversionError instead to report the issue
-                # to the client
-                try:
-                    a, kw = arg['params']
-                    newkw = dict((str(k), v) for k, v in kw.items())
-                    params = api.Command[name].args_options_2_params(
-                        *a, **newkw)
-                except (AttributeError, ValueError, TypeError):
-                    raise errors.ConversionError(
-                        name='params',
-                        error=_(u'must contain a tuple (list, dict)'))
-                newkw.setdefault('version', options['version'])
-
-                result = api.Command[name](*a, **newkw)
+                a, kw = arg['params']
+                newkw = dict((str(k), v) for k, v in kw.items())
+                params = api.Command[name].args_options_2_params(
+                    *a, **newkw)
+            except (AttributeError, ValueError, TypeError):
+                raise errors.ConversionError(
+                    name='params',
+                    error=_(u'must contain a tuple (list, dict)'))
+            newkw.setdefault('version', options['version'])
+
+            result = api.Command[name](*a, **newkw)
+            logger.info(
+                '%s: batch: %s(%s): SUCCESS',
+                getattr(context, 'principal', 'UNKNOWN'),
+                name,
+                ', '.join(api.Command[name]._repr_iter(**params))
+            )
+            result['error']=None
+        except Exception as e:
+            if isinstance(e, errors.RequirementError) or \
+                isinstance(e, errors.CommandError):
                 logger.info(
-                    '%s: batch: %s(%s): SUCCESS',
-                    getattr(context, 'principal', 'UNKNOWN'),
-                    name,
-                    ', '.join(api.Command[name]._repr_iter(**params))
+                    '%s: batch: %s',
+                    context.principal,  # pylint: disable=no-member
+                    e.__class__.__name__
                 )
-                result['error']=None
-            except Exception as e:
-                if isinstance(e, errors.RequirementError) or \
-                    isinstance(e, errors.CommandError):
-                    logger.info(
-                        '%s: batch: %s',
-                        context.principal,  # pylint: disable=no-member
-                        e.__class__.__name__
-                    )
-                else:
-                    logger.info(
-                        '%s: batch: %s(%s): %s',
-                        context.principal, name,  # pylint: disable=no-member
-                        ', '.join(api.Command[name]._repr_iter(**params)),
-                        e.__class__.__name__
-                    )
-                if isinstance(e, errors.PublicError):
-                    reported_error = e
-                else:
-                    reported_error = errors.InternalError()
-                result = dict(
-                    error=reported_error.strerror,
-                    error_code=reported_error.errno,
-                    error_name=unicode(type(reported_error).__name__),
-                    error_kw=reported_error.kw,
+            else:
+                logger.info(
+                    '%s: batch: %s(%s): %s',
+                    context.principal, name,  # pylint: disable=no-member
+                    ', '.join(api.Command[name]._repr_iter(**params)),
+                    e.__class__.__name__
                 )
-            results.append(result)
+            if isinstance(e, errors.PublicError):
+                reported_error = e
+            else:
+                reported_error = errors.InternalError()
+            result = dict(
+                error=reported_error.strerror,
+                error_code=reported_error.errno,
+                error_name=unicode(type(reported_error).__name__),
+                error_kw=reported_error.kw,
+            )
+        return result
+
+    def _is_read_only(self, arg):
+        # only the generic LDAP show and find commands are known to never
+        # write, other Retrieve and Search commands may talk to other
+        # services or update entries
+        name = arg.get('method')
+        if name not in self.api.Command:
+            return False
+        command = self.api.Command[name]
+        return isinstance(command, (LDAPRetrieve, LDAPSearch))
+
+    def _execute_concurrently(self, methods, options, max_workers):
+        """
+        Execute read-only methods in up to *max_workers* threads.
+
+        Every thread binds its own LDAP connection with the credentials of
+        the request; connections are kept in the thread-local context and
+        the pool checks out each connection to a single thread at a time.
+        Methods left over by threads which failed to connect are executed
+        in the request thread.
+        """
+        results = [None] * len(methods)
+        pending = collections.deque(enumerate(methods))
+        state = {
+            name: getattr(context, name) for name in self._context_attrs
+            if hasattr(context, name)
+        }
+
+        def worker():
+            try:
+                for name, value in state.items():
+                    setattr(context, name, value)
+                self.api.Backend.ldap2.connect(
+                    ccache=state.get('ccache_name'),
+                    size_limit=None,
+                    time_limit=None)
+                while True:
+                    try:
+                        i, arg = pending.popleft()
+                    except IndexError:
+                        break
+                    results[i] = self._execute_method(arg, options)
+            except Exception as e:
+                logger.error('batch: worker failed: %s', e)
+            finally:
+                destroy_context()
+
+        threads = [
+            threading.Thread(target=worker)
+            for _i in range(min(max_workers, len(methods)))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for i, arg in enumerate(methods):
+            if results[i] is None:
+                results[i] = self._execute_method(arg, options)
+        return results
+
+    def execute(self, methods=None, **options):
+        methods = methods or []
+        max_workers = int(self.api.env.batch_max_workers)
+        if (max_workers > 1 and len(methods) > 1 and
+                self.api.env.in_server and
+                all(self._is_read_only(arg) for arg in methods)):
+            results = self._execute_concurrently(
+                methods, options, max_workers)
+        else:
+            results = [self._execute_method(arg, options) for arg in methods]
         return dict(count=len(results) , results=results)
@@ -19,13 +19,19 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import gettext
+import hashlib
+
 from ipalib import Command
 from ipalib import Str
 from ipalib.frontend import Local
 from ipalib.output import Output
+from ipalib.request import context
+from ipalib.rpc import PreEncodedJSON, json_encode_binary
 from ipalib.text import _
 from ipalib.util import json_serialize
 from ipalib.plugable import Registry
+from ipapython.version import API_VERSION
 
 __doc__ = _("""
 Plugins not accessible directly through the CLI, commands used internally
@@ -1589,5 +1595,38 @@ class i18n_messages(Command):
     has_output = (
         Output('texts', dict, doc=_('Dict of I18N messages')),
     )
+
+    # translated messages encoded for each set of message catalogs
+    _encoded_texts = {}
+    _max_encoded_texts = 32
+
+    def _get_catalogs(self):
+        """
+        Return the message catalogs gettext uses for the request.
+
+        The languages come from the Accept-Language header of the client,
+        the translated messages only depend on the catalogs found for them.
+        """
+        return tuple(gettext.find(
+            _.domain, _.localedir,
+            languages=getattr(context, 'languages', None), all=True))
+
     def execute(self, **options):
-        return dict(texts=json_serialize(self.messages))
+        catalogs = self._get_catalogs()
+        texts = self._encoded_texts.get(catalogs)
+        if texts is None:
+            data = json_encode_binary(json_serialize(self.messages),
+                                      API_VERSION).encode('utf-8')
+            texts = PreEncodedJSON(
+                data, etag=hashlib.sha1(data).hexdigest()[:16])
+            if len(self._encoded_texts) >= self._max_encoded_texts:
+                self._encoded_texts.clear()
+            self._encoded_texts[catalogs] = texts
+        return dict(texts=texts)
+
+    def validate_output(self, output, version=API_VERSION):
+        texts = output.get('texts')
+        if isinstance(texts, PreEncodedJSON):
+            # validate the encoded value rather than its wrapper
+            output = dict(output, texts=texts.value)
+        super(i18n_messages, self).validate_output(output, version)
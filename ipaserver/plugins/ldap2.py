@@ -29,8 +29,12 @@ Backend plugin for LDAP.
 
 from __future__ import absolute_import
 
+import collections
+import contextlib
 import logging
 import os
+import threading
+import time
 
 import ldap as _ldap
 
@@ -38,7 +42,7 @@ from ipalib import krb_utils
 from ipaplatform.paths import paths
 from ipapython.dn import DN
 from ipapython.ipaldap import (LDAPClient, AUTOBIND_AUTO, AUTOBIND_ENABLED,
-                               AUTOBIND_DISABLED)
+                               AUTOBIND_DISABLED, schema_cache)
 
 from ipalib import Registry, errors, _
 from ipalib.crud import CrudBackend
@@ -51,6 +55,287 @@ register = Registry()
 _missing = object()
 
 
+class _PooledConnection:
+    """
+    Bookkeeping for a single python-ldap connection owned by the pool.
+    """
+
+    __slots__ = ('conn', 'key', 'created', 'last_used')
+
+    def __init__(self, conn, key):
+        self.conn = conn
+        self.key = key
+        self.created = time.time()
+        self.last_used = self.created
+
+
+class LDAPConnectionPool:
+    """
+    Per-process pool of bound LDAP connections.
+
+    Connections are keyed by the identity they are bound as (LDAP URI and
+    Kerberos principal), so a connection is only ever handed out to a
+    request authenticated as the same principal that performed the SASL
+    bind. This preserves per-user ACI evaluation in 389-ds while letting
+    repeated requests of one session skip the connection setup and the
+    SASL/GSSAPI handshake.
+
+    Idle connections are evicted after ``max_idle`` seconds, connections
+    are retired after ``max_lifetime`` seconds regardless of use, and an
+    idle connection is probed with a WhoAmI extended operation before it
+    is reused if it was not used for more than ``check_interval`` seconds.
+    """
+
+    def __init__(self, max_size=8, max_idle=300, max_lifetime=3600,
+                 check_interval=30):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._idle = []
+        self._in_use = {}
+        self._stats = dict(hits=0, misses=0, created=0, evicted=0,
+                           discarded=0)
+
+    def _reset_after_fork(self):
+        # connections cannot be shared with a parent process
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._in_use = {}
+
+    def _expired(self, item, now):
+        return (now - item.last_used > self.max_idle or
+                now - item.created > self.max_lifetime)
+
+    def _close(self, item):
+        try:
+            item.conn.unbind_s()
+        except _ldap.LDAPError:
+            pass
+
+    def _is_alive(self, item, now):
+        if now - item.last_used <= self.check_interval:
+            return True
+        try:
+            item.conn.whoami_s()
+        except _ldap.LDAPError as e:
+            logger.debug('Pooled LDAP connection for %s failed health '
+                         'check: %s', item.key, e)
+            return False
+        return True
+
+    def acquire(self, key):
+        """
+        Check out an idle connection bound as *key*.
+
+        Returns ``None`` if no usable connection is available; the caller
+        is then expected to bind a new connection and `register` it.
+        """
+        now = time.time()
+        with self._lock:
+            self._reset_after_fork()
+            self._evict(now)
+            for item in reversed(self._idle):
+                if item.key == key:
+                    self._idle.remove(item)
+                    break
+            else:
+                self._stats['misses'] += 1
+                return None
+
+        if not self._is_alive(item, now):
+            self._close(item)
+            with self._lock:
+                self._stats['discarded'] += 1
+                self._stats['misses'] += 1
+            return None
+
+        with self._lock:
+            self._in_use[id(item.conn)] = item
+            self._stats['hits'] += 1
+        return item.conn
+
+    def register(self, key, conn):
+        """
+        Take ownership of a freshly bound connection checked out by the
+        caller.
+        """
+        with self._lock:
+            self._reset_after_fork()
+            self._in_use[id(conn)] = _PooledConnection(conn, key)
+            self._stats['created'] += 1
+
+    def release(self, conn):
+        """
+        Return a connection to the pool.
+
+        Returns ``False`` if *conn* is not managed by the pool, in which
+        case the caller is responsible for closing it.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._in_use.pop(id(conn), None)
+            if item is None or item.conn is not conn:
+                return False
+            item.last_used = now
+            if self._expired(item, now):
+                self._stats['evicted'] += 1
+                discard = [item]
+            else:
+                self._idle.append(item)
+                discard = self._evict(now)
+
+        for item in discard:
+            self._close(item)
+        return True
+
+    def discard(self, conn):
+        """
+        Drop a checked out connection instead of returning it to the pool.
+
+        Returns ``False`` if *conn* is not managed by the pool, in which
+        case the caller is responsible for closing it.
+        """
+        with self._lock:
+            item = self._in_use.pop(id(conn), None)
+            if item is None or item.conn is not conn:
+                return False
+            self._stats['discarded'] += 1
+        self._close(item)
+        return True
+
+    def _evict(self, now):
+        # must be called with self._lock held
+        keep = []
+        evicted = []
+        for item in self._idle:
+            if self._expired(item, now):
+                evicted.append(item)
+            else:
+                keep.append(item)
+        # the list is ordered by release time, drop the least recently used
+        overflow = len(keep) - self.max_size
+        if overflow > 0:
+            evicted.extend(keep[:overflow])
+            keep = keep[overflow:]
+        self._idle = keep
+        self._stats['evicted'] += len(evicted)
+        return evicted
+
+    def clear(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._close(item)
+
+    def stats(self):
+        """Return a dict with pool statistics."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(
+                idle=len(self._idle),
+                in_use=len(self._in_use),
+                max_size=self.max_size,
+            )
+        return stats
+
+
+connection_pool = None
+
+# errors after which a connection is not returned to the pool
+_CONNECTION_ERRORS = (_ldap.SERVER_DOWN, _ldap.CONNECT_ERROR, _ldap.TIMEOUT,
+                      _ldap.PROTOCOL_ERROR, _ldap.LOCAL_ERROR)
+
+# maximum number of values changed by a single member modification
+_MEMBER_CHUNK_SIZE = 1000
+
+# operational attributes which change whenever cn=ipaConfig is modified
+_CONFIG_VERSION_ATTRS = ('entryusn', 'modifytimestamp')
+
+
+class _CachedConfig:
+    __slots__ = ('dn', 'raw', 'version', 'checked')
+
+    def __init__(self, dn, raw, version, checked):
+        self.dn = dn
+        self.raw = raw
+        self.version = version
+        self.checked = checked
+
+
+class IPAConfigCache:
+    """
+    Process-wide cache of the raw cn=ipaConfig entry.
+
+    What a search returns depends on the ACIs of the bound identity and on
+    the requested attributes, so entries are cached per (identity,
+    attributes) key and never shared between identities.
+
+    The entry is stored together with its entryUSN and modifyTimestamp,
+    which `ldap2.get_ipa_config` compares against the server once the
+    entry is older than the configured TTL. Modifications made through
+    `ldap2.update_entry` in this process invalidate the cache immediately.
+    """
+
+    # the number of identities of a process is not bounded, the cache is
+    # simply emptied when it is full
+    max_size = 64
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cached = {}
+
+    def get(self, key):
+        return self._cached.get(key)
+
+    def store(self, key, raw, version, checked):
+        cached = _CachedConfig(key[0], raw, version, checked)
+        with self._lock:
+            if len(self._cached) >= self.max_size:
+                self._cached.clear()
+            self._cached[key] = cached
+        return cached
+
+    def discard(self, key):
+        with self._lock:
+            self._cached.pop(key, None)
+
+    def invalidate(self):
+        with self._lock:
+            self._cached.clear()
+
+
+ipa_config_cache = IPAConfigCache()
+
+
+def get_connection_pool(api):
+    """
+    Return the per-process LDAP connection pool, or ``None`` if pooling is
+    disabled.
+
+    Pooling is only used by the WSGI server context, where connections are
+    established and torn down for every request.
+    """
+    global connection_pool
+
+    if api.env.context != 'server' or not api.env.ldap_pool_size:
+        return None
+
+    if connection_pool is None:
+        connection_pool = LDAPConnectionPool(
+            max_size=int(api.env.ldap_pool_size),
+            max_idle=int(api.env.ldap_pool_max_idle),
+            max_lifetime=int(api.env.ldap_pool_max_lifetime),
+            check_interval=int(api.env.ldap_pool_check_interval),
+        )
+    return connection_pool
+
+
 @register()
 class ldap2(CrudBackend, LDAPClient):
     """
@@ -66,6 +351,11 @@ class ldap2(CrudBackend, LDAPClient):
 
         self._time_limit = float(LDAPClient.time_limit)
         self._size_limit = int(LDAPClient.size_limit)
+        self._connect_lock = threading.RLock()
+
+        # share the parsed schema between recycled WSGI processes
+        if api.env.context == 'server':
+            schema_cache.cache_dir = paths.IPA_SERVER_CACHE_DIR
 
     @property
     def ldap_uri(self):
@@ -117,6 +407,21 @@ class ldap2(CrudBackend, LDAPClient):
     def __str__(self):
         return self.ldap_uri
 
+    def connect(self, *args, **kw):
+        """
+        Extends backend.Connectible.connect.
+
+        Connections are bound through the KRB5CCNAME environment variable
+        and change the limits and the schema of this shared instance, so
+        the threads of a concurrent batch connect one at a time.
+        """
+        with self._connect_lock:
+            super(ldap2, self).connect(*args, **kw)
+
+    def disconnect(self):
+        with self._connect_lock:
+            super(ldap2, self).disconnect()
+
     def create_connection(
             self, ccache=None, bind_dn=None, bind_pw='', cacert=None,
             autobind=AUTOBIND_AUTO, serverctrls=None, clientctrls=None,
@@ -153,6 +458,34 @@ class ldap2(CrudBackend, LDAPClient):
         if size_limit is not _missing:
             object.__setattr__(self, 'size_limit', size_limit)
 
+        ldapi = self.ldap_uri.startswith('ldapi://')
+        use_gssapi = not bind_pw and not (
+            autobind != AUTOBIND_DISABLED and os.getegid() == 0 and ldapi)
+
+        pool = None
+        if use_gssapi:
+            if ccache is None:
+                os.environ.pop('KRB5CCNAME', None)
+            else:
+                os.environ['KRB5CCNAME'] = ccache
+
+            principal = None
+            if ccache is not None:
+                # usually validated by the RPC handler already
+                principal = krb_utils.get_valid_principal(ccache)
+            if principal is None:
+                principal = krb_utils.get_principal(ccache_name=ccache)
+
+            # connections bound with request controls are never shared
+            if serverctrls is None and clientctrls is None:
+                pool = get_connection_pool(self.api)
+            if pool is not None:
+                pool_key = (self.ldap_uri, principal)
+                conn = pool.acquire(pool_key)
+                if conn is not None:
+                    setattr(context, 'principal', principal)
+                    return conn
+
         client = LDAPClient(self.ldap_uri,
                             force_schema_updates=self._force_schema_updates,
                             cacert=cacert)
@@ -169,16 +502,18 @@ class ldap2(CrudBackend, LDAPClient):
                 if maxssf < minssf:
                     conn.set_option(_ldap.OPT_X_SASL_SSF_MAX, minssf)
 
-        ldapi = self.ldap_uri.startswith('ldapi://')
-
+        # identity the connection is bound as, it selects the cached
+        # cn=ipaConfig entries the connection may see
         if bind_pw:
             client.simple_bind(bind_dn, bind_pw,
                                server_controls=serverctrls,
                                client_controls=clientctrls)
-        elif autobind != AUTOBIND_DISABLED and os.getegid() == 0 and ldapi:
+            conn.ipa_bind_identity = ('simple', str(bind_dn))
+        elif not use_gssapi:
             try:
                 client.external_bind(server_controls=serverctrls,
                                      client_controls=clientctrls)
+                conn.ipa_bind_identity = ('external', os.geteuid())
             except errors.NotFound:
                 if autobind == AUTOBIND_ENABLED:
                     # autobind was required and failed, raise
@@ -188,24 +523,41 @@ class ldap2(CrudBackend, LDAPClient):
             if ldapi:
                 with client.error_handler():
                     conn.set_option(_ldap.OPT_HOST_NAME, self.api.env.host)
-            if ccache is None:
-                os.environ.pop('KRB5CCNAME', None)
-            else:
-                os.environ['KRB5CCNAME'] = ccache
-
-            principal = krb_utils.get_principal(ccache_name=ccache)
 
             client.gssapi_bind(server_controls=serverctrls,
                                client_controls=clientctrls)
+            conn.ipa_bind_identity = ('gssapi', str(principal))
             setattr(context, 'principal', principal)
 
+            if pool is not None:
+                pool.register(pool_key, conn)
+
         return conn
 
     def destroy_connection(self):
-        """Disconnect from LDAP server."""
+        """
+        Disconnect from LDAP server.
+
+        Pooled connections are returned to the pool instead of unbound.
+        """
+        pool = get_connection_pool(self.api)
         try:
-            if self.conn is not None:
-                self.unbind()
+            conn = self.conn
+            if conn is not None:
+                if pool is None:
+                    self.unbind()
+                elif getattr(conn, 'ipa_connection_failed', False):
+                    if pool.discard(conn):
+                        # the server was probably restarted, the idle
+                        # connections are not usable either
+                        pool.clear()
+                        self._flush_schema()
+                    else:
+                        self.unbind()
+                elif pool.release(conn):
+                    self._flush_schema()
+                else:
+                    self.unbind()
         except errors.PublicError:
             # ignore when trying to unbind multiple times
             pass
@@ -213,8 +565,104 @@ class ldap2(CrudBackend, LDAPClient):
         object.__delattr__(self, 'time_limit')
         object.__delattr__(self, 'size_limit')
 
+    @contextlib.contextmanager
+    def error_handler(self, arg_desc=None):
+        """
+        Extends LDAPClient.error_handler.
+
+        Remembers errors of the connection itself, so that the connection
+        is discarded instead of returned to the pool.
+        """
+        with LDAPClient.error_handler(self, arg_desc):
+            try:
+                yield
+            except _CONNECTION_ERRORS:
+                if self.isconnected() and self.conn is not None:
+                    self.conn.ipa_connection_failed = True
+                raise
+
+    def get_pool_stats(self):
+        """
+        Return statistics of the per-process connection pool or ``None`` if
+        pooling is disabled.
+        """
+        pool = get_connection_pool(self.api)
+        if pool is None:
+            return None
+        return pool.stats()
+
+    def _find_ipa_config(self, dn, attrs_list):
+        try:
+            # use find_entries here lest we hit an infinite recursion when
+            # ldap2.get_entries tries to determine default time/size limits
+            (entries, truncated) = self.find_entries(
+                None, attrs_list, base_dn=dn, scope=self.SCOPE_BASE,
+                time_limit=2, size_limit=10
+            )
+            self.handle_truncated_result(truncated)
+            return entries[0]
+        except errors.NotFound:
+            return None
+
+    @staticmethod
+    def _get_ipa_config_version(entry):
+        return tuple(entry.raw.get(attr, [None])[0]
+                     for attr in _CONFIG_VERSION_ATTRS)
+
+    def _get_ipa_config_cache_key(self, dn, attrs_list):
+        """
+        Return the cache key of the configuration entry read with
+        *attrs_list* over the current connection, None if the identity the
+        connection is bound as is unknown.
+        """
+        identity = getattr(self.conn, 'ipa_bind_identity', None)
+        if identity is None:
+            return None
+        if attrs_list is None:
+            attrs = None
+        else:
+            attrs = tuple(sorted(set(a.lower() for a in attrs_list)))
+        return (dn, identity, attrs)
+
+    def _get_cached_ipa_config(self, key, ttl):
+        dn, _identity, attrs = key
+        now = time.time()
+        cached = ipa_config_cache.get(key)
+        if cached is not None and now - cached.checked > ttl:
+            # cheap revalidation, only the operational attributes are read
+            entry = self._find_ipa_config(dn, list(_CONFIG_VERSION_ATTRS))
+            if (entry is not None and
+                    self._get_ipa_config_version(entry) == cached.version):
+                cached.checked = now
+            else:
+                ipa_config_cache.discard(key)
+                cached = None
+
+        if cached is None:
+            entry = self._find_ipa_config(
+                dn, list(attrs or ['*']) + list(_CONFIG_VERSION_ATTRS))
+            if entry is None:
+                return self.make_entry(dn)
+            version = self._get_ipa_config_version(entry)
+            raw = {name: value for name, value in entry.raw.items()
+                   if name.lower() not in _CONFIG_VERSION_ATTRS}
+            cached = ipa_config_cache.store(key, raw, version, now)
+
+        # hand out a private copy, callers are free to modify the entry
+        config_entry = self.make_entry(dn)
+        for name, value in cached.raw.items():
+            config_entry.raw[name] = list(value)
+        config_entry.reset_modlist()
+        return config_entry
+
     def get_ipa_config(self, attrs_list=None):
-        """Returns the IPA configuration entry (dn, entry_attrs)."""
+        """Returns the IPA configuration entry (dn, entry_attrs).
+
+        Outside of installers and updates the entry is cached per process,
+        bind identity and *attrs_list*, and revalidated against its entryUSN
+        and modifyTimestamp at most once every ``ipaconfig_cache_ttl``
+        seconds.
+        """
 
         dn = self.api.Object.config.get_dn()
         assert isinstance(dn, DN)
@@ -226,21 +674,42 @@ class ldap2(CrudBackend, LDAPClient):
         except AttributeError:
             # Not in our context yet
             pass
-        try:
-            # use find_entries here lest we hit an infinite recursion when
-            # ldap2.get_entries tries to determine default time/size limits
-            (entries, truncated) = self.find_entries(
-                None, attrs_list, base_dn=dn, scope=self.SCOPE_BASE,
-                time_limit=2, size_limit=10
-            )
-            self.handle_truncated_result(truncated)
-            config_entry = entries[0]
-        except errors.NotFound:
-            config_entry = self.make_entry(dn)
+
+        ttl = self._get_ipa_config_cache_ttl()
+        key = None
+        if ttl:
+            key = self._get_ipa_config_cache_key(dn, attrs_list)
+        if key is not None:
+            config_entry = self._get_cached_ipa_config(key, ttl)
+        else:
+            config_entry = self._find_ipa_config(dn, attrs_list)
+            if config_entry is None:
+                config_entry = self.make_entry(dn)
 
         context.config_entry = config_entry
         return config_entry
 
+    def _get_ipa_config_cache_ttl(self):
+        if self._force_schema_updates:
+            return 0
+        return int(self.api.env.ipaconfig_cache_ttl)
+
+    def invalidate_ipa_config(self):
+        """
+        Drop the cached IPA configuration entry of this process and request.
+        """
+        ipa_config_cache.invalidate()
+        try:
+            delattr(context, 'config_entry')
+        except AttributeError:
+            pass
+
+    def update_entry(self, entry):
+        super(ldap2, self).update_entry(entry)
+        if (self._get_ipa_config_cache_ttl() and
+                entry.dn == self.api.Object.config.get_dn()):
+            self.invalidate_ipa_config()
+
     def has_upg(self):
         """Returns True/False whether User-Private Groups are enabled.
 
@@ -445,6 +914,213 @@ class ldap2(CrudBackend, LDAPClient):
         except errors.MidairCollision:
             raise errors.NotGroupMember()
 
+    def _find_existing_entries(self, dns):
+        """
+        Look up several entries by DN.
+
+        Entries are searched with one OR-filter of their RDNs per parent
+        container instead of one base search per entry. Returns a dict
+        mapping each DN in dns either to the DN of the entry as stored on
+        the server or to the PublicError raised when looking it up.
+        """
+        by_parent = collections.OrderedDict()
+        lookups = []
+        for dn in dns:
+            if len(dn) > 1 and len(dn[0]) == 1:
+                by_parent.setdefault(dn[1:], []).append(dn)
+            else:
+                lookups.append((dn, self.get_entry_async(dn, [''])))
+
+        searches = []
+        for parent, children in by_parent.items():
+            for i in range(0, len(children), _MEMBER_CHUNK_SIZE):
+                chunk = children[i:i + _MEMBER_CHUNK_SIZE]
+                filter = self.combine_filters(
+                    [self.make_filter_from_attr(dn[0].attr, dn[0].value)
+                     for dn in chunk],
+                    rules=self.MATCH_ANY)
+                searches.append((chunk, self.search_async(
+                    parent, self.SCOPE_ONELEVEL, filter, [''],
+                    size_limit=len(chunk))))
+
+        result = {}
+        for chunk, search in searches:
+            try:
+                found = {entry.dn: entry.dn for entry in search.result()}
+            except errors.PublicError as e:
+                for dn in chunk:
+                    result[dn] = e
+                continue
+            for dn in chunk:
+                if dn in found:
+                    result[dn] = found[dn]
+                else:
+                    result[dn] = errors.NotFound(reason='no such entry')
+
+        for dn, lookup in lookups:
+            try:
+                result[dn] = lookup.result().dn
+            except errors.PublicError as e:
+                result[dn] = e
+
+        return result
+
+    def _get_group_members(self, group_dn, member_attr):
+        """
+        Return the set of values of member_attr of group group_dn.
+
+        The set is empty if the attribute can not be read.
+        """
+        entry = self.get_entry(group_dn, [member_attr])
+        return set(entry.get(member_attr, []))
+
+    def _modify_group_members(self, group_dn, mod_op, member_attr, dns):
+        """
+        Add or remove dns to or from member_attr of group_dn.
+
+        The values are changed with a single modify operation per chunk of
+        _MEMBER_CHUNK_SIZE values. If the modification of a chunk fails,
+        its values are retried one by one to find out which of them caused
+        the failure. Returns a list of (dn, exception) tuples.
+        """
+        chunks = [dns[i:i + _MEMBER_CHUNK_SIZE]
+                  for i in range(0, len(dns), _MEMBER_CHUNK_SIZE)]
+        modifications = [
+            self.modify_async(group_dn, [(mod_op, member_attr, chunk)])
+            for chunk in chunks
+        ]
+
+        results = []
+        failed = []
+        for chunk, modification in zip(chunks, modifications):
+            try:
+                modification.result()
+            except errors.PublicError:
+                failed.extend(chunk)
+            else:
+                results.extend((dn, None) for dn in chunk)
+
+        modifications = [
+            self.modify_async(group_dn, [(mod_op, member_attr, [dn])])
+            for dn in failed
+        ]
+        for dn, modification in zip(failed, modifications):
+            try:
+                modification.result()
+            except errors.PublicError as e:
+                results.append((dn, e))
+            else:
+                results.append((dn, None))
+
+        return results
+
+    def add_entries_to_group(self, dns, group_dn, member_attr='member',
+                             allow_same=False):
+        """
+        Add several entries to group group_dn in the member attribute
+        member_attr.
+
+        This is equivalent to calling add_entry_to_group for each DN, but
+        the entries are checked with a few searches and added with a single
+        modification. Returns a list of (dn, error) tuples in the order of
+        dns, where error is None on success or the PublicError
+        add_entry_to_group would have raised.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "add_entries_to_group: dns=%d group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        if not dns:
+            return []
+
+        try:
+            members = self._get_group_members(group_dn, member_attr)
+        except errors.PublicError as e:
+            return [(dn, e) for dn in dns]
+
+        # check if the entries exist
+        existing = self._find_existing_entries(dns)
+
+        errs = {}
+        entry_dns = {}
+        for dn in dns:
+            entry_dn = existing[dn]
+            if isinstance(entry_dn, errors.PublicError):
+                errs[dn] = entry_dn
+            elif entry_dn == group_dn and not allow_same:
+                # check if we're not trying to add group into itself
+                errs[dn] = errors.SameGroupError()
+            elif entry_dn in members or entry_dn in entry_dns:
+                errs[dn] = errors.AlreadyGroupMember()
+            else:
+                entry_dns[entry_dn] = dn
+
+        for entry_dn, e in self._modify_group_members(
+                group_dn, _ldap.MOD_ADD, member_attr, list(entry_dns)):
+            if isinstance(e, errors.DuplicateEntry):
+                # TYPE_OR_VALUE_EXISTS
+                e = errors.AlreadyGroupMember()
+            errs[entry_dns[entry_dn]] = e
+
+        return [(dn, errs.get(dn)) for dn in dns]
+
+    def remove_entries_from_group(self, dns, group_dn, member_attr='member'):
+        """
+        Remove several entries from group group_dn.
+
+        Bulk equivalent of remove_entry_from_group, see
+        add_entries_to_group for the return value.
+        """
+        assert isinstance(group_dn, DN)
+
+        logger.debug(
+            "remove_entries_from_group: dns=%d group_dn=%s member_attr=%s",
+            len(dns), group_dn, member_attr)
+
+        if not dns:
+            return []
+
+        try:
+            members = self._get_group_members(group_dn, member_attr)
+        except errors.PublicError as e:
+            return [(dn, e) for dn in dns]
+
+        # Values which were not seen in the group are removed one by one,
+        # they either are not members or member_attr is not readable.
+        errs = {}
+        known = []
+        unknown = []
+        for dn in dns:
+            if dn in errs:
+                continue
+            errs[dn] = None
+            if dn in members:
+                known.append(dn)
+            else:
+                unknown.append(dn)
+
+        results = self._modify_group_members(
+            group_dn, _ldap.MOD_DELETE, member_attr, known)
+        modifications = [
+            self.modify_async(
+                group_dn, [(_ldap.MOD_DELETE, member_attr, [dn])])
+            for dn in unknown
+        ]
+        for dn, modification in zip(unknown, modifications):
+            try:
+                modification.result()
+            except errors.PublicError as e:
+                results.append((dn, e))
+
+        for dn, e in results:
+            if isinstance(e, errors.MidairCollision):
+                e = errors.NotGroupMember()
+            errs[dn] = e
+
+        return [(dn, errs[dn]) for dn in dns]
+
     def set_entry_active(self, dn, active):
         """Mark entry active/inactive."""
 
@@ -4,7 +4,12 @@
 
 import importlib
 import itertools
+import json
+import logging
+import os
 import sys
+import tempfile
+import zlib
 
 import six
 import hashlib
@@ -17,8 +22,12 @@ from ipalib.output import Entry, ListOfEntries, ListOfPrimaryKeys, PrimaryKey
 from ipalib.parameters import Bool, Dict, Flag, Str
 from ipalib.plugable import Registry
 from ipalib.request import context
+from ipalib.rpc import PreEncodedJSON
 from ipalib.text import _
-from ipapython.version import API_VERSION
+from ipaplatform.paths import paths
+from ipapython.version import API_VERSION, VERSION
+
+logger = logging.getLogger(__name__)
 
 # Schema TTL sent to clients in response to schema call.
 # Number of seconds before client should check for schema update.
@@ -835,6 +844,64 @@ class schema(Command):
 
         return schema
 
+    def _get_cache_filename(self, langs):
+        key = hashlib.sha1()
+        for item in [API_VERSION, VERSION, langs] + sorted(
+                c.full_name for c in self.api.Command()):
+            key.update(item.encode('utf-8'))
+            key.update(b'\0')
+        return os.path.join(paths.IPA_SERVER_CACHE_DIR,
+                            'schema-%s.bin' % key.hexdigest())
+
+    def _load_schema(self, langs):
+        filename = self._get_cache_filename(langs)
+        try:
+            with open(filename, 'rb') as f:
+                header = json.loads(f.readline().decode('utf-8'))
+                deflated = f.read()
+            data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(deflated)
+        except (IOError, OSError, ValueError, zlib.error) as e:
+            logger.debug('Unable to read schema cache %s: %s', filename, e)
+            return None
+        return PreEncodedJSON(data, deflated, etag=header['fingerprint'])
+
+    def _store_schema(self, langs, schema):
+        filename = self._get_cache_filename(langs)
+        header = json.dumps(dict(fingerprint=schema.etag)).encode('utf-8')
+        try:
+            fd, tmpname = tempfile.mkstemp(dir=paths.IPA_SERVER_CACHE_DIR,
+                                           prefix='.schema-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(header + b'\n')
+                    f.write(schema.deflated)
+                os.rename(tmpname, filename)
+            except BaseException:
+                os.unlink(tmpname)
+                raise
+        except (IOError, OSError) as e:
+            logger.debug('Unable to write schema cache %s: %s', filename, e)
+
+    def _get_schema(self, langs, **kwargs):
+        """
+        Return the schema for *langs* encoded and compressed.
+
+        The encoded schema is shared with the other server processes through
+        the server cache directory, only the first one has to generate it.
+        """
+        use_cache = self.api.env.context == 'server'
+        schema = None
+        if use_cache:
+            schema = self._load_schema(langs)
+        if schema is None:
+            schema = self._generate_schema(**kwargs)
+            schema['ttl'] = SCHEMA_TTL
+            schema = PreEncodedJSON.encode(
+                schema, API_VERSION, etag=schema['fingerprint'])
+            if use_cache:
+                self._store_schema(langs, schema)
+        return schema
+
     def execute(self, *args, **kwargs):
         langs = "".join(getattr(context, "languages", []))
 
@@ -843,15 +910,14 @@ class schema(Command):
 
         schema = self.api._schema.get(langs)
         if schema is None:
-            schema = self._generate_schema(**kwargs)
+            schema = self._get_schema(langs, **kwargs)
             self.api._schema[langs] = schema
 
-        schema['ttl'] = SCHEMA_TTL
-
-        if schema['fingerprint'] in kwargs.get('known_fingerprints', []):
+        # the fingerprint is the entity tag of the encoded schema
+        if schema.etag in kwargs.get('known_fingerprints', []):
             raise errors.SchemaUpToDate(
-                fingerprint=schema['fingerprint'],
-                ttl=schema['ttl'],
+                fingerprint=schema.etag,
+                ttl=SCHEMA_TTL,
             )
 
         return dict(result=schema)
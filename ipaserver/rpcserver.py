@@ -25,10 +25,15 @@ Also see the `ipalib.rpc` module.
 
 from __future__ import absolute_import
 
+import atexit
+import hashlib
 import logging
 from xml.sax.saxutils import escape
 import os
+import struct
+import time
 import traceback
+import zlib
 
 import gssapi
 import requests
@@ -38,12 +43,13 @@ from pyasn1.type import univ, namedtype
 from pyasn1.codec.ber import encoder
 import six
 # pylint: disable=import-error
+from six.moves.http_cookiejar import DefaultCookiePolicy
 from six.moves.urllib.parse import parse_qs
 from six.moves.xmlrpc_client import Fault
 # pylint: enable=import-error
 from six import BytesIO
 
-from ipalib import plugable, errors
+from ipalib import plugable, errors, stats
 from ipalib.capabilities import VERSION_WITHOUT_CAPABILITIES
 from ipalib.frontend import Local
 from ipalib.install.kinit import kinit_armor, kinit_password
@@ -53,12 +59,13 @@ from ipalib.errors import (PublicError, InternalError, JSONError,
     ExecutionError, PasswordExpired, KrbPrincipalExpired, UserLocked)
 from ipalib.request import context, destroy_context
 from ipalib.rpc import (xml_dumps, xml_loads,
-    json_encode_binary, json_decode_binary)
+    json_encode_binary, json_encode_binary_iter, json_decode_binary,
+    PreEncodedJSON)
 from ipapython.dn import DN
+from ipaserver.metrics import MetricsSpool, format_metrics, get_snapshot
 from ipaserver.plugins.ldap2 import ldap2
 from ipalib.backend import Backend
-from ipalib.krb_utils import (
-    get_credentials_if_valid)
+from ipalib.krb_utils import get_valid_principal
 from ipapython import kerberos
 from ipapython import ipautil
 from ipaplatform.paths import paths
@@ -75,6 +82,10 @@ logger = logging.getLogger(__name__)
 
 HTTP_STATUS_SUCCESS = '200 Success'
 HTTP_STATUS_SERVER_ERROR = '500 Internal Server Error'
+HTTP_STATUS_NOT_MODIFIED = '304 Not Modified'
+
+# gzip member header: magic, deflate, no flags, no mtime, no XFL, unknown OS
+_GZIP_HEADER = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
 
 _not_found_template = """<html>
 <head>
@@ -239,6 +250,156 @@ def extract_query(environ):
     return query
 
 
+def get_accepted_encodings(environ):
+    """
+    Return a ``dict`` mapping the content codings accepted by the client
+    to their quality values.
+    """
+    encodings = {}
+    for coding in environ.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        name, _sep, params = coding.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name == 'x-gzip':
+            name = 'gzip'
+        params = params.replace(' ', '')
+        quality = 1.0
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name] = quality
+    return encodings
+
+
+def accepts_gzip(environ):
+    """
+    Return ``True`` if the client accepts gzip content coding.
+    """
+    return get_accepted_encodings(environ).get('gzip', 0) > 0
+
+
+def _chain_iter(head, chunks):
+    """
+    Yield the items of *head* followed by the rest of the iterator *chunks*,
+    closing *chunks* when done.
+    """
+    try:
+        for chunk in head:
+            yield chunk
+        for chunk in chunks:
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def compress_iter(chunks, encoding):
+    """
+    Compress the byte strings from the iterable *chunks* with the content
+    coding *encoding* (``gzip`` or ``deflate``) piece by piece.
+    """
+    if encoding == 'gzip':
+        wbits = 16 + zlib.MAX_WBITS
+    else:
+        wbits = zlib.MAX_WBITS
+    compressor = zlib.compressobj(
+        zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, wbits)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class PreEncodedResponse(object):
+    """
+    Response body with a `PreEncodedJSON` value embedded in it.
+
+    The compressed form of the value is copied into a gzip member between
+    the deflated parts of the response which surround it, so only these
+    small parts are compressed per request. GET and HEAD requests get an
+    ETag of the whole body and a matching If-None-Match results in 304 Not
+    Modified, other requests (JSON-RPC POST) are never conditional.
+    """
+
+    def __init__(self, chunks):
+        prefix = []
+        suffix = []
+        self.value = None
+        for chunk in chunks:
+            if self.value is None and isinstance(chunk, PreEncodedJSON):
+                self.value = chunk
+            elif self.value is None:
+                prefix.append(chunk)
+            elif isinstance(chunk, PreEncodedJSON):
+                suffix.append(chunk.data)
+            else:
+                suffix.append(chunk)
+        self.prefix = b''.join(prefix)
+        self.suffix = b''.join(suffix)
+
+    def get_etag(self):
+        """
+        Return the entity tag of the body, None if the value has none.
+
+        The prefix and suffix contain the id, principal and version of the
+        response, so they are part of the tag.
+        """
+        if self.value.etag is None:
+            return None
+        digest = hashlib.sha1(self.prefix)
+        digest.update(self.value.etag.encode('utf-8'))
+        digest.update(self.suffix)
+        return '"%s"' % digest.hexdigest()[:16]
+
+    def respond(self, environ, status, headers):
+        """
+        Return status and body for the request, add headers to *headers*.
+        """
+        value = self.value
+        etag = None
+        if environ.get('REQUEST_METHOD') in ('GET', 'HEAD'):
+            etag = self.get_etag()
+        if etag is not None:
+            headers.append(('ETag', etag))
+            # the body is compressed here, mod_deflate must keep the ETag
+            headers.append(
+                ('Cache-Control', 'private, no-cache, no-transform'))
+            if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+            if if_none_match is not None:
+                tags = [t.strip() for t in if_none_match.split(',')]
+                if '*' in tags or etag in tags or 'W/' + etag in tags:
+                    return HTTP_STATUS_NOT_MODIFIED, []
+        headers.append(('Vary', 'Accept-Encoding'))
+
+        if not accepts_gzip(environ):
+            return status, [self.prefix, value.data, self.suffix]
+
+        headers.append(('Content-Encoding', 'gzip'))
+        crc = zlib.crc32(self.prefix)
+        crc = zlib.crc32(value.data, crc)
+        crc = zlib.crc32(self.suffix, crc)
+        size = len(self.prefix) + len(value.data) + len(self.suffix)
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        head = compressor.compress(self.prefix)
+        head += compressor.flush(zlib.Z_SYNC_FLUSH)
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        tail = compressor.compress(self.suffix) + compressor.flush()
+        tail += struct.pack('<II', crc & 0xffffffff, size & 0xffffffff)
+        return status, [_GZIP_HEADER + head, value.deflated, tail]
+
+
 class wsgi_dispatch(Executioner, HTTP_Status):
     """
     WSGI routing middleware and entry point into IPA server.
@@ -264,6 +425,7 @@ class wsgi_dispatch(Executioner, HTTP_Status):
 
     def __call__(self, environ, start_response):
         logger.debug('WSGI wsgi_dispatch.__call__:')
+        self.ensure_finalized()
         try:
             return self.route(environ, start_response)
         finally:
@@ -273,6 +435,14 @@ class wsgi_dispatch(Executioner, HTTP_Status):
         self.url = self.env['mount_ipa']
         super(wsgi_dispatch, self)._on_finalize()
 
+        # WSGI applications mount themselves when they are finalized, make
+        # sure they are when plugins are finalized on demand
+        for plugin in self.api.Backend:
+            if plugin is not self.api.Backend.get_plugin(plugin.name):
+                continue
+            if getattr(plugin, 'key', None) is not None:
+                self.api.Backend[plugin.name].ensure_finalized()
+
     def route(self, environ, start_response):
         key = environ.get('PATH_INFO')
         if key in self.__apps:
@@ -347,6 +517,7 @@ class WSGIExecutioner(Executioner):
             return self.marshal(result, RefererError(referer='missing'), _id)
         if not environ['HTTP_REFERER'].startswith('https://%s/ipa' % self.api.env.host) and not self.env.in_tree:
             return self.marshal(result, RefererError(referer=environ['HTTP_REFERER']), _id)
+        stats.start_request()
         try:
             if ('HTTP_ACCEPT_LANGUAGE' in environ):
                 lang_reg_w_q = environ['HTTP_ACCEPT_LANGUAGE'].split(',')[0]
@@ -381,6 +552,9 @@ class WSGIExecutioner(Executioner):
         finally:
             if hasattr(context, "languages"):
                 delattr(context, "languages")
+            request_stats = stats.finish_request(name)
+            if 'metrics' in self.api.Backend:
+                self.api.Backend.metrics.publish()
 
         principal = getattr(context, 'principal', 'UNKNOWN')
         if command is not None:
@@ -410,9 +584,19 @@ class WSGIExecutioner(Executioner):
                         principal,
                         name,
                         type(error).__name__)
+        logger.info(
+            'request duration: %s %.03f sec%s',
+            name, request_stats.duration,
+            ''.join(
+                ', %s %d in %.03f sec' % (op, count, duration)
+                for op, (count, duration)
+                in sorted(request_stats.operations.items())
+            ),
+            extra={'request_stats': request_stats.as_dict()},
+        )
 
         version = options.get('version', VERSION_WITHOUT_CAPABILITIES)
-        return self.marshal(result, error, _id, version)
+        return self.marshal_iter(result, error, _id, version)
 
     def simple_unmarshal(self, environ):
         name = environ['PATH_INFO'].strip('/')
@@ -429,10 +613,14 @@ class WSGIExecutioner(Executioner):
             status = HTTP_STATUS_SUCCESS
             response = self.wsgi_execute(environ)
             if self.headers:
-                headers = self.headers
+                headers = list(self.headers)
             else:
                 headers = [('Content-Type',
                             self.content_type + '; charset=utf-8')]
+            if isinstance(response, PreEncodedResponse):
+                status, response = response.respond(environ, status, headers)
+            else:
+                response = self.compress_response(environ, headers, response)
         except Exception:
             logger.exception('WSGI %s.__call__():', self.name)
             status = HTTP_STATUS_SERVER_ERROR
@@ -444,7 +632,44 @@ class WSGIExecutioner(Executioner):
             headers.append(('IPASESSION', logout_cookie))
 
         start_response(status, headers)
-        return [response]
+        if isinstance(response, bytes):
+            return [response]
+        return response
+
+    def compress_response(self, environ, headers, response):
+        """
+        Compress the response if the client accepts it and it is larger
+        than the ``rpc_compress_threshold`` option.
+
+        Only the first chunks up to the threshold are read to decide, the
+        rest of the response is compressed while it is sent.
+        """
+        threshold = int(self.api.env.rpc_compress_threshold)
+        if threshold <= 0:
+            return response
+        accepted = get_accepted_encodings(environ)
+        for encoding in ('gzip', 'deflate'):
+            if accepted.get(encoding, 0) > 0:
+                break
+        else:
+            return response
+
+        if isinstance(response, bytes):
+            response = [response]
+        chunks = iter(response)
+        head = []
+        size = 0
+        for chunk in chunks:
+            head.append(chunk)
+            size += len(chunk)
+            if size > threshold:
+                break
+        else:
+            return head
+
+        headers.append(('Content-Encoding', encoding))
+        headers.append(('Vary', 'Accept-Encoding'))
+        return compress_iter(_chain_iter(head, chunks), encoding)
 
     def unmarshal(self, data):
         raise NotImplementedError('%s.unmarshal()' % type(self).__name__)
@@ -453,6 +678,17 @@ class WSGIExecutioner(Executioner):
                 version=VERSION_WITHOUT_CAPABILITIES):
         raise NotImplementedError('%s.marshal()' % type(self).__name__)
 
+    def marshal_iter(self, result, error, _id=None,
+                     version=VERSION_WITHOUT_CAPABILITIES):
+        """
+        Marshal the response into an iterable of byte strings.
+
+        The iterable may be consumed after the request context has been
+        destroyed, so everything depending on the context must be evaluated
+        before returning.
+        """
+        return [self.marshal(result, error, _id, version)]
+
 
 class jsonserver(WSGIExecutioner, HTTP_Status):
     """
@@ -474,8 +710,7 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
         response = super(jsonserver, self).__call__(environ, start_response)
         return response
 
-    def marshal(self, result, error, _id=None,
-                version=VERSION_WITHOUT_CAPABILITIES):
+    def _get_response(self, result, error, _id):
         if error:
             assert isinstance(error, PublicError)
             error = dict(
@@ -485,18 +720,44 @@ class jsonserver(WSGIExecutioner, HTTP_Status):
                 name=unicode(error.__class__.__name__),
             )
         principal = getattr(context, 'principal', 'UNKNOWN')
-        response = dict(
+        return dict(
             result=result,
             error=error,
             id=_id,
             principal=unicode(principal),
             version=unicode(VERSION),
         )
+
+    def marshal(self, result, error, _id=None,
+                version=VERSION_WITHOUT_CAPABILITIES):
+        response = self._get_response(result, error, _id)
         dump = json_encode_binary(
             response, version, pretty_print=self.api.env.debug
         )
         return dump.encode('utf-8')
 
+    def marshal_iter(self, result, error, _id=None,
+                     version=VERSION_WITHOUT_CAPABILITIES):
+        if self.api.env.debug:
+            # pretty printing is only available in one piece
+            return [self.marshal(result, error, _id, version)]
+        # Encode large results (e.g. thousands of *_find entries) while
+        # they are sent instead of building the whole document up front.
+        # The values are converted before the response is started, so
+        # errors still result in a JSON-RPC error response.
+        response = self._get_response(result, error, _id)
+        try:
+            if isinstance(result, dict) and any(
+                    isinstance(v, PreEncodedJSON) for v in result.values()):
+                return PreEncodedResponse(json_encode_binary_iter(
+                    response, version, raw_values=True))
+            return json_encode_binary_iter(response, version)
+        except Exception as e:
+            logger.exception(
+                'non-public: %s: %s', e.__class__.__name__, str(e)
+            )
+            return [self.marshal(None, InternalError(), _id, version)]
+
     def unmarshal(self, data):
         try:
             d = json_decode_binary(data)
@@ -591,6 +852,26 @@ class NegotiateAuth(AuthBase):
         return response
 
 
+_loopback_session = None
+
+
+def get_loopback_session():
+    """
+    Return the HTTP session for requests of this process to the local httpd.
+
+    The session keeps the connections to httpd open between the requests.
+    It never stores cookies, as every request is made on behalf of another
+    user.
+    """
+    global _loopback_session
+    if _loopback_session is None:
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.verify = paths.IPA_CA_CRT
+        _loopback_session = session
+    return _loopback_session
+
+
 class KerberosSession(HTTP_Status):
     '''
     Functionally shared by all RPC handlers using both sessions and
@@ -623,12 +904,8 @@ class KerberosSession(HTTP_Status):
             return None
 
         # ... and use it to resolve the ccache name (Issue: 6972 )
-        gss_name = gssapi.Name(principal, gssapi.NameType.kerberos_principal)
-
         # Fail if Kerberos credentials are expired or missing
-        creds = get_credentials_if_valid(name=gss_name,
-                                         ccache_name=ccache_name)
-        if not creds:
+        if get_valid_principal(ccache_name, principal) is None:
             logger.debug(
                 'ccache expired or invalid, deleting session, need login')
             return None
@@ -644,9 +921,9 @@ class KerberosSession(HTTP_Status):
         # generate a cookie for us.
         try:
             target = self.api.env.host
-            r = requests.get('http://{0}/ipa/session/cookie'.format(target),
-                             auth=NegotiateAuth(target, ccache_name),
-                             verify=paths.IPA_CA_CRT)
+            r = get_loopback_session().get(
+                'http://{0}/ipa/session/cookie'.format(target),
+                auth=NegotiateAuth(target, ccache_name))
             session_cookie = r.cookies.get("ipa_session")
             if not session_cookie:
                 raise ValueError('No session cookie found')
@@ -1050,6 +1327,58 @@ class login_password(Backend, KerberosSession):
                                          message=unicode(e))
 
 
+class metrics(Backend, HTTP_Status):
+    """
+    Metrics of all IPA server processes in the Prometheus text format.
+    """
+
+    content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    key = '/metrics'
+
+    # minimum number of seconds between snapshots published after requests
+    publish_interval = 10
+
+    def _on_finalize(self):
+        super(metrics, self)._on_finalize()
+        self.spool = MetricsSpool(
+            os.path.join(paths.IPA_SERVER_CACHE_DIR, 'metrics'))
+        self.last_publish = 0
+        self.api.Backend.wsgi_dispatch.mount(self, self.key)
+        # the requests since the last snapshot are not lost at exit
+        atexit.register(self.publish, force=True)
+
+    def publish(self, force=False):
+        """
+        Share the metrics of this process with the other server processes.
+
+        Unless *force* is set, nothing is written if the last snapshot is
+        less than `publish_interval` seconds old.
+        """
+        now = time.time()
+        if not force and now - self.last_publish < self.publish_interval:
+            return
+        object.__setattr__(self, 'last_publish', now)
+        pool_stats = None
+        if 'ldap2' in self.api.Backend:
+            pool_stats = self.api.Backend.ldap2.get_pool_stats()
+        self.spool.publish(get_snapshot(pool_stats))
+
+    def __call__(self, environ, start_response):
+        logger.debug('WSGI metrics.__call__:')
+
+        if environ.get('REQUEST_METHOD', '').upper() != 'GET':
+            return self.bad_request(environ, start_response,
+                                    "HTTP request method must be GET")
+
+        self.publish(force=True)
+        snapshots, retired = self.spool.collect()
+        output = format_metrics(snapshots, retired)
+
+        start_response(HTTP_STATUS_SUCCESS,
+                       [('Content-Type', self.content_type)])
+        return [output.encode('utf-8')]
+
+
 class change_password(Backend, HTTP_Status):
 
     content_type = 'text/plain'
@@ -1283,8 +1612,7 @@ class xmlserver_session(xmlserver, KerberosSession):
             return self.need_login(start_response)
 
         # Redirect to /ipa/xml if Kerberos credentials are expired
-        creds = get_credentials_if_valid(ccache_name=ccache_name)
-        if not creds:
+        if get_valid_principal(ccache_name) is None:
             logger.debug('xmlserver_session.__call_: ccache expired, deleting '
                          'session, need login')
             # The request is finished with the ccache, destroy it.
@@ -0,0 +1,122 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the schema cache of `ipaclient.remote_plugins`.
+"""
+
+import copy
+import struct
+
+import pytest
+
+from ipaclient.remote_plugins import schema
+
+pytestmark = pytest.mark.tier0
+
+SCHEMA = dict(
+    fingerprint=u'f1234',
+    ttl=3600,
+    version=u'2.230',
+    commands=[
+        dict(full_name=u'ping/1', name=u'ping', topic_topic=u'ping/1',
+             doc=u'Ping a remote server.\n\nMore text.'),
+        dict(full_name=u'user_show/1', name=u'user_show',
+             topic_topic=u'user/1', doc=u'Display information.'),
+    ],
+    classes=[
+        dict(full_name=u'user/1', name=u'user'),
+    ],
+    topics=[
+        dict(full_name=u'ping/1', name=u'ping', doc=u'Ping the server.'),
+        dict(full_name=u'user/1', name=u'user', doc=u'Users'),
+    ],
+)
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.calls = []
+
+    def isconnected(self):
+        return True
+
+    def forward(self, name, **kwargs):
+        self.calls.append((name, kwargs))
+        return dict(result=copy.deepcopy(SCHEMA))
+
+
+@pytest.fixture
+def cache_dir(tmpdir, monkeypatch):
+    monkeypatch.setattr(schema.Schema, '_DIR', str(tmpdir))
+    return tmpdir
+
+
+@pytest.fixture
+def cache_file(cache_dir):
+    client = FakeClient()
+    s = schema.Schema(client)
+    assert s.fingerprint == u'f1234'
+    assert len(client.calls) == 1
+    return cache_dir.join(u'f1234')
+
+
+def check_schema(s):
+    assert s['commands'][u'ping/1'][u'name'] == u'ping'
+    assert s['classes'][u'user/1'][u'name'] == u'user'
+    assert sorted(s['topics']) == [u'ping/1', u'user/1']
+    assert s['commands'].get_help(u'ping/1') == dict(
+        name=u'ping', summary=u'Ping a remote server.',
+        topic_topic=u'ping/1')
+
+
+def test_round_trip(cache_file):
+    client = FakeClient()
+    s = schema.Schema(client, u'f1234')
+    check_schema(s)
+    # everything was read from the cache file
+    assert client.calls == []
+
+
+def test_bad_magic(cache_file):
+    data = cache_file.read_binary()
+    cache_file.write_binary(b'NOTSCHEM' + data[8:])
+
+    client = FakeClient()
+    s = schema.Schema(client, u'f1234')
+    assert len(client.calls) == 1
+    # the cache is ignored when fetching
+    assert u'known_fingerprints' not in client.calls[0][1]
+    check_schema(s)
+    # and written again
+    assert cache_file.read_binary() == data
+
+
+@pytest.mark.parametrize('size', [4, 20, -10])
+def test_truncated(cache_file, size):
+    data = cache_file.read_binary()
+    cache_file.write_binary(data[:size])
+
+    client = FakeClient()
+    s = schema.Schema(client, u'f1234')
+    assert len(client.calls) == 1
+    check_schema(s)
+    assert cache_file.read_binary() == data
+
+
+def test_corrupt_records(cache_file):
+    data = cache_file.read_binary()
+    # keep the header and the index, overwrite the records
+    index_len = struct.unpack('!I', data[8:12])[0]
+    base = 12 + index_len
+    cache_file.write_binary(data[:base] + b'\xff' * (len(data) - base))
+
+    client = FakeClient()
+    s = schema.Schema(client, u'f1234')
+    assert client.calls == []
+
+    # the schema is fetched again when a record fails to read
+    check_schema(s)
+    assert len(client.calls) == 1
+    assert cache_file.read_binary() == data
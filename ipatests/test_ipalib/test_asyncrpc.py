@@ -0,0 +1,260 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the `ipalib.asyncrpc` module.
+"""
+
+import asyncio
+import socket
+import threading
+
+import pytest
+
+from ipalib import asyncrpc, errors, rpc
+from ipalib.frontend import Command
+from ipalib.parameters import Int, Str
+from ipalib.request import context
+from ipatests.util import create_test_api
+
+pytestmark = pytest.mark.tier0
+
+PRINCIPAL = u'admin@EXAMPLE.TEST'
+KERBEROS_URL = 'https://ipa.example.test/ipa/json'
+SESSION_URL = 'https://ipa.example.test/ipa/session/json'
+
+
+class DummyEnv(object):
+    jsonrpc_uri = KERBEROS_URL
+    api_version = u'2.230'
+    tls_ca_cert = '/etc/ipa/ca.crt'
+    verbose = 0
+
+
+class DummyCookie(object):
+    def __init__(self, value):
+        self.value = value
+
+    def http_return_ok(self, url):
+        pass
+
+    def http_cookie(self):
+        return self.value
+
+
+class DummyRPCClient(object):
+    stored_cookie = None
+
+    def get_session_cookie_from_persistent_storage(self, principal):
+        assert principal == PRINCIPAL
+        if self.stored_cookie is None:
+            return None
+        return DummyCookie(self.stored_cookie)
+
+
+class DummyBackend(object):
+    def __init__(self):
+        self.rpcclient = DummyRPCClient()
+
+
+class DummyAPI(object):
+    def __init__(self):
+        self.env = DummyEnv()
+        self.Backend = DummyBackend()
+        self.Command = {}
+
+
+class FakeServer(object):
+    """
+    Server side of the fake `JSONServerProxy`.
+
+    Requests to the Kerberos URL receive the session cookie, requests to the
+    session URL need it.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cookie = u'ipa_session=1'
+        self.requests = []
+        self.running = 0
+        self.max_running = 0
+        self.deny = False
+        self.failures = {}
+
+    def request(self, proxy, name, args, options):
+        session_cookie = getattr(context, 'session_cookie', None)
+        with self.lock:
+            self.requests.append((proxy.url, session_cookie, name, args))
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        try:
+            if args and self.failures.get(args[0], 0):
+                self.failures[args[0]] -= 1
+                raise socket.error('connection reset')
+            if args and args[0] == u'missing':
+                raise errors.NotFound(reason=u'missing: user not found')
+            if self.deny or (proxy.url == SESSION_URL and
+                             session_cookie != self.cookie):
+                raise rpc.ProtocolError(
+                    proxy.url, 401, 'Unauthorized', {})
+            if proxy.url == KERBEROS_URL:
+                proxy.transport.store_session_cookie(self.cookie)
+            threading.Event().wait(0.01)
+            return dict(result=dict(args=list(args), options=options))
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+class FakeServerProxy(object):
+    server = None
+
+    def __init__(self, url, transport, encoding, verbose, allow_none):
+        self.url = url
+        self.transport = transport
+
+    def __getattr__(self, name):
+        def method(args, options):
+            return self.server.request(self, name, args, options)
+        return method
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    deleted = []
+    monkeypatch.setattr(FakeServerProxy, 'server', server)
+    monkeypatch.setattr(asyncrpc, 'JSONServerProxy', FakeServerProxy)
+    monkeypatch.setattr(
+        asyncrpc, 'get_principal', lambda ccache_name=None: PRINCIPAL)
+    monkeypatch.setattr(
+        asyncrpc, 'delete_persistent_client_session_data', deleted.append)
+    # the cookie is not written to the keyring
+    monkeypatch.setattr(
+        rpc.KerbTransport, 'store_session_cookie',
+        lambda self, cookie_header: cookie_header)
+    server.deleted = deleted
+    return server
+
+
+def run(client, coro):
+    loop = asyncio.new_event_loop()
+    client.loop = loop
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        client.close()
+        loop.close()
+
+
+def test_session_cookie_shared(server):
+    client = asyncrpc.AsyncClient(DummyAPI(), max_connections=2)
+
+    async def main():
+        await client.Command.user_show(u'admin')
+        return await asyncio.gather(*(
+            client.Command['user_show'](u'user%d' % i) for i in range(6)))
+
+    results = run(client, main())
+    assert [r['result']['args'] for r in results] == [
+        [u'user%d' % i] for i in range(6)]
+
+    # the first request is authenticated with Kerberos
+    assert server.requests[0] == (
+        KERBEROS_URL, None, 'user_show', [u'admin'])
+    # the other workers and the first one use the session cookie
+    assert sorted(server.requests[1:]) == [
+        (SESSION_URL, u'ipa_session=1', 'user_show', [u'user%d' % i])
+        for i in range(6)
+    ]
+    # concurrency is limited by the number of connections
+    assert server.max_running <= 2
+    assert server.deleted == []
+
+
+def test_stored_session_expired(server):
+    api = DummyAPI()
+    api.Backend.rpcclient.stored_cookie = u'ipa_session=old'
+    client = asyncrpc.AsyncClient(api, max_connections=1)
+
+    async def main():
+        await client.Command.user_show(u'user1')
+        await client.Command.user_show(u'user2')
+
+    run(client, main())
+    assert server.requests == [
+        (SESSION_URL, u'ipa_session=old', 'user_show', [u'user1']),
+        # the expired session is removed and Kerberos used once more
+        (KERBEROS_URL, None, 'user_show', [u'user1']),
+        (SESSION_URL, u'ipa_session=1', 'user_show', [u'user2']),
+    ]
+    assert server.deleted == [PRINCIPAL]
+
+
+def test_stored_session_valid(server):
+    api = DummyAPI()
+    api.Backend.rpcclient.stored_cookie = u'ipa_session=1'
+    client = asyncrpc.AsyncClient(api, max_connections=1)
+
+    run(client, client.Command.user_show(u'user1'))
+    assert server.requests == [
+        (SESSION_URL, u'ipa_session=1', 'user_show', [u'user1']),
+    ]
+
+
+def test_auth_error_not_retried(server):
+    server.deny = True
+    client = asyncrpc.AsyncClient(DummyAPI(), retries=2, retry_delay=0)
+
+    with pytest.raises(errors.NetworkError):
+        run(client, client.Command.user_show(u'user1'))
+    assert server.requests == [
+        (KERBEROS_URL, None, 'user_show', [u'user1']),
+    ]
+
+
+def test_network_error_retried(server):
+    server.failures = {u'flaky': 1, u'down': 3}
+    client = asyncrpc.AsyncClient(DummyAPI(), retries=2, retry_delay=0)
+
+    async def main():
+        result = await client.Command.user_show(u'flaky', all=True)
+        assert result['result'] == dict(
+            args=[u'flaky'], options=dict(all=True, version=u'2.230'))
+
+        with pytest.raises(errors.NotFound):
+            await client.Command.user_show(u'missing')
+        with pytest.raises(errors.NetworkError):
+            await client.Command.user_show(u'down')
+
+    run(client, main())
+    args = [r[3] for r in server.requests]
+    assert args.count([u'flaky']) == 2
+    assert args.count([u'missing']) == 1
+    # failed command tried retries + 1 times
+    assert args.count([u'down']) == 3
+
+
+def test_params():
+    api, _home = create_test_api()
+
+    class user_show(Command):
+        takes_args = (Str('uid', normalizer=lambda value: value.lower()),)
+        takes_options = (Int('sizelimit?'),)
+
+    api.add_plugin(user_show)
+    api.finalize()
+    client = asyncrpc.AsyncClient(api)
+    params = client._params  # pylint: disable=protected-access
+
+    # known commands are converted like by api.Command
+    assert params('user_show', (u'ADMIN',), dict(sizelimit=u'5')) == (
+        'user_show/1', (u'admin',),
+        dict(sizelimit=5, version=user_show.api_version))
+    with pytest.raises(errors.ConversionError):
+        params('user_show', (u'admin',), dict(sizelimit=u'five'))
+
+    # other commands are forwarded as they are
+    assert params('user_find', (u'ADMIN',), dict(sizelimit=u'5')) == (
+        'user_find', (u'ADMIN',),
+        dict(sizelimit=u'5', version=api.env.api_version))
@@ -21,8 +21,10 @@
 Test the `ipalib.cli` module.
 """
 
-from ipatests.util import raises, ClassChecker
-from ipalib import cli, plugable
+from ipatests.util import raises, ClassChecker, create_test_api
+from ipalib import cli, errors, output, plugable
+from ipalib.frontend import Command
+from ipalib.parameters import Any, Int, Str
 
 import pytest
 
@@ -118,3 +120,125 @@ from_default_conf = set in default.conf
 # Make sure cli.conf is loaded first:
 from_cli_conf = overridden in default.conf
 """
+
+
+class test_batch_file:
+    """
+    Test the `ipalib.cli.batch_file` command.
+    """
+
+    def setup_method(self, method):
+        # pylint: disable=attribute-defined-outside-init
+        api, self.home = create_test_api(in_server=True)
+        self.requests = []
+        requests = self.requests
+
+        class echo(Command):
+            takes_args = (Str('name'),)
+            takes_options = (Int('count?'),)
+
+        class batch(Command):
+            takes_args = (Any('methods*'),)
+            has_output = (
+                output.Output('count', int),
+                output.Output('results', (list, tuple)),
+            )
+
+            def execute(self, *methods, **options):
+                requests.append(methods)
+                results = []
+                for method in methods:
+                    name = method['params'][0][0]
+                    if name == u'bad':
+                        results.append(dict(error=u'%s: failed' % name))
+                    else:
+                        results.append(dict(result=name, error=None))
+                return dict(count=len(results), results=results)
+
+        for plugin in (cli.cli, cli.textui, cli.batch_file, echo, batch):
+            api.add_plugin(plugin)
+        api.finalize()
+        self.api = api
+        self.cmd = api.Command.batch_file
+        self.printed = []
+
+    def run(self, tmpdir, lines, monkeypatch, **options):
+        printed = self.printed
+
+        def print_result(self, cmd, params, result):
+            printed.append(result['result'])
+
+        def print_error(self, lineno, error):
+            printed.append((lineno, str(error)))
+
+        monkeypatch.setattr(cli.batch_file, '_print_result', print_result)
+        monkeypatch.setattr(cli.batch_file, '_print_error', print_error)
+        filename = tmpdir.join('commands')
+        filename.write('\n'.join(lines) + '\n')
+        self.cmd.run(str(filename), **options)
+
+    def test_parse_line(self):
+        f = self.cmd._parse_line  # pylint: disable=protected-access
+        echo = self.api.Command.echo
+        assert f(u'echo a --count 2') == (echo, dict(name=u'a', count=2))
+        assert f(u'["echo", "a", "--count=2"]') == (
+            echo, dict(name=u'a', count=2))
+        # the params are converted as well
+        assert f(u'{"method": "echo", "params": [["a"], {"count": "2"}]}') == (
+            echo, dict(name=u'a', count=2))
+
+        for line in (
+                u'[]',
+                u'{"method": "echo"}',
+                u'{"method": "echo", "params": [["a"], 1]}',
+                u'{"method": "echo", "params": [["a"], []]}',
+                u'{"method": "echo", "params": [1, {}]}',
+                u'{"method": "echo", "params": [["a"], {"count": "x"}]}',
+                u'echo a --count x',
+                u'nope a'):
+            raises(errors.PublicError, f, line)
+        raises(ValueError, f, u'{"method"')
+        raises(ValueError, f, u'echo "a')
+
+    def test_run(self, tmpdir, monkeypatch):
+        lines = [
+            u'# comment',
+            u'echo one',
+            u'',
+            u'echo two',
+            u'[]',
+            u'echo bad',
+            u'echo three --count 3',
+            u'{"method": "echo", "params": [["four"], []]}',
+            u'echo five',
+        ]
+        with pytest.raises(SystemExit) as e:
+            self.run(tmpdir, lines, monkeypatch, batch_size=2)
+        assert e.value.code == 1
+
+        # chunks of --size commands, invalid lines are not sent
+        assert [[m['params'][0][0] for m in r] for r in self.requests] == [
+            [u'one', u'two'], [u'bad', u'three'], [u'five']]
+        assert self.requests[1][1]['params'][1]['count'] == 3
+        # results and errors in input order
+        assert self.printed == [
+            u'one', u'two',
+            (5, u'invalid \'line\': no command given'),
+            (6, u'bad: failed'), u'three',
+            (8, u'invalid \'params\': must contain a tuple (list, dict)'),
+            u'five',
+        ]
+
+    def test_run_order(self, tmpdir, monkeypatch):
+        # errors of invalid lines are printed between the results
+        with pytest.raises(SystemExit) as e:
+            self.run(tmpdir, [u'echo one', u'[]', u'echo two'], monkeypatch)
+        assert e.value.code == 1
+        assert len(self.requests) == 1
+        assert self.printed == [
+            u'one', (2, u'invalid \'line\': no command given'), u'two']
+
+    def test_run_success(self, tmpdir, monkeypatch):
+        self.run(tmpdir, [u'echo one', u'echo two'], monkeypatch)
+        assert len(self.requests) == 1
+        assert self.printed == [u'one', u'two']
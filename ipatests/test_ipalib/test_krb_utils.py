@@ -0,0 +1,162 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the `ipalib.krb_utils` module.
+"""
+
+import os
+
+import pytest
+
+from ipalib import krb_utils
+
+pytestmark = pytest.mark.tier0
+
+PRINCIPAL = u'admin@EXAMPLE.TEST'
+LIFETIME = 3600
+
+
+class FakeCredentials(object):
+    def __init__(self, name, lifetime):
+        self.name = name
+        self.lifetime = lifetime
+
+
+class FakeTime(object):
+    def __init__(self):
+        self.now = 1000000000.0
+
+    def time(self):
+        return self.now
+
+
+class FakeKerberos(object):
+    """
+    Replacement of `get_credentials_if_valid` recording its calls.
+    """
+    def __init__(self):
+        self.calls = []
+        self.valid = True
+
+    def get_credentials_if_valid(self, name=None, ccache_name=None):
+        self.calls.append(ccache_name)
+        if not self.valid:
+            return None
+        if name is None:
+            name = PRINCIPAL
+        return FakeCredentials(name, LIFETIME)
+
+
+@pytest.fixture
+def kerberos(monkeypatch):
+    kerberos = FakeKerberos()
+    kerberos.clock = FakeTime()
+    monkeypatch.setattr(krb_utils, 'get_credentials_if_valid',
+                        kerberos.get_credentials_if_valid)
+    monkeypatch.setattr(krb_utils, 'time', kerberos.clock)
+    monkeypatch.setattr(krb_utils, '_valid_principals', {})
+    return kerberos
+
+
+def make_ccache(tmpdir, name='ccache'):
+    path = tmpdir.join(name)
+    path.write('credentials')
+    return 'FILE:%s' % path
+
+
+def test_cached_while_unchanged(kerberos, tmpdir):
+    ccache = make_ccache(tmpdir)
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+    assert krb_utils.get_valid_principal(ccache, PRINCIPAL) == PRINCIPAL
+    assert kerberos.calls == [ccache]
+
+    # the cached result is used as long as the ccache is not modified,
+    # even when the credentials were destroyed in some other way
+    kerberos.valid = False
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+    assert kerberos.calls == [ccache]
+
+
+def test_ccache_modified(kerberos, tmpdir):
+    ccache = make_ccache(tmpdir)
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+
+    path = ccache[len('FILE:'):]
+    with open(path, 'a') as f:
+        f.write('renewed')
+    st = os.stat(path)
+    os.utime(path, (st.st_atime, st.st_mtime + 1))
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+    assert kerberos.calls == [ccache, ccache]
+
+    # the credentials in the new ccache are no longer valid
+    with open(path, 'w') as f:
+        f.write('destroyed')
+    kerberos.valid = False
+    assert krb_utils.get_valid_principal(ccache) is None
+    assert krb_utils.get_valid_principal(ccache) is None
+    assert kerberos.calls == [ccache] * 4
+
+
+def test_expired(kerberos, tmpdir):
+    ccache = make_ccache(tmpdir)
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+
+    kerberos.clock.now += LIFETIME - 1
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+    assert kerberos.calls == [ccache]
+
+    kerberos.clock.now += 1
+    kerberos.valid = False
+    assert krb_utils.get_valid_principal(ccache) is None
+    assert kerberos.calls == [ccache, ccache]
+
+
+def test_other_principal(kerberos, tmpdir):
+    ccache = make_ccache(tmpdir)
+    assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+
+    kerberos.valid = False
+    assert krb_utils.get_valid_principal(
+        ccache, u'user@EXAMPLE.TEST') is None
+    assert kerberos.calls == [ccache, ccache]
+
+
+def test_not_file_ccache(kerberos, tmpdir):
+    missing = 'FILE:%s' % tmpdir.join('missing')
+    for ccache in ('MEMORY:ccache', 'KEYRING:persistent:0', missing):
+        assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+        assert krb_utils.get_valid_principal(ccache) == PRINCIPAL
+        assert kerberos.calls == [ccache, ccache]
+        del kerberos.calls[:]
+    assert krb_utils._valid_principals == {}
+
+
+def test_cache_size(kerberos, tmpdir, monkeypatch):
+    monkeypatch.setattr(krb_utils, 'VALID_PRINCIPALS_CACHE_SIZE', 3)
+    ccaches = [make_ccache(tmpdir, 'ccache%d' % i) for i in range(5)]
+
+    for ccache in ccaches[:3]:
+        krb_utils.get_valid_principal(ccache)
+    assert len(krb_utils._valid_principals) == 3
+
+    # a full cache without expired entries is emptied
+    krb_utils.get_valid_principal(ccaches[3])
+    assert len(krb_utils._valid_principals) == 1
+    del kerberos.calls[:]
+    krb_utils.get_valid_principal(ccaches[0])
+    krb_utils.get_valid_principal(ccaches[3])
+    assert kerberos.calls == [ccaches[0]]
+
+    # otherwise only the expired entries are removed
+    kerberos.clock.now += LIFETIME
+    krb_utils.get_valid_principal(ccaches[1])
+    assert len(krb_utils._valid_principals) == 3
+    krb_utils.get_valid_principal(ccaches[4])
+    assert len(krb_utils._valid_principals) == 2
+    del kerberos.calls[:]
+    krb_utils.get_valid_principal(ccaches[1])
+    assert kerberos.calls == []
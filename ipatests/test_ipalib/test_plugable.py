@@ -26,6 +26,7 @@ Test the `ipalib.plugable` module.
 
 import os
 import textwrap
+import types
 
 from ipalib import plugable, errors, create_api
 from ipatests.util import raises, read_only
@@ -160,6 +161,46 @@ def test_Registry():
     r()(plugin2b)
 
 
+def test_PluginModuleCache(tmpdir):
+    """
+    Test the `ipalib.plugable.PluginModuleCache` class.
+    """
+    def make_package(name):
+        package_dir = tmpdir.mkdir(name)
+        package_dir.join('__init__.py').write('')
+        package_dir.join('mod1.py').write('')
+        package = types.ModuleType(name)
+        package.__file__ = str(package_dir.join('__init__.py'))
+        return package
+
+    cache_dir = str(tmpdir.mkdir('cache'))
+    package = make_package('plugins1')
+    cache = plugable.PluginModuleCache(cache_dir, [package])
+    assert cache.load() is None
+
+    modules = {'plugins1': ['mod1', 'mod2']}
+    cache.store(modules)
+    assert os.listdir(cache_dir) == [os.path.basename(cache.filename)]
+    cache = plugable.PluginModuleCache(cache_dir, [package])
+    assert cache.load() == modules
+
+    # other plugin packages use another file
+    other = plugable.PluginModuleCache(
+        cache_dir, [package, make_package('plugins2')])
+    assert other.filename != cache.filename
+    assert other.load() is None
+
+    # added and changed modules are found again
+    tmpdir.join('plugins1', 'mod3.py').write('')
+    cache = plugable.PluginModuleCache(cache_dir, [package])
+    assert cache.load() is None
+    cache.store(modules)
+    assert plugable.PluginModuleCache(cache_dir, [package]).load() == modules
+    mod1 = tmpdir.join('plugins1', 'mod1.py')
+    mod1.setmtime(mod1.mtime() - 10)
+    assert plugable.PluginModuleCache(cache_dir, [package]).load() is None
+
+
 class test_API(ClassChecker):
     """
     Test the `ipalib.plugable.API` class.
@@ -249,6 +290,50 @@ class test_API(ClassChecker):
         e = raises(Exception, api.finalize)
         assert str(e) == 'API.finalize() already called', str(e)
 
+    def test_finalize_on_demand(self):
+        """
+        Test `ipalib.plugable.API.finalize` with plugins finalized on demand.
+        """
+        finalized = []
+
+        class base0(plugable.Plugin):
+            value = plugable.Plugin.finalize_attr('value')
+
+            def _on_finalize(self):
+                finalized.append(self.name)
+                self.value = self.name.upper()
+                super(base0, self)._on_finalize()
+
+        class API(plugable.API):
+            bases = (base0,)
+            modules = ()
+
+        api = API()
+        api.env.mode = 'unit_test'
+        api.env.in_tree = True
+        api.env.plugins_on_demand = True
+
+        class plugin0(base0):
+            pass
+        api.add_plugin(plugin0)
+
+        class plugin1(base0):
+            pass
+        api.add_plugin(plugin1)
+
+        api.finalize()
+        assert finalized == []
+        assert list(api.base0) == [plugin0, plugin1]
+        assert finalized == []
+
+        inst = api.base0.plugin1
+        assert inst is api.base0['plugin1']
+        assert finalized == []
+        assert inst.value == 'PLUGIN1'
+        assert finalized == ['plugin1']
+        assert api.base0.plugin1.value == 'PLUGIN1'
+        assert finalized == ['plugin1']
+
     def test_bootstrap(self):
         """
         Test the `ipalib.plugable.API.bootstrap` method.
@@ -22,6 +22,9 @@ Test the `ipalib.rpc` module.
 """
 from __future__ import print_function
 
+import json
+import socket
+import time
 import unittest
 
 import pytest
@@ -104,6 +107,116 @@ def test_round_trip():
     assert round_trip(compound) == tuple(compound)
 
 
+def test_json_encode_binary_iter():
+    """
+    Test `ipalib.rpc.json_encode_binary_iter` function.
+    """
+    f = rpc.json_encode_binary_iter
+    value = dict(
+        result=dict(
+            result=[
+                dict(uid=(u'user%d' % i,), data=binary_bytes, n=i)
+                for i in range(100)
+            ],
+            count=100,
+            truncated=False,
+            messages=(),
+        ),
+        error=None,
+        id=0,
+        principal=unicode_str,
+    )
+    expected = rpc.json_encode_binary(value, API_VERSION)
+    for chunk_size in (1, 1000, 65536):
+        chunks = list(f(value, API_VERSION, chunk_size=chunk_size))
+        assert all(type(c) is bytes for c in chunks)
+        assert b''.join(chunks).decode('utf-8') == expected
+    assert len(list(f(value, API_VERSION, chunk_size=1000))) > 1
+    assert b''.join(f({1: u'a'}, API_VERSION)) == b'{"1": "a"}'
+    assert b''.join(f([], API_VERSION)) == b'[]'
+
+    # values are converted up front, errors are not raised while streaming
+    value = dict(result=[dict(uid=[u'user']), object()])
+    with pytest.raises(TypeError):
+        f(value, API_VERSION)
+
+
+def test_server_ranking(tmpdir):
+    """
+    Test `ipalib.rpc.ServerRanking` class.
+    """
+    listening = socket.socket()
+    listening.bind(('127.0.0.1', 0))
+    listening.listen(5)
+    closed = socket.socket()
+    closed.bind(('127.0.0.1', 0))
+    try:
+        live = '127.0.0.1:%d' % listening.getsockname()[1]
+        down = '127.0.0.1:%d' % closed.getsockname()[1]
+        live_url = 'https://%s/ipa/json' % live
+        down_url = 'https://%s/ipa/json' % down
+
+        ranking = rpc.ServerRanking(str(tmpdir.join('servers.json')))
+        # unknown servers keep their order, they are probed in background
+        assert ranking.rank([down_url, live_url]) == [down_url, live_url]
+        ranking.refresh_thread.join()
+        results = ranking._load()  # pylint: disable=protected-access
+        assert sorted(results) == sorted([live, down])
+        assert results[live]['rtt'] is not None
+        assert results[down]['rtt'] is None
+        assert tmpdir.listdir() == [tmpdir.join('servers.json')]
+
+        # the configured server is down, stored results are used
+        listening.close()
+        ranking = rpc.ServerRanking(str(tmpdir.join('servers.json')))
+        assert ranking.rank([down_url, live_url]) == [live_url, down_url]
+        assert ranking.refresh_thread is None
+    finally:
+        listening.close()
+        closed.close()
+
+
+def test_server_ranking_priority(tmpdir):
+    """
+    Test that `ipalib.rpc.ServerRanking` keeps the SRV priority order.
+    """
+    filename = tmpdir.join('servers.json')
+    now = time.time()
+    filename.write(json.dumps({
+        'conf:443': dict(rtt=0.5, time=now),
+        'a:443': dict(rtt=0.1, time=now),
+        'b:443': dict(rtt=0.01, time=now),
+        'c:443': dict(rtt=0.001, time=now),
+        'd:443': dict(rtt=None, time=now),
+    }))
+    urls = ['https://%s/ipa/json' % name
+            for name in ('conf', 'a', 'b', 'c', 'd', 'e')]
+    ranking = rpc.ServerRanking(str(filename))
+    ranking.probe = lambda urls: None
+    ranked = ranking.rank(urls, [0, 0, 10, 10, 0, 0])
+    assert [urllib.parse.urlparse(url).hostname for url in ranked] == [
+        'conf', 'a', 'e', 'c', 'b', 'd']
+    # e has no results
+    ranking.refresh_thread.join()
+
+
+@pytest.mark.parametrize('data', [
+    '[]',
+    '{"a:443": []}',
+    '{"a:443": {"rtt": 0.1}}',
+    '{"a:443": {"rtt": "fast", "time": 1}}',
+    '{"a:443": {"rtt": null, "time": "now"}}',
+])
+def test_server_ranking_invalid(tmpdir, data):
+    filename = tmpdir.join('servers.json')
+    filename.write(data)
+    ranking = rpc.ServerRanking(str(filename))
+    ranking.probe = lambda urls: None
+    urls = ['https://conf/ipa/json', 'https://a/ipa/json']
+    assert ranking.rank(urls) == urls
+    ranking.refresh_thread.join()
+
+
 def test_xml_wrap():
     """
     Test the `ipalib.rpc.xml_wrap` function.
@@ -0,0 +1,51 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the `ipalib.stats` module.
+"""
+
+import pytest
+
+from ipalib import stats
+
+pytestmark = pytest.mark.tier0
+
+
+def test_request_stats():
+    with stats.timed('ldap.search'):
+        pass
+    assert stats.get_request_stats() is None
+    assert stats.finish_request('user_show') is None
+
+    before = stats.get_totals()
+    request_stats = stats.start_request()
+    assert stats.get_request_stats() is request_stats
+    with stats.timed('ldap.search'):
+        pass
+    with stats.timed('ldap.search'):
+        pass
+    request_stats.add('ldap.search', 0.5, count=0)
+    with pytest.raises(ValueError):
+        with stats.timed('dogtag'):
+            raise ValueError()
+
+    assert stats.finish_request('user_show') is request_stats
+    assert stats.get_request_stats() is None
+    assert request_stats.name == 'user_show'
+    assert request_stats.duration >= 0
+
+    result = request_stats.as_dict()
+    assert result['command'] == 'user_show'
+    assert result['operations']['ldap.search']['count'] == 2
+    assert result['operations']['ldap.search']['duration'] >= 0.5
+    assert result['operations']['dogtag']['count'] == 1
+
+    after = stats.get_totals()
+    count, _duration, buckets = before['commands'].get(
+        'user_show', (0, 0.0, (0,) * (len(stats.DURATION_BUCKETS) + 1)))
+    assert after['commands']['user_show'][0] == count + 1
+    assert sum(after['commands']['user_show'][2]) == sum(buckets) + 1
+    count, _duration = before['operations'].get('ldap.search', (0, 0.0))
+    assert after['operations']['ldap.search'][0] == count + 2
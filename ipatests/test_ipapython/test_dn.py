@@ -1187,6 +1187,45 @@ class TestDN(unittest.TestCase):
         self.assertFalse(dn3_a in s)
         self.assertFalse(dn3_b in s)
 
+    def test_parse_cache(self):
+        # DNs parsed from the same string share the parsed RDNs, make sure
+        # derived DNs do not see stale normalized strings or keys
+        dn1 = DN('CN=Foo,cn=Bar')
+        dn2 = DN('CN=Foo,cn=Bar')
+        self.assertEqual(str(dn1), 'CN=Foo,cn=Bar')
+        self.assertEqual(str(dn2), 'CN=Foo,cn=Bar')
+        self.assertEqual(str(dn1[1:]), 'cn=Bar')
+        self.assertEqual(str(DN(dn1)), 'CN=Foo,cn=Bar')
+        self.assertEqual(str(DN(dn1, 'dc=test')), 'CN=Foo,cn=Bar,dc=test')
+        self.assertEqual(str(DN(('uid', 'x'), dn1)), 'uid=x,CN=Foo,cn=Bar')
+
+        dn3 = DN('cn=foo,CN=BAR')
+        self.assertEqual(dn1, dn3)
+        self.assertEqual(hash(dn1), hash(dn3))
+        self.assertTrue(DN('cn=x', dn3).endswith(dn1))
+        self.assertTrue(DN(dn3, 'cn=x').startswith(dn1))
+        self.assertFalse(DN('cn=x', dn3).endswith(DN('cn=foo')))
+        self.assertLess(DN('cn=a,cn=bar'), dn1)
+
+        # parsing errors are not cached
+        for _i in range(2):
+            with self.assertRaises(ValueError):
+                DN('cn')
+
+        # DNs are immutable, there is nothing which could make the cached
+        # string or key stale
+        with self.assertRaises(TypeError):
+            dn1[0] = RDN(('cn', 'x'))
+        with self.assertRaises(TypeError):
+            dn1[0:1] = [RDN(('cn', 'x'))]
+        dn4 = dn1
+        dn4 += DN('dc=test')
+        self.assertIsNot(dn4, dn1)
+        self.assertEqual(str(dn1), 'CN=Foo,cn=Bar')
+        self.assertEqual(str(dn4), 'CN=Foo,cn=Bar,dc=test')
+        self.assertEqual(dn1, dn3)
+        self.assertNotEqual(dn4, dn3)
+
     def test_x500_text(self):
         # null DN x500 ordering and LDAP ordering are the same
         nulldn = DN()
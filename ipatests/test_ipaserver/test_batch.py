@@ -0,0 +1,139 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the concurrent execution of the `batch` command.
+"""
+
+import threading
+
+import pytest
+
+from ipalib import errors
+from ipalib.backend import Connectible
+from ipalib.frontend import Command
+from ipalib.parameters import Str
+from ipalib.request import context
+from ipaserver.plugins import batch as batch_module
+from ipatests.util import create_test_api
+
+pytestmark = pytest.mark.tier0
+
+PRINCIPAL = u'admin@EXAMPLE.TEST'
+
+
+class BatchAPI(object):
+    """
+    Server API with a fake LDAP backend and commands recording the thread
+    they are executed in.
+    """
+
+    def __init__(self, monkeypatch):
+        api, self.home = create_test_api(in_server=True,
+                                         batch_max_workers=4)
+        self.executed = []
+        self.connected = []
+        self.connect_error = None
+        self.barrier = threading.Barrier(2, timeout=10)
+        test = self
+
+        class ldap2(Connectible):
+            def create_connection(self, ccache=None, **kw):
+                test.connected.append(threading.current_thread())
+                if test.connect_error is not None:
+                    raise test.connect_error
+                context.principal = PRINCIPAL
+                return object()
+
+            def destroy_connection(self):
+                pass
+
+        class user_show(Command):
+            takes_args = (Str('uid'),)
+
+            def execute(self, uid, **options):
+                test.executed.append((uid, threading.current_thread()))
+                if uid.startswith(u'wait'):
+                    # passes only when two methods run at the same time
+                    test.barrier.wait()
+                if uid == u'missing':
+                    raise errors.NotFound(reason=u'%s: user not found' % uid)
+                return dict(result=uid)
+
+        class user_mod(user_show):
+            pass
+
+        for plugin in (batch_module.batch, ldap2, user_show, user_mod):
+            api.add_plugin(plugin)
+        api.finalize()
+
+        monkeypatch.setattr(batch_module, 'api', api)
+        monkeypatch.setattr(
+            batch_module.batch, '_is_read_only',
+            lambda self, arg: arg.get('method') == u'user_show')
+        self.api = api
+
+    def threads(self):
+        return set(thread for _uid, thread in self.executed)
+
+
+@pytest.fixture
+def batch_api(monkeypatch):
+    context.principal = PRINCIPAL
+    try:
+        yield BatchAPI(monkeypatch)
+    finally:
+        context.__dict__.clear()
+
+
+def method(name, uid):
+    return dict(method=name, params=[[uid], {}])
+
+
+def test_concurrent(batch_api):
+    uids = [u'wait1', u'user1', u'missing', u'wait2', u'user2', u'user3']
+    result = batch_api.api.Command.batch(
+        *[method(u'user_show', uid) for uid in uids])
+
+    assert result['count'] == len(uids)
+    results = result['results']
+    # results are in the order of the methods
+    assert [r.get('result') for r in results] == [
+        u'wait1', u'user1', None, u'wait2', u'user2', u'user3']
+    # errors stay with their own method
+    assert [r['error'] is None for r in results] == [
+        True, True, False, True, True, True]
+    assert results[2]['error_name'] == u'NotFound'
+    assert results[2]['error'] == u'missing: user not found'
+
+    assert threading.current_thread() not in batch_api.threads()
+    assert len(batch_api.connected) == 4
+
+
+def test_not_read_only(batch_api):
+    uids = [u'user1', u'user2', u'user3']
+    result = batch_api.api.Command.batch(
+        method(u'user_show', u'user1'),
+        method(u'user_mod', u'user2'),
+        method(u'user_show', u'user3'))
+
+    assert [r['result'] for r in result['results']] == uids
+    # methods which may write are executed in the request thread
+    assert batch_api.threads() == {threading.current_thread()}
+    assert batch_api.connected == []
+
+
+def test_connect_failure(batch_api):
+    batch_api.connect_error = errors.NetworkError(
+        uri='ldapi://test', error=u'server down')
+    uids = [u'user1', u'missing', u'user2']
+    result = batch_api.api.Command.batch(
+        *[method(u'user_show', uid) for uid in uids])
+
+    results = result['results']
+    assert [r.get('result') for r in results] == [u'user1', None, u'user2']
+    assert results[1]['error_name'] == u'NotFound'
+    # the request thread executed the methods left over by the workers
+    assert len(batch_api.connected) == 3
+    assert batch_api.threads() == {threading.current_thread()}
@@ -47,7 +47,8 @@ class test_i18n_messages(XMLRPC_test, Unauthorized_HTTP_test):
         """
         Build translations directly via command instance
         """
-        return i18n_messages({}).execute()
+        result = i18n_messages({}).execute()
+        return dict(texts=result['texts'].value)
 
     def _fetch_i18n_msgs_http(self, accept_lang):
         """
@@ -28,16 +28,23 @@
 from __future__ import absolute_import
 
 import os
+import re
 import sys
 import unittest
 
+import ldap
+from ldap.controls.vlv import VLVResponseControl
 import pytest
 import six
 
 from ipaplatform.paths import paths
-from ipaserver.plugins.ldap2 import ldap2, AUTOBIND_DISABLED
+from ipaserver.plugins import ldap2 as ldap2_module
+from ipaserver.plugins.ldap2 import (ldap2, AUTOBIND_DISABLED,
+                                     LDAPConnectionPool, IPAConfigCache)
 from ipalib import api, create_api, errors
+from ipalib.request import context, Connection
 from ipapython.dn import DN
+from ipapython.ipaldap import LDAPClient, SchemaCache
 
 if six.PY3:
     unicode = str
@@ -317,3 +324,524 @@ class test_LDAPEntry:
 
         e.raw['test'].append(b'second')
         assert e['test'] == ['not list', u'second']
+
+
+@pytest.mark.tier0
+class test_LDAPEntry_result:
+    """
+    Test creating LDAPEntry objects from search results
+    """
+    dn = 'cn=test1,cn=test'
+
+    def setup(self):
+        self.conn = LDAPClient('ldap://test', no_schema=True)
+
+    def get_entry(self, read_only):
+        result = [
+            (None, ['ldap://referral']),
+            (self.dn, {'cn': [b'test1'], 'description': [b'a', b'b']}),
+        ]
+        entries = self.conn._convert_result(result, read_only=read_only)
+        assert len(entries) == 1
+        return entries[0]
+
+    def test_entry(self):
+        e = self.get_entry(read_only=False)
+        assert e.dn == DN(self.dn)
+        assert e['cn'] == [u'test1']
+        assert e.raw['description'] == [b'a', b'b']
+        assert e.generate_modlist() == []
+
+        e['description'].append(u'c')
+        e.raw['cn'].append(b'test2')
+        assert sorted(e.generate_modlist()) == [
+            (ldap.MOD_ADD, 'cn', [b'test2']),
+            (ldap.MOD_ADD, 'description', [b'c']),
+        ]
+
+    def test_read_only(self):
+        e = self.get_entry(read_only=True)
+        assert e['cn'] == [u'test1']
+        e['description'] = [u'c']
+        assert e.raw['description'] == [b'c']
+        with pytest.raises(ValueError):
+            e.generate_modlist()
+        with pytest.raises(ValueError):
+            e.copy().generate_modlist()
+
+        e.reset_modlist()
+        e['cn'] = [u'test2']
+        assert e.generate_modlist() == [
+            (ldap.MOD_ADD, 'cn', [b'test2']),
+            (ldap.MOD_DELETE, 'cn', [b'test1']),
+        ]
+
+
+class FakeVLVConnection:
+    """
+    Connection returning a page of 100 sorted entries.
+    """
+    def __init__(self, total=100):
+        self.total = total
+        self.controls = None
+
+    def search_ext(self, base, scope, filter, attrs_list, serverctrls,
+                   timeout):
+        self.controls = serverctrls
+        return 1
+
+    def result3(self, msgid, all, timeout):
+        sss, vlv = self.controls
+        first = min(vlv.offset, self.total)
+        last = min(first + vlv.after_count, self.total)
+        res_list = [
+            ('cn=test%03d,cn=test' % i, {'cn': [b'test%03d' % i]})
+            for i in range(first, last + 1)
+        ]
+        ctrl = VLVResponseControl()
+        ctrl.content_count = self.total
+        ctrl.result = 0
+        return ldap.RES_SEARCH_RESULT, res_list, msgid, [ctrl]
+
+
+@pytest.mark.tier0
+def test_find_entries_page():
+    conn = LDAPClient('ldap://test', no_schema=True)
+    conn._conn = FakeVLVConnection()
+
+    entries, total = conn.find_entries_page(
+        attrs_list=['cn'], base_dn=DN('cn=test'), sort_attr='cn',
+        offset=10, page_size=5)
+    sss, vlv = conn.conn.controls
+    assert sss.ordering_rules == ['cn']
+    assert (vlv.offset, vlv.before_count, vlv.after_count) == (11, 0, 4)
+    assert total == 100
+    assert [e['cn'][0] for e in entries] == [
+        u'test011', u'test012', u'test013', u'test014', u'test015']
+
+    # past the end of the result set
+    entries, total = conn.find_entries_page(
+        base_dn=DN('cn=test'), sort_attr='cn', offset=100, page_size=5)
+    assert (entries, total) == ([], 100)
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.unbound = False
+
+    def whoami_s(self):
+        if not self.alive:
+            raise ldap.SERVER_DOWN({'desc': 'Can\'t contact LDAP server'})
+        return 'dn: uid=admin'
+
+    def unbind_s(self):
+        self.unbound = True
+
+
+@pytest.mark.tier0
+class test_LDAPConnectionPool:
+    """
+    Test the per-process connection pool of the ldap2 backend.
+    """
+
+    key = ('ldapi://test', 'admin@EXAMPLE.TEST')
+
+    def test_reuse(self):
+        pool = LDAPConnectionPool()
+        assert pool.acquire(self.key) is None
+
+        conn = FakeConnection()
+        pool.register(self.key, conn)
+        assert pool.release(conn)
+        assert pool.stats()['idle'] == 1
+
+        assert pool.acquire(self.key) is conn
+        stats = pool.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['in_use'] == 1
+
+    def test_checked_out(self):
+        # a connection is used by one thread (e.g. batch worker) at a time
+        pool = LDAPConnectionPool()
+        conn = FakeConnection()
+        pool.register(self.key, conn)
+        pool.release(conn)
+
+        assert pool.acquire(self.key) is conn
+        assert pool.acquire(self.key) is None
+        pool.release(conn)
+        assert pool.acquire(self.key) is conn
+
+    def test_other_principal(self):
+        pool = LDAPConnectionPool()
+        conn = FakeConnection()
+        pool.register(self.key, conn)
+        pool.release(conn)
+
+        assert pool.acquire(('ldapi://test', 'user@EXAMPLE.TEST')) is None
+        assert not conn.unbound
+
+    def test_unmanaged(self):
+        pool = LDAPConnectionPool()
+        assert not pool.release(FakeConnection())
+
+    def test_max_size(self):
+        pool = LDAPConnectionPool(max_size=1)
+        first, second = FakeConnection(), FakeConnection()
+        pool.register(self.key, first)
+        pool.register(self.key, second)
+        pool.release(first)
+        pool.release(second)
+
+        assert first.unbound
+        assert pool.stats()['evicted'] == 1
+        assert pool.acquire(self.key) is second
+
+    def test_health_check(self):
+        pool = LDAPConnectionPool(check_interval=-1)
+        conn = FakeConnection(alive=False)
+        pool.register(self.key, conn)
+        pool.release(conn)
+
+        assert pool.acquire(self.key) is None
+        assert conn.unbound
+        assert pool.stats()['discarded'] == 1
+
+    def test_max_idle(self):
+        pool = LDAPConnectionPool(max_idle=-1)
+        conn = FakeConnection()
+        pool.register(self.key, conn)
+        pool.release(conn)
+
+        assert conn.unbound
+        assert pool.acquire(self.key) is None
+
+    def test_discard(self):
+        pool = LDAPConnectionPool()
+        conn = FakeConnection()
+        pool.register(self.key, conn)
+
+        assert pool.discard(conn)
+        assert conn.unbound
+        assert pool.stats()['discarded'] == 1
+        assert not pool.release(conn)
+        assert not pool.discard(FakeConnection())
+
+    def connect(self, backend, pool, conn):
+        pool.register(self.key, conn)
+        setattr(context, backend.id, Connection(conn, backend.disconnect))
+
+    def test_server_down(self, monkeypatch):
+        pool = LDAPConnectionPool()
+        monkeypatch.setattr(ldap2_module, 'get_connection_pool',
+                            lambda api: pool)
+        monkeypatch.setattr(ldap2_module.schema_cache, 'cache_dir',
+                            ldap2_module.schema_cache.cache_dir)
+        test_api = create_api(mode='unit_test')
+        test_api.env.context = 'server'
+        backend = ldap2(test_api)
+
+        # an idle connection of another request
+        idle = FakeConnection()
+        pool.register(self.key, idle)
+        pool.release(idle)
+
+        # errors of the request do not affect the connection
+        conn = FakeConnection()
+        self.connect(backend, pool, conn)
+        with pytest.raises(errors.NotFound):
+            with backend.error_handler():
+                raise ldap.NO_SUCH_OBJECT({'desc': 'No such object'})
+        backend.disconnect()
+        assert not conn.unbound
+        assert pool.stats()['idle'] == 2
+
+        # the server was restarted
+        conn = pool.acquire(self.key)
+        conn.alive = False
+        setattr(context, backend.id, Connection(conn, backend.disconnect))
+        with pytest.raises(errors.NetworkError):
+            with backend.error_handler():
+                backend.conn.whoami_s()
+        backend.disconnect()
+
+        assert conn.unbound
+        assert idle.unbound
+        stats = pool.stats()
+        assert stats['discarded'] == 1
+        assert stats['idle'] == stats['in_use'] == 0
+        assert pool.acquire(self.key) is None
+
+
+MEMBER_ATTRIBUTE_TABLE = {
+    'member': (('member',), '1.3.6.1.4.1.1466.115.121.1.12', False),
+}
+
+
+class FakeGroupConnection:
+    """
+    Connection with a few entries answering asynchronous searches and
+    modifications of their members.
+    """
+    def __init__(self, entries, reject=()):
+        self.entries = {DN(dn): attrs for dn, attrs in entries.items()}
+        # values the server refuses to add
+        self.reject = set(reject)
+        self.searches = []
+        self.modifications = []
+        self.results = {}
+
+    def _send(self, result):
+        msgid = len(self.results) + 1
+        self.results[msgid] = result
+        return msgid
+
+    def search_ext(self, base, scope, filter, attrlist=None,
+                   serverctrls=None, timeout=-1, sizelimit=0):
+        self.searches.append((base, scope, filter))
+        base = DN(base)
+        if scope == ldap.SCOPE_BASE:
+            if base not in self.entries:
+                return self._send(ldap.NO_SUCH_OBJECT(
+                    {'desc': 'No such object'}))
+            found = [base]
+        else:
+            rdns = set((a.lower(), v.lower()) for a, v in
+                       re.findall(r'\((\w+)=([^()]*)\)', filter))
+            found = [dn for dn in self.entries if dn[1:] == base and
+                     (dn[0].attr.lower(), dn[0].value.lower()) in rdns]
+        attrlist = [a.lower() for a in attrlist or []]
+        return self._send([
+            (str(dn), {k: list(v) for k, v in self.entries[dn].items()
+                       if v and k.lower() in attrlist})
+            for dn in found
+        ])
+
+    def modify_ext(self, dn, modlist):
+        self.modifications.append(
+            [(op, attr, len(values)) for op, attr, values in modlist])
+        entry = self.entries[DN(dn)]
+        for op, attr, values in modlist:
+            current = entry.setdefault(attr, [])
+            if op == ldap.MOD_ADD:
+                if self.reject.intersection(values):
+                    return self._send(ldap.UNWILLING_TO_PERFORM(
+                        {'desc': 'Server is unwilling to perform'}))
+                if set(current).intersection(values):
+                    return self._send(ldap.TYPE_OR_VALUE_EXISTS(
+                        {'desc': 'Type or value exists'}))
+            elif not set(values).issubset(current):
+                return self._send(ldap.NO_SUCH_ATTRIBUTE(
+                    {'desc': 'No such attribute'}))
+        for op, attr, values in modlist:
+            if op == ldap.MOD_ADD:
+                entry[attr].extend(values)
+            else:
+                entry[attr] = [v for v in entry[attr] if v not in values]
+        return self._send(None)
+
+    def result3(self, msgid, all=1, timeout=None):
+        result = self.results[msgid]
+        if isinstance(result, ldap.LDAPError):
+            raise result
+        if result is None:
+            return ldap.RES_MODIFY, [], msgid, []
+        if not all and result:
+            return ldap.RES_SEARCH_ENTRY, [result.pop(0)], msgid, []
+        self.results[msgid] = []
+        return ldap.RES_SEARCH_RESULT, result, msgid, []
+
+
+class GroupClient(LDAPClient):
+    """
+    LDAPClient with the bulk membership methods of ldap2.
+    """
+    _find_existing_entries = ldap2._find_existing_entries
+    _get_group_members = ldap2._get_group_members
+    _modify_group_members = ldap2._modify_group_members
+    add_entries_to_group = ldap2.add_entries_to_group
+    remove_entries_from_group = ldap2.remove_entries_from_group
+
+
+@pytest.mark.tier0
+class test_group_members:
+    """
+    Test the bulk membership changes of the ldap2 backend.
+    """
+
+    base_dn = DN('dc=example,dc=test')
+    users_dn = DN(('cn', 'users'), base_dn)
+    group_dn = DN(('cn', 'group1'), ('cn', 'groups'), base_dn)
+
+    def user_dn(self, i):
+        return DN(('uid', 'user%d' % i), self.users_dn)
+
+    def make_client(self, users, members=(), reject=()):
+        entries = {str(self.user_dn(i)): {} for i in users}
+        entries[str(self.group_dn)] = {
+            'member': [str(self.user_dn(i)).encode('utf-8')
+                       for i in members]
+        }
+        client = GroupClient('ldap://test')
+        client._conn = FakeGroupConnection(
+            entries,
+            reject=[str(self.user_dn(i)).encode('utf-8') for i in reject])
+        object.__setattr__(client, '_has_attribute_table', True)
+        object.__setattr__(client, '_attribute_table', MEMBER_ATTRIBUTE_TABLE)
+        return client
+
+    def members(self, client):
+        return client.conn.entries[self.group_dn]['member']
+
+    def test_add(self):
+        client = self.make_client(users=range(1, 5), members=[1], reject=[4])
+        dns = [self.user_dn(1), self.user_dn(2), self.user_dn(9),
+               self.group_dn, self.user_dn(4), self.user_dn(3)]
+        result = client.add_entries_to_group(dns, self.group_dn)
+
+        assert [dn for dn, _e in result] == dns
+        assert [type(e) for _dn, e in result] == [
+            errors.AlreadyGroupMember, type(None), errors.NotFound,
+            errors.SameGroupError, errors.DatabaseError, type(None)]
+        assert sorted(self.members(client)) == [
+            str(self.user_dn(i)).encode('utf-8') for i in (1, 2, 3)]
+
+        # the entries are looked up with one search per container
+        onelevel = [(base, f) for base, scope, f in client.conn.searches
+                    if scope == ldap.SCOPE_ONELEVEL]
+        assert len(onelevel) == 2
+        users_filter = dict(onelevel)[str(self.users_dn)]
+        assert users_filter.startswith('(|')
+        for i in (1, 2, 9, 4, 3):
+            assert '(uid=user%d)' % i in users_filter
+
+        # the failed modification is retried value by value
+        assert client.conn.modifications == [
+            [(ldap.MOD_ADD, 'member', 3)],
+            [(ldap.MOD_ADD, 'member', 1)],
+            [(ldap.MOD_ADD, 'member', 1)],
+            [(ldap.MOD_ADD, 'member', 1)],
+        ]
+
+    def test_add_chunks(self):
+        users = range(2500)
+        client = self.make_client(users=users)
+        result = client.add_entries_to_group(
+            [self.user_dn(i) for i in users], self.group_dn)
+
+        assert all(e is None for _dn, e in result)
+        assert len(self.members(client)) == 2500
+        onelevel = [f for _base, scope, f in client.conn.searches
+                    if scope == ldap.SCOPE_ONELEVEL]
+        assert [f.count('(uid=') for f in onelevel] == [1000, 1000, 500]
+        assert client.conn.modifications == [
+            [(ldap.MOD_ADD, 'member', 1000)],
+            [(ldap.MOD_ADD, 'member', 1000)],
+            [(ldap.MOD_ADD, 'member', 500)],
+        ]
+
+    def test_remove(self):
+        client = self.make_client(users=range(1, 4), members=[1, 2])
+        dns = [self.user_dn(1), self.user_dn(3), self.user_dn(2)]
+        result = client.remove_entries_from_group(dns, self.group_dn)
+
+        assert [dn for dn, _e in result] == dns
+        assert [type(e) for _dn, e in result] == [
+            type(None), errors.NotGroupMember, type(None)]
+        assert self.members(client) == []
+        # the members are removed at once, other values one by one
+        assert client.conn.modifications == [
+            [(ldap.MOD_DELETE, 'member', 2)],
+            [(ldap.MOD_DELETE, 'member', 1)],
+        ]
+
+
+@pytest.mark.tier0
+def test_ipa_config_cache():
+    dn = DN('cn=ipaconfig,cn=etc,dc=example,dc=test')
+    admin = (dn, ('gssapi', 'admin@EXAMPLE.TEST'), None)
+    user = (dn, ('gssapi', 'user@EXAMPLE.TEST'), None)
+    admin_attrs = (dn, ('gssapi', 'admin@EXAMPLE.TEST'),
+                   ('ipasearchtimelimit',))
+
+    cache = IPAConfigCache()
+    cache.store(admin, {'ipaCertificateSubjectBase': [b'O=TEST']},
+                (b'1', b'20180101000000Z'), 0)
+    # entries read by one identity or for other attributes are not shared
+    assert cache.get(user) is None
+    assert cache.get(admin_attrs) is None
+    assert cache.get(admin).raw == {'ipaCertificateSubjectBase': [b'O=TEST']}
+
+    cache.store(user, {}, (b'1', b'20180101000000Z'), 0)
+    cache.discard(admin)
+    assert cache.get(admin) is None
+    assert cache.get(user) is not None
+    cache.invalidate()
+    assert cache.get(user) is None
+
+    for i in range(cache.max_size + 1):
+        cache.store((dn, ('gssapi', 'u%d' % i), None), {}, (None, None), 0)
+    assert len(cache._cached) <= cache.max_size
+
+
+class FakeSchemaConnection:
+    def __init__(self, csn):
+        self.csn = csn
+        self.schema_searches = 0
+
+    def search_s(self, base, scope, attrlist=None):
+        if attrlist == ['nsSchemaCSN']:
+            return [(base, {'nsSchemaCSN': [self.csn]})]
+        self.schema_searches += 1
+        return [(base, {
+            'attributeTypes': [
+                b"( 2.5.4.3 NAME ( 'cn' 'commonName' ) "
+                b"SYNTAX 1.3.6.1.4.1.1466.115.121.1.15 )",
+                b"( 2.5.4.34 NAME 'seeAlso' "
+                b"SYNTAX 1.3.6.1.4.1.1466.115.121.1.12 SINGLE-VALUE )",
+            ],
+            'objectClasses': [],
+        })]
+
+
+@pytest.mark.tier0
+class test_SchemaCache:
+    """
+    Test the on-disk attribute table of the schema cache.
+    """
+
+    url = 'ldapi://test'
+
+    def test_attribute_table(self, tmpdir):
+        cache = SchemaCache()
+        cache.cache_dir = str(tmpdir)
+        conn = FakeSchemaConnection(b'csn1')
+
+        table = cache.get_attribute_table(self.url, conn)
+        assert conn.schema_searches == 1
+        assert table['commonname'] == (
+            ('cn', 'commonName'), '1.3.6.1.4.1.1466.115.121.1.15', False)
+        assert table['2.5.4.34'][2] is True
+
+        # a new process loads the table from disk
+        cache = SchemaCache()
+        cache.cache_dir = str(tmpdir)
+        assert cache.get_attribute_table(self.url, conn) == table
+        assert conn.schema_searches == 1
+
+        # the full schema is still available on demand
+        assert cache.get_schema(self.url, conn) is not None
+        assert conn.schema_searches == 2
+
+    def test_csn_change(self, tmpdir):
+        cache = SchemaCache()
+        cache.cache_dir = str(tmpdir)
+        cache.get_attribute_table(self.url, FakeSchemaConnection(b'csn1'))
+
+        cache = SchemaCache()
+        cache.cache_dir = str(tmpdir)
+        conn = FakeSchemaConnection(b'csn2')
+        cache.get_attribute_table(self.url, conn)
+        assert conn.schema_searches == 1
@@ -0,0 +1,63 @@
+#
+# Copyright (C) 2018  FreeIPA Contributors see COPYING for license
+#
+
+"""
+Test the `ipaserver.metrics` module.
+"""
+
+import os
+
+import pytest
+
+from ipalib import stats
+from ipaserver import metrics
+
+pytestmark = pytest.mark.tier0
+
+
+def make_snapshot(pid, count):
+    buckets = [0] * (len(stats.DURATION_BUCKETS) + 1)
+    buckets[0] = count
+    return dict(
+        pid=pid,
+        start_time=1500000000.0,
+        commands={u'user_show': [count, 0.001 * count, buckets]},
+        operations={u'ldap.search': [2 * count, 0.0005 * count]},
+        pool=dict(hits=count, misses=1, idle=1, in_use=0, max_size=8),
+    )
+
+
+def test_metrics_spool(tmpdir):
+    spool = metrics.MetricsSpool(str(tmpdir.join('metrics')))
+    assert spool.collect() == ([], {})
+
+    alive = make_snapshot(os.getpid(), 3)
+    spool.publish(alive)
+    # pid of an exited process
+    exited = make_snapshot(2 ** 22 + 1, 5)
+    spool.publish(exited)
+
+    snapshots, retired = spool.collect()
+    assert snapshots == [alive]
+    assert retired['commands'][u'user_show'][0] == 5
+    assert retired['pool'] == dict(hits=5, misses=1)
+    assert sorted(os.listdir(spool.directory)) == [
+        '.lock', '%d-1500000000.json' % os.getpid(), 'retired.json']
+
+    # retired totals are kept
+    assert spool.collect() == (snapshots, retired)
+
+    output = metrics.format_metrics(snapshots, retired)
+    assert '# TYPE ipa_command_duration_seconds histogram' in output
+    assert ('ipa_command_duration_seconds_bucket'
+            '{command="user_show",le="0.005"} 8') in output
+    assert ('ipa_command_duration_seconds_bucket'
+            '{command="user_show",le="+Inf"} 8') in output
+    assert ('ipa_command_duration_seconds_count'
+            '{command="user_show"} 8') in output
+    assert 'ipa_operations_total{operation="ldap.search"} 16' in output
+    assert 'ipa_ldap_pool_hits_total 8' in output
+    assert 'ipa_ldap_pool_connections{state="idle"} 1' in output
+    assert ('ipa_process_start_time_seconds{pid="%d"} 1500000000.0'
+            % os.getpid()) in output
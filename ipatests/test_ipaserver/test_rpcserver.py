@@ -21,13 +21,23 @@
 Test the `ipaserver.rpc` module.
 """
 
+import gzip
 import json
 import pytest
+import zlib
 
+import requests
 import six
+from six import BytesIO
+from six.moves import http_client
+from urllib3.response import HTTPResponse
 
-from ipatests.util import assert_equal, raises, PluginTester
+from ipatests.util import (assert_equal, raises, PluginTester,
+                           create_test_api)
 from ipalib import errors
+from ipalib.frontend import Command
+from ipalib.parameters import Str
+from ipalib.rpc import PreEncodedJSON, json_encode_binary_iter
 from ipaserver import rpcserver
 
 if six.PY3:
@@ -136,6 +146,81 @@ def test_params_2_args_options():
     assert f([args, options]) == (args, options)
 
 
+def test_get_accepted_encodings():
+    """
+    Test the `ipaserver.rpcserver.get_accepted_encodings` function.
+    """
+    f = rpcserver.get_accepted_encodings
+    assert f({}) == {}
+    assert f({'HTTP_ACCEPT_ENCODING': 'gzip, deflate;q=0.5, br;q=0'}) == {
+        'gzip': 1.0, 'deflate': 0.5, 'br': 0.0}
+    assert f({'HTTP_ACCEPT_ENCODING': 'X-GZIP'}) == {'gzip': 1.0}
+
+
+def test_compress_iter():
+    """
+    Test the `ipaserver.rpcserver.compress_iter` function.
+    """
+    f = rpcserver.compress_iter
+    chunks = [b'a' * 1000, b'b' * 100000, b'c']
+    data = b''.join(f(iter(chunks), 'gzip'))
+    assert gzip.GzipFile(fileobj=BytesIO(data)).read() == b''.join(chunks)
+    data = b''.join(f(iter(chunks), 'deflate'))
+    assert zlib.decompress(data) == b''.join(chunks)
+
+
+def test_pre_encoded_response():
+    """
+    Test the `ipaserver.rpcserver.PreEncodedResponse` class.
+    """
+    value = dict(names=[u'name%d' % i for i in range(1000)], ttl=3600)
+    response = dict(result=dict(result=PreEncodedJSON.encode(
+        value, u'2.230', etag=u'abcd1234')), error=None, id=0)
+    expected = json.dumps(
+        dict(result=dict(result=value), error=None, id=0)).encode('utf-8')
+
+    o = rpcserver.PreEncodedResponse(
+        json_encode_binary_iter(response, u'2.230', raw_values=True))
+    headers = []
+    status, body = o.respond({'REQUEST_METHOD': 'GET'}, '200 Success',
+                             headers)
+    assert status == '200 Success'
+    assert b''.join(body) == expected
+    etag = o.get_etag()
+    assert ('ETag', etag) in headers
+
+    # the tag covers the whole body, not only the pre-encoded value
+    response['id'] = 1
+    o2 = rpcserver.PreEncodedResponse(
+        json_encode_binary_iter(response, u'2.230', raw_values=True))
+    assert o2.get_etag() != etag
+
+    environ = {'HTTP_ACCEPT_ENCODING': 'deflate, gzip;q=0.5'}
+    headers = []
+    status, body = o.respond(environ, '200 Success', headers)
+    assert status == '200 Success'
+    assert gzip.GzipFile(fileobj=BytesIO(b''.join(body))).read() == expected
+    assert ('Content-Encoding', 'gzip') in headers
+
+    environ = {'HTTP_ACCEPT_ENCODING': 'gzip;q=0'}
+    status, body = o.respond(environ, '200 Success', [])
+    assert b''.join(body) == expected
+
+    environ = {'REQUEST_METHOD': 'GET',
+               'HTTP_IF_NONE_MATCH': '"00000000", %s' % etag}
+    status, body = o.respond(environ, '200 Success', [])
+    assert status == '304 Not Modified'
+    assert body == []
+
+    # JSON-RPC requests are never conditional
+    environ = {'REQUEST_METHOD': 'POST', 'HTTP_IF_NONE_MATCH': etag}
+    headers = []
+    status, body = o.respond(environ, '200 Success', headers)
+    assert status == '200 Success'
+    assert b''.join(body) == expected
+    assert 'ETag' not in dict(headers)
+
+
 class test_session:
     klass = rpcserver.wsgi_dispatch
 
@@ -189,6 +274,104 @@ class test_session:
         assert list(inst) == ['bar', 'foo']
 
 
+def test_wsgi_dispatch_on_demand():
+    api, _home = create_test_api(context='server', in_server=True)
+
+    class echo(Command):
+        takes_args = (Str('name'),)
+
+        def execute(self, name, **options):
+            return dict(result=name)
+
+    class jsonserver_test(rpcserver.jsonserver):
+        key = '/test/json'
+
+    for plugin in (rpcserver.wsgi_dispatch, rpcserver.jsonserver_session,
+                   rpcserver.login_password, jsonserver_test, echo):
+        api.add_plugin(plugin)
+    api.finalize()
+    assert api.env.plugins_on_demand
+
+    dispatch = api.Backend.wsgi_dispatch
+    # the WSGI applications are mounted when the first request arrives
+    assert list(dispatch) == []
+
+    data = json.dumps(dict(method='echo', params=[[u'hello'], {}], id=1))
+    data = data.encode('utf-8')
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(data)),
+        'SCRIPT_NAME': '/ipa',
+        'PATH_INFO': '/test/json',
+        'HTTP_REFERER': 'https://%s/ipa/ui' % api.env.host,
+        'wsgi.input': BytesIO(data),
+    }
+    s = StartResponse()
+    body = b''.join(dispatch(environ, s))
+    assert s.status == '200 Success'
+    assert list(dispatch) == [
+        '/session/json', '/session/login_password', '/test/json']
+
+    response = json.loads(body.decode('utf-8'))
+    assert response['error'] is None
+    assert response['result']['result'] == u'hello'
+
+    # the other applications are mounted as well
+    s = StartResponse()
+    environ = dict(SCRIPT_NAME='/ipa', PATH_INFO='/session/json')
+    dispatch(environ, s)
+    assert s.status == '401 Unauthorized'
+
+
+class FakeHTTPResponse(object):
+    """
+    The `http.client` response the cookies are read from.
+    """
+    def __init__(self, msg):
+        self.msg = msg
+
+    def isclosed(self):
+        return True
+
+
+class CookieAdapter(requests.adapters.HTTPAdapter):
+    """
+    Transport adapter answering every request with a new session cookie.
+    """
+    def __init__(self):
+        super(CookieAdapter, self).__init__()
+        self.cookies = []
+
+    def send(self, request, **kwargs):
+        self.cookies.append(request.headers.get('Cookie'))
+        header = 'Set-Cookie: ipa_session=user%d; Path=/ipa\r\n\r\n' % (
+            len(self.cookies))
+        headers = http_client.parse_headers(BytesIO(header.encode('ascii')))
+        raw = HTTPResponse(body=BytesIO(b''), headers=dict(headers.items()),
+                           status=200, preload_content=False,
+                           original_response=FakeHTTPResponse(headers))
+        return self.build_response(request, raw)
+
+
+def test_loopback_session(monkeypatch):
+    monkeypatch.setattr(rpcserver, '_loopback_session', None)
+    session = rpcserver.get_loopback_session()
+    assert rpcserver.get_loopback_session() is session
+    adapter = CookieAdapter()
+    session.mount('http://', adapter)
+    url = 'http://ipa.example.test/ipa/session/cookie'
+
+    r = session.get(url)
+    assert r.cookies.get('ipa_session') == 'user1'
+    # the cookie of one user is never sent with the request of another
+    assert len(session.cookies) == 0
+    r = session.get(url)
+    assert r.cookies.get('ipa_session') == 'user2'
+    assert len(session.cookies) == 0
+    assert adapter.cookies == [None, None]
+
+
 class test_xmlserver(PluginTester):
     """
     Test the `ipaserver.rpcserver.xmlserver` plugin.
@@ -27,8 +27,9 @@ from ipapython.dn import DN
 from ipapython import ipaldap
 from ipalib import errors
 from ipalib.frontend import Command
+from ipalib.parameters import Str
 from ipaserver.plugins import baseldap
-from ipatests.util import assert_deepequal
+from ipatests.util import assert_deepequal, create_test_api
 import pytest
 
 
@@ -221,3 +222,137 @@ def test_entry_to_dict():
     assert_deepequal(
         baseldap.entry_to_dict(entry, all=True, raw=True),
         the_dict)
+
+
+@pytest.mark.tier0
+def test_membership_graph():
+    conn = ipaldap.LDAPClient('ldap://test', no_schema=True)
+
+    def make_entry(dn, **raw):
+        entry = ipaldap.LDAPEntry(conn, DN(dn))
+        for attr, values in raw.items():
+            entry.raw[attr] = [v.encode('utf-8') for v in values]
+        return entry
+
+    # g1 -> g2 -> g3 -> g2 (cycle), rule -> g3 through memberUser
+    nested_entries = [
+        make_entry('cn=g2', member=['cn=g3', 'uid=u2'],
+                   memberof=['CN=G1', 'cn=g2', 'cn=g3', 'cn=rule']),
+        make_entry('cn=g3', member=['CN=G2', 'uid=u3'],
+                   memberof=['cn=g1', 'cn=g2', 'cn=g3', 'cn=rule']),
+    ]
+    parent_entries = [
+        make_entry('cn=g3', member=['CN=G2', 'uid=u3']),
+        make_entry('cn=g9', member=['uid=u9']),
+    ]
+    filters = []
+
+    class FakeLDAP:
+        MATCH_ALL = ipaldap.LDAPClient.MATCH_ALL
+        MATCH_ANY = ipaldap.LDAPClient.MATCH_ANY
+        combine_filters = ipaldap.LDAPClient.combine_filters
+        make_filter = ipaldap.LDAPClient.make_filter
+
+        def iter_entries(self, filter, attrs_list, base_dn, **kwargs):
+            filters.append(filter)
+            if 'memberof' in attrs_list:
+                return iter(nested_entries)
+            return iter(parent_entries)
+
+    entries = [
+        make_entry('cn=g1', member=['cn=g2', 'uid=u1']),
+        make_entry('cn=rule', memberuser=['cn=g3']),
+        make_entry('uid=u3', memberof=['cn=g3', 'cn=g2', 'cn=g1',
+                                       'cn=rule']),
+        make_entry('uid=u4'),
+    ]
+    graph = baseldap.MembershipGraph(FakeLDAP(), DN('dc=test'), entries)
+
+    # the searches are limited to entries related to the given entries
+    assert filters == [
+        '(&(member=*)(|(memberof=cn=g1)(memberof=cn=rule)'
+        '(memberof=uid=u3)(memberof=uid=u4)))',
+        '(|(|(member=cn=g1)(member=cn=rule)(member=uid=u3)(member=uid=u4))'
+        '(|(memberuser=cn=g1)(memberuser=cn=rule)(memberuser=uid=u3)'
+        '(memberuser=uid=u4))'
+        '(|(memberhost=cn=g1)(memberhost=cn=rule)(memberhost=uid=u3)'
+        '(memberhost=uid=u4)))',
+    ]
+
+    # the DN values are compared as DNs
+    graph.get_memberindirect(entries[0])
+    assert sorted(entries[0].raw['memberindirect']) == [
+        b'cn=g3', b'uid=u2', b'uid=u3']
+
+    graph.get_memberindirect(entries[1])
+    assert sorted(entries[1].raw['memberindirect']) == [
+        b'CN=G2', b'cn=g3', b'uid=u2', b'uid=u3']
+
+    graph.get_memberofindirect(entries[2])
+    assert entries[2].raw['memberof'] == [b'cn=g3']
+    assert entries[2].raw['memberofindirect'] == [
+        b'cn=g2', b'cn=g1', b'cn=rule']
+
+    graph.get_memberofindirect(entries[3])
+    assert 'memberofindirect' not in entries[3].raw
+
+
+@pytest.mark.tier0
+def test_convert_attribute_members():
+    api, _home = create_test_api()
+
+    class user(baseldap.LDAPObject):
+        container_dn = DN(('cn', 'users'), ('cn', 'accounts'))
+        takes_params = (Str('uid', primary_key=True),)
+
+    class group(baseldap.LDAPObject):
+        container_dn = DN(('cn', 'groups'), ('cn', 'accounts'))
+        takes_params = (Str('cn', primary_key=True),)
+        attribute_members = {'member': ['user', 'group']}
+
+    api.add_plugin(user)
+    api.add_plugin(group)
+    api.finalize()
+    group = api.Object.group
+    basedn = str(api.env.basedn)
+    users = ',cn=users,cn=accounts,' + basedn
+    groups = ',cn=groups,cn=accounts,' + basedn
+
+    members = [
+        'uid=admin' + users,
+        'uid=admin' + users.upper(),
+        u'uid=j\xe9r\xf4me' + users,
+        'uid=john\\, smith' + users,
+        'uid=a\\+b' + users,
+        'uid=back\\\\slash' + users,
+        'uid=\\"quoted\\"' + users,
+        'UID=Mixed' + users,
+        'Uid=Mixed' + users.upper(),
+        'uid=nested,ou=people' + users,
+        'krbprincipalname=host/test' + users,
+        'cn=admins' + groups,
+        'cn=other,cn=computers,cn=accounts,' + basedn,
+        'cn=users,cn=accounts,' + basedn,
+    ]
+    conn = ipaldap.LDAPClient('ldap://test', no_schema=True)
+
+    def convert():
+        entry = ipaldap.LDAPEntry(conn, DN('cn=test'))
+        entry.raw['member'] = [m.encode('utf-8') for m in members]
+        group.convert_attribute_members(entry)
+        return {attr: entry[attr] for attr in ('member_user', 'member_group')}
+
+    suffixes, containers = group._get_member_index()['member']
+    assert sorted(suffixes) == sorted([
+        users[1:].lower().encode('utf-8'), groups[1:].lower().encode('utf-8')])
+    fast = convert()
+
+    # the same conversion with every member DN parsed
+    object.__setattr__(group, '_member_index', {'member': ({}, containers)})
+    slow = convert()
+
+    assert fast == slow
+    assert fast['member_user'][:9] == [
+        u'admin', u'admin', u'j\xe9r\xf4me', u'john, smith', u'a+b',
+        u'back\\slash', u'"quoted"', u'Mixed', u'Mixed']
+    assert fast['member_group'] == [u'admins']